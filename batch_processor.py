@@ -1,5 +1,640 @@
+import inspect
 import os
-from watermark import add_text_watermark, add_logo_watermark
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from config import SUPPORTED_IMAGE_FORMATS
+from encoders import get_profile, output_extension, output_format, stores_mode
+from manifest import Manifest, entry_outputs, file_hash, is_current, settings_fingerprint
+from metrics import PeakMemory, StageRecorder
+from PIL import Image
+from watermark import (
+    RENDITION_REDUCING_GAP, TILED_CACHE_BYTES, add_text_watermark, add_logo_watermark,
+    add_watermark_renditions, rendition_sizes, set_tiled_cache_bytes
+)
+
+
+@dataclass
+class BatchResult:
+    """Outcome of watermarking one input image."""
+    index: int
+    input: str
+    output: str = None
+    status: str = "ok"  # "ok", "unchanged", "skipped" or "error"
+    error: str = None
+    timings: dict = field(default_factory=dict)
+    bytes: dict = field(default_factory=dict)
+    input_hash: str = None
+    input_stat: tuple = None  # (size, mtime_ns) when input_hash is set
+    renditions: dict = None   # label -> output path when rendering renditions
+    memory_estimate: int = None  # header-based peak estimate in bytes (memory_budget runs)
+    memory_peak: int = None      # measured peak bytes above the worker's baseline
+
+
+def scan_images(root: str, recursive: bool = True, formats: list = None):
+    """
+    Lazily yield image paths under a directory, without listing it up front.
+
+    :param root: directory to scan
+    :param recursive: descend into subdirectories
+    :param formats: allowed extensions (default config.SUPPORTED_IMAGE_FORMATS)
+    :return: generator of file paths
+    """
+    formats = tuple(f.lower() for f in (formats or SUPPORTED_IMAGE_FORMATS))
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError as e:
+            print(f"[scan_images] Cannot read {e.filename}: {e.strerror}")
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                    elif entry.name.lower().endswith(formats) and entry.is_file():
+                        yield entry.path
+                except OSError:
+                    continue
+
+
+def _root_dirs(roots):
+    """
+    Internal: (absolute root, output subdirectory) pairs, deepest root first.
+    A single root maps to output_dir itself; several roots each get a
+    subdirectory named after them (made unique in the order given).
+    """
+    roots = list(dict.fromkeys(os.path.abspath(r) for r in roots or ()))
+    if len(roots) == 1:
+        return [(roots[0], "")]
+    pairs, used = [], set()
+    for root in roots:
+        base = os.path.basename(root) or "root"
+        label, n = base, 2
+        while label in used:
+            label, n = f"{base}_{n}", n + 1
+        used.add(label)
+        pairs.append((root, label))
+    return sorted(pairs, key=lambda pair: len(pair[0]), reverse=True)
+
+
+def output_paths(img_path, output_dir, encoder=None, renditions=None, roots=None):
+    """
+    Output file path(s) for one input. An input under one of roots (the
+    directories a batch was scanned from) keeps its subdirectory below that
+    root, so files with the same name in different folders get different
+    outputs; any other input goes straight into output_dir.
+
+    :param img_path: input image path
+    :param output_dir: batch output directory
+    :param encoder: encoder setting (may change the extension)
+    :param renditions: renditions setting; one path per label
+    :param roots: directories the inputs were scanned from
+    :return: (output path, dict label -> path or None); with renditions the
+             output path is the first rendition's
+    """
+    folder = output_dir
+    if roots:
+        parent = os.path.dirname(os.path.abspath(img_path))
+        for root, label in _root_dirs(roots):
+            if os.path.commonpath([root, parent]) == root:
+                rel = os.path.relpath(parent, root)
+                folder = os.path.join(output_dir, label, "" if rel == "." else rel)
+                break
+    name, ext = os.path.splitext(os.path.basename(img_path))
+    ext = output_extension(ext, encoder)
+    if not renditions:
+        return os.path.join(folder, f"{name}_watermarked{ext}"), None
+    outputs = {
+        label: os.path.join(folder, f"{name}_watermarked_{label}{ext}")
+        for label in renditions
+    }
+    return next(iter(outputs.values())), outputs
+
+
+# Outputs a streaming run remembers to catch two inputs writing the same file.
+# Collisions come from neighbouring inputs (x.jpg and x.png in one folder with
+# a format override, or the same name in two folders without roots), which a
+# directory walk hands over close together; batch_process checks its whole list.
+COLLISION_WINDOW = 65536
+
+
+def output_collisions(images, output_dir, encoder=None, renditions=None, roots=None):
+    """
+    Find different inputs that would be written to the same output file.
+
+    :param images: input image paths
+    :return: dict output path -> list of input paths, for colliding outputs only
+    """
+    owners = {}
+    for img_path in images:
+        output_path, _ = output_paths(img_path, output_dir, encoder, renditions, roots)
+        owners.setdefault(output_path, {}).setdefault(os.path.abspath(img_path), img_path)
+    return {output: list(inputs.values()) for output, inputs in owners.items() if len(inputs) > 1}
+
+
+# Bytes per pixel of a decoded Pillow image; every other mode is stored in 4
+_MODE_BYTES = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16L": 2, "I;16B": 2, "I;16N": 2}
+# Fixed cost of a job (font and plugin loading, stamps) on top of its image buffers
+JOB_OVERHEAD_BYTES = 8 * 1024 * 1024
+# position='tiled': full-frame RGBA overlay, its tile expansion and the RGBA working frame
+TILED_BYTES_PER_PIXEL = 12
+
+
+def _rendition_chain_bytes(size, mode, renditions):
+    """
+    Internal: memory of a renditions downscale chain: the smaller renditions
+    are all held, plus the largest step's reduce() and horizontal-pass buffers
+    (and, for RGBA/LA, the premultiplied copies Pillow resizes through).
+    """
+    bpp = _MODE_BYTES.get(mode, 4)
+    sizes = [s for _, s in rendition_sizes(size, renditions)]
+    held = step = 0
+    for (w, h), (rw, rh) in zip(sizes, sizes[1:]):
+        held += rw * rh * bpp
+        if (rw, rh) == (w, h):
+            continue
+        fx = int(w / rw / RENDITION_REDUCING_GAP) or 1
+        fy = int(h / rh / RENDITION_REDUCING_GAP) or 1
+        reduced_h = -(-h // fy)
+        buffers = rw * reduced_h * bpp
+        if fx > 1 or fy > 1:
+            buffers += -(-w // fx) * reduced_h * bpp
+        if mode in ("RGBA", "LA"):
+            buffers += (w * h + rw * rh) * bpp
+        step = max(step, buffers)
+    return held + step
+
+
+def estimate_memory(img_path, watermark_type="text", position=None, renditions=None,
+                    encoder=None, encode_in_memory=False):
+    """
+    Estimate the peak memory of watermarking one image from its header only
+    (Image.open reads size and mode without decoding pixels).
+
+    :param img_path: input image path
+    :param renditions: renditions setting of the batch, if any
+    :param encoder: encoder setting of the batch (decides whether saving converts)
+    :param encode_in_memory: the output is encoded to a buffer first (instrumented runs)
+    :return: estimated peak bytes above the worker's baseline
+    """
+    with Image.open(img_path) as img:
+        (w, h), mode = img.size, img.mode
+    pixels = w * h
+    bpp = _MODE_BYTES.get(mode, 4)
+    peak = JOB_OVERHEAD_BYTES + pixels * bpp
+    if position == "tiled":
+        peak += pixels * TILED_BYTES_PER_PIXEL
+    elif watermark_type == "logo":
+        # the logo's rectangle; logos are scaled to a fraction of the width
+        peak += pixels // 25 * 8
+    if not stores_mode(output_format(img_path, encoder), mode):
+        # converted copy for formats that cannot store the mode (e.g. RGBA -> JPEG)
+        peak += pixels * 4
+    if renditions:
+        peak += _rendition_chain_bytes((w, h), mode, renditions)
+    if encode_in_memory:
+        # encoded output, about the size of the input file
+        peak += os.path.getsize(img_path)
+    return peak
+
+
+def available_memory():
+    """
+    :return: bytes of memory available to new work (MemAvailable on Linux,
+             free physical pages elsewhere), or None if unknown
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+# Options that only affect position='tiled'
+TILE_OPTIONS = ("spacing", "angle", "stagger")
+
+
+def _watermark_options(watermark_type, position, opacity, font_path, font_size, color, scale,
+                       spacing=None, angle=None, stagger=None, encoder=None, font_variation=None):
+    """
+    Internal: keyword arguments for the watermark function of this type.
+    None means "use the watermark function's default".
+    """
+    options = {
+        k: v for k, v in (
+            ("position", position), ("opacity", opacity), ("font_path", font_path),
+            ("font_size", font_size), ("color", color), ("scale", scale),
+            ("spacing", spacing), ("angle", angle), ("stagger", stagger),
+            ("encoder", encoder), ("font_variation", font_variation)
+        ) if v is not None
+    }
+    drop = ("scale",) if watermark_type == "text" else (
+        "font_path", "font_size", "color", "font_variation"
+    )
+    if position != "tiled":
+        drop += TILE_OPTIONS
+    for k in drop:
+        options.pop(k, None)
+    return options
+
+
+def _effective_settings(watermark_type, watermark_content, logo_path, options, renditions=None):
+    """Internal: every setting that affects the output, defaults filled in."""
+    fn = add_text_watermark if watermark_type == "text" else add_logo_watermark
+    settings = {
+        name: param.default
+        for name, param in inspect.signature(fn).parameters.items()
+        if param.default is not inspect.Parameter.empty and name != "metrics"
+    }
+    settings.update(options)
+    if settings.get("position") != "tiled":
+        # keep fingerprints of non-tiled runs independent of the tile defaults
+        for k in TILE_OPTIONS:
+            settings.pop(k, None)
+    if settings.get("font_variation") is None:
+        # keep fingerprints of runs without a variation as they were
+        settings.pop("font_variation", None)
+    if settings.get("encoder") is None:
+        settings.pop("encoder", None)
+    else:
+        # resolve names so editing a profile invalidates its outputs
+        settings["encoder"] = get_profile(settings["encoder"])
+    if renditions:
+        settings["renditions"] = dict(renditions)
+    settings.update(type=watermark_type, text=watermark_content, logo_path=logo_path)
+    return settings
+
+
+def _process_one(
+    index: int,
+    img_path: str,
+    output_dir: str,
+    watermark_type: str,
+    watermark_content: str,
+    logo_path: str,
+    position: str,
+    opacity: int,
+    font_path: str,
+    font_size: int,
+    color: tuple,
+    scale: float,
+    spacing: int = None,
+    angle: float = None,
+    stagger: bool = None,
+    encoder=None,
+    renditions: dict = None,
+    instrument: bool = False,
+    measure_memory: bool = False,
+    settings_hash: str = None,
+    previous: dict = None,
+    collides_with: str = None,
+    font_variation=None
+) -> BatchResult:
+    """
+    Internal: watermark a single image into output_dir (the input's own
+    output folder, see output_paths).
+    Top-level so it can be pickled into a process pool.
+    With settings_hash set, the input is hashed and the render is skipped
+    when the previous manifest entry is still current.
+    With measure_memory, the process's peak memory over the job is recorded.
+    collides_with names an earlier input of the run with the same output;
+    the image is then reported as an error instead of overwriting it.
+    """
+    started = time.perf_counter()
+    result = BatchResult(index, img_path)
+    recorder = StageRecorder() if instrument else None
+    probe = PeakMemory().start() if measure_memory else None
+    output_path, outputs = output_paths(img_path, output_dir, encoder, renditions)
+
+    options = _watermark_options(
+        watermark_type, position, opacity, font_path, font_size, color, scale,
+        spacing, angle, stagger, encoder, font_variation
+    )
+    if recorder:
+        options["metrics"] = recorder
+
+    try:
+        if collides_with is not None:
+            result.status = "error"
+            result.error = f"Output {output_path} is already written for {collides_with}"
+            return result
+
+        if settings_hash is not None:
+            st = os.stat(img_path)
+            result.input_stat = (st.st_size, st.st_mtime_ns)
+            if previous and (previous.get("size"), previous.get("mtime")) == result.input_stat:
+                # unchanged size and mtime: trust the recorded content hash
+                result.input_hash = previous.get("input_hash")
+            else:
+                result.input_hash = file_hash(img_path)
+            expected = list(outputs.values()) if outputs else [output_path]
+            if (previous and entry_outputs(previous) == expected
+                    and is_current(previous, result.input_hash, settings_hash)):
+                result.status = "unchanged"
+                result.output = output_path
+                result.renditions = outputs
+                return result
+
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        if watermark_type == "text" and watermark_content:
+            if outputs:
+                add_watermark_renditions(
+                    img_path, outputs, renditions, text=watermark_content, **options
+                )
+            else:
+                add_text_watermark(img_path, watermark_content, output_path, **options)
+        elif watermark_type == "logo" and logo_path:
+            if outputs:
+                add_watermark_renditions(
+                    img_path, outputs, renditions, logo_path=logo_path, **options
+                )
+            else:
+                add_logo_watermark(img_path, logo_path, output_path, **options)
+        else:
+            # Skip unsupported config
+            result.status = "skipped"
+            return result
+
+        result.output = output_path
+        result.renditions = outputs
+
+    except Exception as e:
+        # Record error and continue batch
+        result.status = "error"
+        result.error = f"{type(e).__name__}: {e}"
+
+    finally:
+        if probe:
+            result.memory_peak = probe.stop()
+        if recorder:
+            result.timings.update(recorder.durations)
+            result.bytes.update(recorder.bytes)
+        result.timings["total"] = time.perf_counter() - started
+
+    return result
+
+
+def iter_batch_process(
+    images,
+    output_dir: str,
+    watermark_type: str = "text",
+    watermark_content: str = None,
+    logo_path: str = None,
+    position: str = None,
+    opacity: int = None,
+    font_path: str = None,
+    font_size: int = None,
+    color: tuple = None,
+    scale: float = None,
+    spacing: int = None,
+    angle: float = None,
+    stagger: bool = None,
+    encoder=None,
+    renditions: dict = None,
+    workers: int = None,
+    executor: str = "process",
+    max_pending: int = None,
+    instrument: bool = False,
+    resume: bool = False,
+    memory_budget: int = None,
+    largest_first: bool = False,
+    roots=None,
+    font_variation=None
+):
+    """
+    Apply watermark to a stream of images, yielding a BatchResult per image
+    as soon as it completes. The input is consumed lazily and at most
+    max_pending images are in flight, so memory stays bounded for
+    arbitrarily large or endless inputs (e.g. scan_images over a huge tree,
+    or watcher.Watcher); only largest_first holds the whole input.
+
+    Parameters are the same as batch_process, plus:
+
+    :param images: any iterable of input image file paths; a None item is an idle
+                   tick (nothing ready yet) that lets finished results through
+                   while an endless source such as watcher.Watcher waits for files
+    :param max_pending: in-flight limit for parallel runs (default 2 * workers)
+    :param instrument: record per-stage durations/bytes in each result's timings/bytes
+    :param resume: keep a content-hash manifest in output_dir and skip inputs whose
+                   output is up to date (status "unchanged")
+    :param memory_budget: bytes of image memory the jobs in flight may need together;
+                          each job's peak is estimated from its header (estimate_memory)
+                          and a job waits while it would not fit (a job larger than the
+                          whole budget runs alone). For position 'tiled' the overlay
+                          caches the worker processes keep between jobs are set
+                          aside from the budget first. Results carry memory_estimate
+                          and, with a process pool or serially, the measured memory_peak
+    :param largest_first: read every header up front and start the largest jobs first,
+                          which balances workers better; needs a finite input
+    :param roots: directories the inputs were scanned from; outputs keep each input's
+                  subdirectory below its root (see output_paths). An input whose output
+                  one of the last COLLISION_WINDOW outputs already took is reported as
+                  an error (batch_process checks the whole input up front)
+    :return: generator of BatchResult, in completion order when parallel
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    get_profile(encoder)  # reject an unknown profile before any work starts
+    parallel = workers == 0 or (workers or 1) > 1
+    # peaks are per process; threads share one, so they cannot be told apart
+    measure_memory = (instrument or memory_budget is not None) and not (
+        parallel and executor == "thread"
+    )
+    job = (
+        watermark_type, watermark_content, logo_path, position,
+        opacity, font_path, font_size, color, scale, spacing, angle, stagger, encoder,
+        renditions, instrument, measure_memory
+    )
+
+    manifest = settings_hash = None
+    if resume:
+        manifest = Manifest(output_dir)
+        options = _watermark_options(
+            watermark_type, position, opacity, font_path, font_size, color, scale,
+            spacing, angle, stagger, encoder, font_variation
+        )
+        settings_hash = settings_fingerprint(
+            _effective_settings(watermark_type, watermark_content, logo_path, options, renditions)
+        )
+
+    # each worker process caches tiled overlays after its jobs: a pool shares
+    # TILED_CACHE_BYTES out, and a budget reserves the caches up front
+    processes = (os.cpu_count() or 1) if workers == 0 else workers or 1
+    if executor == "thread":
+        processes = 1
+    tiled_cache = TILED_CACHE_BYTES // processes
+    if memory_budget is not None and position == "tiled":
+        tiled_cache = min(tiled_cache, memory_budget // (4 * processes))
+        memory_budget -= tiled_cache * processes
+
+    estimates = {}
+    owners = OrderedDict()  # recent output paths -> input that writes it
+
+    def estimate(img_path):
+        try:
+            return estimate_memory(
+                img_path, watermark_type, position, renditions, encoder, instrument
+            )
+        except Exception:
+            # unreadable: the job itself will report the error
+            return 0
+
+    inputs = enumerate(images)
+    if largest_first:
+        inputs = [(idx, img_path) for idx, img_path in inputs if img_path is not None]
+        for idx, img_path in inputs:
+            estimates[idx] = estimate(img_path)
+        inputs.sort(key=lambda item: estimates[item[0]], reverse=True)
+
+    def tasks():
+        for idx, img_path in inputs:
+            if img_path is None:
+                yield None
+                continue
+            if memory_budget is not None and idx not in estimates:
+                estimates[idx] = estimate(img_path)
+            output_path, _ = output_paths(img_path, output_dir, encoder, renditions, roots)
+            owner = owners.setdefault(output_path, os.path.abspath(img_path))
+            owners.move_to_end(output_path)
+            if len(owners) > COLLISION_WINDOW:
+                owners.popitem(last=False)
+            collides_with = owner if owner != os.path.abspath(img_path) else None
+            previous = manifest.get(img_path) if manifest else None
+            yield ((idx, img_path, os.path.dirname(output_path)) + job
+                   + (settings_hash, previous, collides_with, font_variation))
+
+    cost = None
+    if memory_budget is not None:
+        def cost(args):
+            return estimates.get(args[0], 0)
+
+    try:
+        for result in _run(
+            tasks(), workers, executor, max_pending, memory_budget, cost, tiled_cache
+        ):
+            result.memory_estimate = estimates.pop(result.index, None)
+            if manifest is not None and result.input_hash:
+                previous = manifest.get(result.input)
+                if result.status == "ok" or (
+                    result.status == "unchanged"
+                    and (previous["size"], previous["mtime"]) != result.input_stat
+                ):
+                    manifest.record(
+                        result.input, *result.input_stat, result.input_hash,
+                        settings_hash, result.output,
+                        list(result.renditions.values()) if result.renditions else None
+                    )
+            yield result
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+
+# _run sentinels: no task held / input exhausted
+_NONE = object()
+_END = object()
+
+
+def _run(tasks, workers, executor, max_pending, budget=None, cost=None, tiled_cache=None):
+    """
+    Internal: run _process_one over argument tuples, serially or in a pool.
+    A None task is an idle tick: collect whatever has finished, then ask again.
+    With a budget, a task is only started while the costs of the tasks in
+    flight plus its own fit in it (or nothing else is running); tasks start
+    in the order given. tiled_cache limits the tiled overlay cache of each
+    process that runs jobs, for the length of the run.
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+
+    if tiled_cache is None:
+        tiled_cache = TILED_CACHE_BYTES
+    # jobs that run in this process use its cache: limit it for the run
+    in_process = not workers or workers == 1 or executor == "thread"
+    previous = set_tiled_cache_bytes(tiled_cache) if in_process else None
+    if not workers or workers == 1:
+        try:
+            for args in tasks:
+                if args is not None:
+                    yield _process_one(*args)
+        finally:
+            set_tiled_cache_bytes(previous)
+        return
+
+    # pools (and multiprocessing) are only imported when a run is parallel,
+    # which keeps serial CLI runs fast to start
+    from concurrent.futures import FIRST_COMPLETED, wait
+    if executor == "process":
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=set_tiled_cache_bytes, initargs=(tiled_cache,)
+        )
+    elif executor == "spawn":
+        # fresh interpreters: forking a process that runs other threads (a Tk
+        # GUI) can copy a lock some thread holds and hang the worker
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=set_tiled_cache_bytes, initargs=(tiled_cache,)
+        )
+    elif executor == "thread":
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(
+            f"Unknown executor: {executor!r} (expected 'process', 'spawn' or 'thread')"
+        )
+
+    max_pending = max_pending or 2 * workers
+    tasks = iter(tasks)
+    pending = {}  # future -> cost
+    in_use = 0
+    held = _NONE  # next task, taken from the input but not started yet
+    try:
+        while True:
+            # top up the window from the lazy input
+            idle = False
+            while len(pending) < max_pending:
+                if held is _NONE:
+                    held = next(tasks, _END)
+                if held is _END:
+                    break
+                if held is None:
+                    idle, held = True, _NONE
+                    break
+                need = cost(held) if cost else 0
+                if budget is not None and pending and in_use + need > budget:
+                    # wait for memory to be released by running jobs
+                    break
+                pending[pool.submit(_process_one, *held)] = need
+                in_use += need
+                held = _NONE
+            if idle:
+                # the source is waiting for input: hand back what is done, don't block
+                done, _ = wait(pending, timeout=0)
+            elif pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            else:
+                break
+            for future in done:
+                in_use -= pending.pop(future)
+                yield future.result()
+    finally:
+        # consumer stopped early or an error escaped: drop queued work
+        pool.shutdown(wait=True, cancel_futures=True)
+        if previous is not None:
+            set_tiled_cache_bytes(previous)
+
 
 def batch_process(
     images: list,
@@ -13,7 +648,19 @@ def batch_process(
     font_size: int = None,
     color: tuple = None,
     scale: float = None,
-    progress_callback: callable = None
+    spacing: int = None,
+    angle: float = None,
+    stagger: bool = None,
+    encoder=None,
+    renditions: dict = None,
+    progress_callback: callable = None,
+    workers: int = None,
+    executor: str = "process",
+    metrics=None,
+    resume: bool = False,
+    memory_budget: int = None,
+    roots=None,
+    font_variation=None
 ) -> list:
     """
     Apply watermark to multiple images in a batch.
@@ -23,55 +670,74 @@ def batch_process(
     :param watermark_type: "text" or "logo"
     :param watermark_content: text for text watermark
     :param logo_path: path to logo file for logo watermark
-    :param position: watermark position (e.g., 'bottom_right', 'center')
+    :param position: watermark position (e.g., 'bottom_right', 'center', 'tiled')
     :param opacity: watermark opacity (0-255)
     :param font_path: path to .ttf font file
     :param font_size: font size for text watermark
+    :param font_variation: variable font instance for text watermarks: a named
+                           instance or axis values (see fonts.find_font)
     :param color: text color as (R, G, B) tuple
     :param scale: scale factor for logo relative to image width (0-1)
+    :param spacing: gap between repeated copies in pixels ('tiled' only)
+    :param angle: rotation of repeated copies in degrees ('tiled' only)
+    :param stagger: offset every other row by half a copy ('tiled' only)
+    :param encoder: output encoder profile: a name from encoders.ENCODER_PROFILES or a
+                    dict (e.g. a preset's "encoder" entry); None keeps Pillow defaults
+    :param renditions: dict label -> longest edge in pixels (None = full size), e.g.
+                       config.DEFAULT_RENDITIONS; writes {name}_watermarked_{label}{ext}
+                       for each from one decode, with the watermark scaled per size
     :param progress_callback: optional fn(current_index, total) for progress updates
-    :return: list of saved output file paths
+    :param workers: number of parallel workers; None or 1 runs serially, 0 uses all cores
+    :param executor: "process" (default) or "thread" pool when workers > 1, or
+                     "spawn" for a process pool that starts fresh interpreters
+                     (safe from a threaded program such as the GUI)
+    :param metrics: optional metrics.BatchMetrics that per-stage timings are aggregated into
+    :param resume: skip inputs already rendered with the same content and settings
+    :param memory_budget: bytes of image memory parallel jobs may use together; headers
+                          are read up front and the largest images start first
+                          (see iter_batch_process)
+    :param roots: directories the images were scanned from; each output keeps the
+                  input's subdirectory below its root (see output_paths)
+    :return: list of saved output file paths, in input order (every rendition's path
+             when rendering renditions)
+    :raises ValueError: if different inputs would be written to the same output file;
+                        nothing is rendered then
     """
-    os.makedirs(output_dir, exist_ok=True)
-    total = len(images)
-    saved_files = []
-
-    for idx, img_path in enumerate(images, start=1):
-        name, ext = os.path.splitext(os.path.basename(img_path))
-        output_path = os.path.join(output_dir, f"{name}_watermarked{ext}")
-
-        try:
-            if watermark_type == "text" and watermark_content:
-                add_text_watermark(
-                    img_path,
-                    watermark_content,
-                    output_path,
-                    position=position,
-                    opacity=opacity,
-                    font_path=font_path,
-                    font_size=font_size,
-                    color=color
-                )
-            elif watermark_type == "logo" and logo_path:
-                add_logo_watermark(
-                    img_path,
-                    logo_path,
-                    output_path,
-                    position=position,
-                    opacity=opacity,
-                    scale=scale
-                )
-            else:
-                # Skip unsupported config
-                continue
+    collisions = output_collisions(images, output_dir, encoder, renditions, roots)
+    if collisions:
+        output, inputs = next(iter(collisions.items()))
+        raise ValueError(
+            f"{len(collisions)} output file(s) would be written by several inputs, "
+            f"e.g. {output} by {', '.join(inputs)}"
+        )
 
-            saved_files.append(output_path)
+    total = len(images)
+    if workers and total <= 1:
+        workers = None
 
-        except Exception as e:
+    # Collect by input index so the result keeps input order,
+    # while progress is reported in completion order
+    outputs = [None] * total
+    results = iter_batch_process(
+        images, output_dir, watermark_type, watermark_content, logo_path,
+        position, opacity, font_path, font_size, color, scale,
+        spacing, angle, stagger, encoder, renditions, workers=workers, executor=executor,
+        instrument=metrics is not None, resume=resume,
+        memory_budget=memory_budget, largest_first=memory_budget is not None, roots=roots,
+        font_variation=font_variation
+    )
+    for done, result in enumerate(results, start=1):
+        if result.status == "error":
             # Log error and continue batch
-            print(f"[batch_process] Error on {img_path}: {e}")
-
+            print(f"[batch_process] Error on {result.input}: {result.error}")
+        outputs[result.index] = list(result.renditions.values()) if result.renditions else result.output
+        if metrics is not None:
+            metrics.observe(result.timings, result.bytes, result.status,
+                            (result.memory_estimate, result.memory_peak))
         if progress_callback:
-            progress_callback(idx, total)
+            progress_callback(done, total)
 
-    return saved_files
+    return [
+        path for output in outputs if output
+        for path in (output if isinstance(output, list) else [output])
+    ]
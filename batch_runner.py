@@ -0,0 +1,195 @@
+# batch_runner.py
+
+import queue
+import threading
+import time
+import tkinter as tk
+
+from batch_processor import iter_batch_process
+from progressbar import ProgressBar
+
+# Progress redraws per second while a batch runs
+REFRESH_MS = 100
+
+
+class BatchRunner:
+    """
+    Runs iter_batch_process on a background thread and reports through a
+    queue, so the Tk thread never waits on Pillow. Pause and cancel take
+    effect between images; images already in flight finish normally.
+    """
+
+    def __init__(self, images, output_dir, **batch_kwargs):
+        """
+        :param images: list of input image file paths
+        :param output_dir: directory to save watermarked images
+        :param batch_kwargs: any other iter_batch_process keyword arguments
+        """
+        self.images = list(images)
+        self.output_dir = output_dir
+        self.batch_kwargs = batch_kwargs
+        self.messages = queue.Queue()
+        self._cancel = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread."""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """Internal: worker thread body."""
+        results = iter_batch_process(self.images, self.output_dir, **self.batch_kwargs)
+        try:
+            for result in results:
+                self.messages.put(("result", result))
+                # paused: stop pulling, which also stops new submissions
+                self._running.wait()
+                if self._cancel.is_set():
+                    break
+        except Exception as e:
+            self.messages.put(("error", e))
+        finally:
+            # closing the generator drops queued images and waits for in-flight ones
+            results.close()
+            self.messages.put(("done", self._cancel.is_set()))
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def cancel(self):
+        """Stop after the images currently in flight."""
+        self._cancel.set()
+        self._running.set()
+
+
+def _format_eta(seconds):
+    """Internal: 'h:mm:ss' or 'm:ss'."""
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+class BatchDialog(tk.Toplevel):
+    """
+    Progress window for a GUI batch: throttled progress bar, throughput,
+    ETA and Pause/Cancel buttons.
+    """
+
+    def __init__(self, parent, images, output_dir, on_done=None, refresh_ms=REFRESH_MS, **batch_kwargs):
+        """
+        :param parent: Tk parent window
+        :param images: list of input image file paths
+        :param output_dir: directory to save watermarked images
+        :param on_done: optional fn(saved_paths, errors, cancelled) called on the Tk thread
+        :param refresh_ms: redraw interval in milliseconds
+        :param batch_kwargs: passed to iter_batch_process
+        """
+        super().__init__(parent)
+        self.title("Batch Watermark")
+        self.resizable(False, False)
+        self.on_done = on_done
+        self.refresh_ms = refresh_ms
+
+        self.total = len(images)
+        self.done = 0
+        self.saved = []
+        self.errors = []
+        self._started = time.perf_counter()
+        self._paused_at = None
+        self._paused_for = 0.0
+        self._cancelling = False
+
+        self.bar = ProgressBar(self, length=360)
+        self.status = tk.Label(self, text=f"0/{self.total}", anchor="w", width=50)
+        self.status.pack(padx=10)
+        buttons = tk.Frame(self)
+        buttons.pack(pady=8)
+        self.pause_btn = tk.Button(buttons, text="Pause", width=8, command=self.toggle_pause)
+        self.pause_btn.pack(side=tk.LEFT, padx=5)
+        self.cancel_btn = tk.Button(buttons, text="Cancel", width=8, command=self.cancel)
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+
+        self.bar.start(max_value=self.total or 1)
+        self.runner = BatchRunner(images, output_dir, **batch_kwargs)
+        self.runner.start()
+        self.after(self.refresh_ms, self._poll)
+
+    def toggle_pause(self):
+        if self.runner.paused:
+            self._paused_for += time.perf_counter() - self._paused_at
+            self.runner.resume()
+            self.pause_btn.config(text="Pause")
+        else:
+            self._paused_at = time.perf_counter()
+            self.runner.pause()
+            self.pause_btn.config(text="Resume")
+
+    def cancel(self):
+        self._cancelling = True
+        self.runner.cancel()
+        self.pause_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.status.config(text=f"Cancelling… {self._status_text()}")
+
+    def _poll(self):
+        # drain everything queued since the last tick, then redraw once
+        finished = None
+        while True:
+            try:
+                kind, payload = self.runner.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "result":
+                self.done += 1
+                if payload.output:
+                    self.saved.append(payload.output)
+                if payload.status == "error":
+                    self.errors.append(payload)
+            elif kind == "error":
+                self.errors.append(payload)
+            elif kind == "done":
+                finished = payload
+
+        self.bar.set_progress(self.done)
+        if finished is None:
+            prefix = "Cancelling… " if self._cancelling else ""
+            self.status.config(text=prefix + self._status_text())
+            self.after(self.refresh_ms, self._poll)
+            return
+
+        self.status.config(text=("Cancelled" if finished else "Finished") + f": {self._status_text()}")
+        self.pause_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(text="Close", state=tk.NORMAL, command=self.destroy)
+        self.protocol("WM_DELETE_WINDOW", self.destroy)
+        if self.on_done:
+            self.on_done(self.saved, self.errors, finished)
+
+    def _status_text(self):
+        """Internal: 'done/total · rate · ETA' line."""
+        elapsed = time.perf_counter() - self._started - self._paused_for
+        if self._paused_at and self.runner.paused:
+            elapsed -= time.perf_counter() - self._paused_at
+        text = f"{self.done}/{self.total}"
+        if self.done and elapsed > 0:
+            rate = self.done / elapsed
+            text += f" · {rate:.1f} img/s"
+            remaining = self.total - self.done
+            if remaining and not self.runner.paused:
+                text += f" · ETA {_format_eta(remaining / rate)}"
+        if self.errors:
+            text += f" · {len(self.errors)} failed"
+        if self.runner.paused:
+            text += " · paused"
+        return text
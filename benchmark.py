@@ -0,0 +1,474 @@
+# benchmark.py
+"""
+Throughput benchmark for the watermarking hot paths.
+
+Generates synthetic inputs locally across a size / format / mode matrix,
+times each case in a fresh process (so peak RSS is per case), writes the
+results as JSON and compares them against a stored baseline.
+
+    python benchmark.py --quick
+    python benchmark.py --output results.json --baseline baseline.json
+    python benchmark.py --output baseline.json          # record a baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# (megapixels, format, mode); JPEG cannot store alpha so RGBA is PNG-only
+SIZES_MP = [1, 12, 50, 100]
+QUICK_SIZES_MP = [1, 4]
+FORMATS = {"JPEG": ".jpg", "PNG": ".png"}
+MODES = ["RGB", "RGBA", "L"]
+DEFAULT_THRESHOLD = 0.10  # flag cases more than 10% slower than baseline
+
+# Modules the headless CLI must never import
+GUI_MODULES = ("tkinter", "tkinterdnd2", "PIL.ImageTk", "main", "ui_utils", "batch_runner")
+
+
+def _make_input(workdir, megapixels, fmt, mode):
+    """Internal: create (or reuse) a synthetic 3:2 test image, return its path."""
+    path = os.path.join(workdir, f"synthetic_{megapixels}mp_{mode}{FORMATS[fmt]}")
+    if os.path.exists(path):
+        return path
+
+    from PIL import Image, ImageChops
+
+    w = int((megapixels * 1_000_000 * 3 / 2) ** 0.5)
+    h = int(w * 2 / 3)
+    # upscaled noise over a gradient: photo-like entropy, cheap to build
+    noise = Image.effect_noise((max(w // 8, 1), max(h // 8, 1)), 64).resize((w, h))
+    gradient = Image.linear_gradient("L").resize((w, h))
+    gray = ImageChops.add(noise, gradient, scale=2.0)
+    if mode == "L":
+        img = gray
+    else:
+        img = Image.merge("RGB", (gray, ImageChops.invert(gray), gradient))
+        if mode == "RGBA":
+            img.putalpha(255)
+    img.save(path, format=fmt)
+    return path
+
+
+def _make_logo(workdir):
+    """Internal: create a small RGBA logo for the logo cases."""
+    path = os.path.join(workdir, "synthetic_logo.png")
+    if not os.path.exists(path):
+        from PIL import Image, ImageDraw
+        logo = Image.new("RGBA", (400, 200), (0, 0, 0, 0))
+        ImageDraw.Draw(logo).ellipse((10, 10, 390, 190), fill=(255, 255, 255, 220))
+        logo.save(path)
+    return path
+
+
+# --- cases: each processes one input file into workdir/out ----------------
+
+def _case_add_text_watermark(path, out, ctx):
+    from watermark import add_text_watermark
+    add_text_watermark(path, "© Benchmark", out, font_size=48)
+
+
+def _case_apply_text_watermark_to_image(path, out, ctx):
+    from PIL import Image
+    from watermark import apply_text_watermark_to_image
+    with Image.open(path) as img:
+        apply_text_watermark_to_image(img, "© Benchmark", font_size=48).save(out)
+
+
+def _case_add_logo_watermark(path, out, ctx):
+    from watermark import add_logo_watermark
+    add_logo_watermark(path, ctx["logo"], out, scale=0.15)
+
+
+def _batch_inputs(path, count):
+    """
+    Internal: count copies of path under distinct names (made on the untimed
+    warm-up run, then reused), so every batch job reads and writes its own files.
+    """
+    import shutil
+    folder = os.path.join(os.path.dirname(path), "batch_inputs")
+    os.makedirs(folder, exist_ok=True)
+    name = os.path.basename(path)
+    copies = []
+    for i in range(count):
+        copy = os.path.join(folder, f"{i:04d}_{name}")
+        if not os.path.exists(copy) or os.path.getmtime(copy) < os.path.getmtime(path):
+            shutil.copyfile(path, copy)
+        copies.append(copy)
+    return copies
+
+
+def _case_batch_process(path, out, ctx):
+    from batch_processor import batch_process
+    batch_process(
+        _batch_inputs(path, ctx["batch_count"]), os.path.dirname(out), "text", "© Benchmark",
+        workers=ctx["workers"]
+    )
+
+
+def _encoder_case(profile):
+    """Internal: add_text_watermark with an encoder profile, reporting encode time and size."""
+    def case(path, out, ctx):
+        from metrics import StageRecorder
+        from watermark import add_text_watermark
+        recorder = StageRecorder()
+        add_text_watermark(path, "© Benchmark", out, font_size=48, encoder=profile,
+                           metrics=recorder)
+        return {
+            "encode_seconds": recorder.durations.get("encode", 0.0),
+            "bytes_written": recorder.bytes.get("write", 0),
+        }
+    return case
+
+
+def _editor_case(op):
+    """Internal: wrap an image_editor in-memory operation as load -> op -> save."""
+    def case(path, out, ctx):
+        import image_editor
+        img = image_editor.load_image(path)
+        image_editor.save_image(op(image_editor, img), out)
+    return case
+
+
+def _case_convert_format(path, out, ctx):
+    import image_editor
+    image_editor.convert_format(path, os.path.splitext(out)[0] + ".png", "PNG")
+
+
+def _case_compress_image(path, out, ctx):
+    import image_editor
+    if path.lower().endswith((".jpg", ".jpeg")):
+        image_editor.compress_image(path, out, quality=80)
+    else:
+        raise _Skip("JPEG only")
+
+
+def _case_editor_chain(path, out, ctx):
+    """Internal: resize -> crop -> rotate -> watermark -> save, one full image per step."""
+    import image_editor
+    from watermark import apply_text_watermark_to_image
+    img = image_editor.load_image(path)
+    img = image_editor.resize_image(img, width=img.width // 2)
+    img = image_editor.crop_image(img, 0, 0, img.width * 3 // 4, img.height * 3 // 4)
+    img = image_editor.rotate_image(img, 90)
+    img = apply_text_watermark_to_image(img, "© Benchmark", font_size=48)
+    image_editor.save_image(img, out)
+
+
+def _case_editor_pipeline(path, out, ctx):
+    """Internal: the same chain as _case_editor_chain through image_editor.Pipeline."""
+    import image_editor
+    with image_editor.Image.open(path) as probe:
+        w = probe.width // 2
+        h = probe.height * w // probe.width
+    image_editor.Pipeline(path).resize(width=w).crop(0, 0, w * 3 // 4, h * 3 // 4) \
+        .rotate(90).text_watermark("© Benchmark", font_size=48).save(out)
+
+
+class _Skip(Exception):
+    """Internal: raised by a case that does not apply to an input."""
+
+
+# encoders.ENCODER_PROFILES names, listed here so importing this module stays Pillow-free
+ENCODER_CASES = ["default", "web", "archive", "fast", "webp", "avif"]
+
+
+CASES = {
+    "add_text_watermark": _case_add_text_watermark,
+    "apply_text_watermark_to_image": _case_apply_text_watermark_to_image,
+    "add_logo_watermark": _case_add_logo_watermark,
+    "batch_process": _case_batch_process,
+    "image_editor.resize_image": _editor_case(
+        lambda ed, img: ed.resize_image(img, width=img.width // 2)),
+    "image_editor.crop_image": _editor_case(
+        lambda ed, img: ed.crop_image(img, 0, 0, img.width // 2, img.height // 2)),
+    "image_editor.rotate_image": _editor_case(lambda ed, img: ed.rotate_image(img, 90)),
+    "image_editor.flip_horizontal": _editor_case(lambda ed, img: ed.flip_horizontal(img)),
+    "image_editor.convert_to_grayscale": _editor_case(
+        lambda ed, img: ed.convert_to_grayscale(img)),
+    "image_editor.convert_format": _case_convert_format,
+    "image_editor.compress_image": _case_compress_image,
+    "image_editor.chain": _case_editor_chain,
+    "image_editor.pipeline": _case_editor_pipeline,
+}
+CASES.update((f"encoder.{name}", _encoder_case(name)) for name in ENCODER_CASES)
+
+
+def _run_case(case, path, workdir, repeat, ctx):
+    """
+    Internal: run one case in the current (fresh) process.
+    One untimed warm-up run populates font/logo caches, then repeat timed runs.
+    :return: dict with per-run seconds and peak RSS (plus any measurements the
+             case returned for its fastest run), or skipped/error info
+    """
+    out_dir = os.path.join(workdir, "out")
+    os.makedirs(out_dir, exist_ok=True)
+    out = os.path.join(out_dir, "result" + os.path.splitext(path)[1])
+    fn = CASES[case]
+    try:
+        fn(path, out, ctx)
+        seconds = []
+        extra = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            measured = fn(path, out, ctx)
+            seconds.append(time.perf_counter() - started)
+            if seconds[-1] == min(seconds):
+                extra = measured
+    except _Skip as e:
+        return {"skipped": str(e)}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        rss *= 1024
+    return {"seconds": seconds, "peak_rss_bytes": rss, **(extra or {})}
+
+
+def measure_startup(workdir, repeat=5):
+    """
+    Wall time of fresh interpreters: bare Python, the CLI's argument parsing,
+    and a one-image CLI batch of a tiny input (import + first output).
+    Also records any GUI module the batch path imported.
+
+    :return: dict of best seconds per command, plus "gui_modules"
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    tiny = os.path.join(workdir, "startup_input.png")
+    if not os.path.exists(tiny):
+        subprocess.run([sys.executable, "-c",
+                        f"from PIL import Image; Image.new('RGB', (64, 64)).save({tiny!r})"],
+                       check=True)
+    out_dir = os.path.join(workdir, "startup_out")
+    batch = ["batch", tiny, "-o", out_dir, "--text", "x", "-q"]
+    commands = {
+        "interpreter": ["-c", "pass"],
+        "cli_help": ["-m", "watermark_app", "--help"],
+        "cli_batch": ["-m", "watermark_app"] + batch,
+    }
+    startup = {}
+    for name, args in commands.items():
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            subprocess.run([sys.executable] + args, cwd=here, check=True, stdout=subprocess.DEVNULL)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        startup[name] = best
+
+    probe = (f"import sys, watermark_app; watermark_app.main({batch!r}); "
+             f"print(','.join(m for m in {GUI_MODULES!r} if m in sys.modules))")
+    found = subprocess.run([sys.executable, "-c", probe], cwd=here, check=True,
+                           capture_output=True, text=True).stdout.strip()
+    startup["gui_modules"] = found.split(",") if found else []
+    return startup
+
+
+def _in_fresh_process(fn, *args):
+    """Internal: call fn(*args) in a newly spawned interpreter and return its result."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def run(sizes=None, formats=None, modes=None, cases=None, repeat=3,
+        workdir=None, batch_count=8, workers=None, progress=print, startup=True):
+    """
+    Run the benchmark matrix.
+
+    :param sizes: list of megapixel sizes (default SIZES_MP)
+    :param formats: list of 'JPEG' / 'PNG'
+    :param modes: list of 'RGB' / 'RGBA' / 'L'
+    :param cases: list of case names (default all of CASES)
+    :param repeat: timed runs per case
+    :param workdir: where synthetic inputs are generated and kept
+    :param batch_count: images per batch_process run
+    :param workers: workers= passed to batch_process
+    :param progress: fn(str) for progress lines, or None
+    :param startup: also measure CLI startup (see measure_startup)
+    :return: results dict (see write_results)
+    """
+    workdir = workdir or os.path.join(tempfile.gettempdir(), "watermark_benchmark")
+    os.makedirs(workdir, exist_ok=True)
+    ctx = {"logo": _make_logo(workdir), "batch_count": batch_count, "workers": workers}
+    results = []
+
+    for mp in sizes or SIZES_MP:
+        for fmt in formats or list(FORMATS):
+            for mode in modes or MODES:
+                if fmt == "JPEG" and mode == "RGBA":
+                    continue
+                path = _in_fresh_process(_make_input, workdir, mp, fmt, mode)
+                in_bytes = os.path.getsize(path)
+                for case in cases or list(CASES):
+                    res = _in_fresh_process(_run_case, case, path, workdir, repeat, ctx)
+                    entry = {"case": case, "megapixels": mp, "format": fmt, "mode": mode}
+                    if "seconds" in res:
+                        images = batch_count if case == "batch_process" else 1
+                        best = min(res["seconds"])
+                        entry.update({
+                            "seconds": best,
+                            "images_per_sec": images / best,
+                            "mb_per_sec": images * in_bytes / best / 1e6,
+                            "peak_rss_mb": res["peak_rss_bytes"] / 1e6,
+                        })
+                        for k in ("encode_seconds", "bytes_written"):
+                            if k in res:
+                                entry[k] = res[k]
+                    else:
+                        entry.update(res)
+                    results.append(entry)
+                    if progress:
+                        progress(_format_row(entry))
+
+    startup_times = None
+    if startup:
+        startup_times = measure_startup(workdir)
+        if progress:
+            progress(_format_startup(startup_times))
+
+    return {
+        "startup": startup_times,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def _key(entry):
+    """Internal: identity of a result row across runs."""
+    return entry["case"], entry["megapixels"], entry["format"], entry["mode"]
+
+
+def _format_row(entry):
+    """Internal: one human-readable result line."""
+    label = f'{entry["case"]:<36} {entry["megapixels"]:>4} MP {entry["format"]:<4} {entry["mode"]:<4}'
+    if "images_per_sec" in entry:
+        row = (f'{label} {entry["images_per_sec"]:8.2f} img/s {entry["mb_per_sec"]:8.2f} MB/s '
+               f'{entry["peak_rss_mb"]:8.1f} MB peak')
+        if "bytes_written" in entry:
+            row += (f' {entry["encode_seconds"] * 1000:8.1f} ms encode '
+                    f'{entry["bytes_written"] / 1e6:8.2f} MB out')
+        return row
+    return f'{label} {"skipped: " + entry["skipped"] if "skipped" in entry else "ERROR: " + entry["error"]}'
+
+
+def _format_startup(startup):
+    """Internal: one human-readable startup line."""
+    times = " ".join(f"{k} {v * 1000:.0f} ms" for k, v in startup.items() if k != "gui_modules")
+    gui = ", ".join(startup["gui_modules"]) or "none"
+    return f'{"startup":<36} {times}  (GUI modules imported: {gui})'
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare images/sec (and CLI startup time) against a baseline run.
+
+    :param results: dict returned by run()
+    :param baseline: dict returned by run() / load_results()
+    :param threshold: relative slowdown above which a case counts as a regression
+    :return: list of dicts (case key, baseline, current, change) for regressions
+    """
+    base = {_key(e): e for e in baseline["results"] if "images_per_sec" in e}
+    regressions = []
+    for entry in results["results"]:
+        old = base.get(_key(entry))
+        if not old or "images_per_sec" not in entry:
+            continue
+        change = entry["images_per_sec"] / old["images_per_sec"] - 1
+        if change < -threshold:
+            regressions.append({
+                "case": entry["case"], "megapixels": entry["megapixels"],
+                "format": entry["format"], "mode": entry["mode"],
+                "baseline_images_per_sec": old["images_per_sec"],
+                "images_per_sec": entry["images_per_sec"],
+                "change": change,
+            })
+
+    # startup: slower CLI commands (the bare interpreter is only a reference)
+    # and any GUI module on the headless path
+    startup = results.get("startup") or {}
+    old_startup = baseline.get("startup") or {}
+    for name, seconds in startup.items():
+        old = old_startup.get(name)
+        if name in ("interpreter", "gui_modules") or not old:
+            continue
+        change = seconds / old - 1
+        if change > threshold:
+            regressions.append({
+                "case": f"startup.{name}", "baseline_seconds": old, "seconds": seconds,
+                "change": change,
+            })
+    if startup.get("gui_modules"):
+        regressions.append({"case": "startup.gui_modules", "modules": startup["gui_modules"]})
+    return regressions
+
+
+def write_results(results, path):
+    """Save results as JSON."""
+    with open(path, "w") as f:
+        json.dump(results, f, indent=4)
+
+
+def load_results(path):
+    """Load results saved by write_results."""
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=float, nargs="+", help="megapixel sizes (default: 1 12 50 100)")
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS))
+    parser.add_argument("--modes", nargs="+", choices=MODES)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES))
+    parser.add_argument("--quick", action="store_true", help=f"only {QUICK_SIZES_MP} MP")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-count", type=int, default=8)
+    parser.add_argument("--workers", type=int, help="workers= for batch_process")
+    parser.add_argument("--workdir", help="directory for synthetic inputs (kept between runs)")
+    parser.add_argument("--output", help="write JSON results here")
+    parser.add_argument("--baseline", help="compare against this JSON results file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="regression threshold as a fraction (default 0.10)")
+    parser.add_argument("--no-startup", action="store_true", help="skip the CLI startup timing")
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_SIZES_MP if args.quick else SIZES_MP)
+    results = run(sizes, args.formats, args.modes, args.cases, args.repeat,
+                  args.workdir, args.batch_count, args.workers, startup=not args.no_startup)
+    if args.output:
+        write_results(results, args.output)
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        for r in regressions:
+            if "modules" in r:
+                print(f'REGRESSION {r["case"]}: headless CLI imported {", ".join(r["modules"])}')
+            elif "seconds" in r:
+                print(f'REGRESSION {r["case"]}: {r["baseline_seconds"] * 1000:.0f} -> '
+                      f'{r["seconds"] * 1000:.0f} ms ({r["change"]:+.0%})')
+            else:
+                print(f'REGRESSION {r["case"]} {r["megapixels"]} MP {r["format"]} {r["mode"]}: '
+                      f'{r["baseline_images_per_sec"]:.2f} -> {r["images_per_sec"]:.2f} img/s '
+                      f'({r["change"]:+.0%})')
+        if regressions:
+            return 1
+        print(f"No regressions above {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# encoders.py
+
+import os
+from PIL import Image
+
+# Named output encoder profiles. Keys (all optional):
+#   format          output format override ('JPEG', 'PNG', 'WEBP', 'AVIF'); None keeps
+#                   the format implied by the output file extension
+#   quality         JPEG / WebP / AVIF quality
+#   progressive     JPEG progressive scan
+#   subsampling     JPEG chroma subsampling ('4:4:4', '4:2:2', '4:2:0')
+#   optimize        JPEG Huffman table optimization (PNG size is set by compress_level;
+#                   Pillow's PNG optimize pass is far slower for little gain)
+#   compress_level  PNG zlib level 0-9
+#   method          WebP effort 0 (fast) - 6 (small)
+#   speed           AVIF speed 0 (small) - 10 (fast)
+#   passthrough     copy the source file when the watermark changes no pixels and
+#                   the output format matches the input (default True)
+ENCODER_PROFILES = {
+    # Pillow defaults (what add_*_watermark always did)
+    "default": {},
+    "web": {
+        "quality": 82, "progressive": True, "subsampling": "4:2:0",
+        "optimize": True, "compress_level": 6, "method": 4, "speed": 6,
+    },
+    "archive": {
+        "quality": 95, "subsampling": "4:4:4", "optimize": True,
+        "compress_level": 9, "method": 6, "speed": 4,
+    },
+    "fast": {
+        "quality": 85, "optimize": False, "compress_level": 1, "method": 0, "speed": 10,
+    },
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "avif": {"format": "AVIF", "quality": 60, "speed": 6},
+}
+
+# Save keyword arguments each writer understands
+_FORMAT_PARAMS = {
+    "JPEG": ("quality", "progressive", "subsampling", "optimize"),
+    "PNG": ("compress_level",),
+    "WEBP": ("quality", "method"),
+    "AVIF": ("quality", "speed"),
+}
+
+# Extension used when a profile overrides the format
+_FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "AVIF": ".avif"}
+
+# 16-bit / float modes; value scales 8-bit levels to the mode's range
+HIGH_BIT_MODES = {"I": 257, "I;16": 257, "I;16L": 257, "I;16B": 257, "I;16N": 257, "F": 1}
+
+# Modes each writer stores as-is; anything else is converted by writable()
+_WRITABLE_MODES = {
+    "JPEG": ("L", "RGB", "CMYK"),
+    "PNG": ("1", "L", "LA", "P", "RGB", "RGBA", "I", "I;16"),
+    "WEBP": ("RGB", "RGBA"),
+    "AVIF": ("RGB", "RGBA"),
+    "BMP": ("1", "L", "P", "RGB"),
+    "GIF": ("1", "L", "P"),
+}
+
+
+def get_profile(encoder=None):
+    """
+    Resolve an encoder setting to a profile dict.
+
+    :param encoder: None (Pillow defaults), a name from ENCODER_PROFILES, or a
+                    dict of profile keys (e.g. from a preset); a dict may name a
+                    base profile under "profile" and override some of its keys
+    :return: new dict
+    """
+    if encoder is None:
+        return {}
+    if isinstance(encoder, str):
+        if encoder not in ENCODER_PROFILES:
+            raise ValueError(
+                f"Unknown encoder profile: {encoder!r} (expected one of {', '.join(ENCODER_PROFILES)})"
+            )
+        return dict(ENCODER_PROFILES[encoder])
+    profile = get_profile(encoder.get("profile"))
+    profile.update((k, v) for k, v in encoder.items() if k != "profile")
+    return profile
+
+
+def output_extension(ext, encoder=None):
+    """
+    :param ext: extension of the input/output file, e.g. '.png'
+    :param encoder: encoder setting (see get_profile)
+    :return: ext, or the extension of the profile's format override
+    """
+    fmt = get_profile(encoder).get("format")
+    return _FORMAT_EXTENSIONS.get(fmt.upper(), ext) if fmt else ext
+
+
+def output_format(output_path, encoder=None):
+    """
+    Pillow format name for an output, or None if it cannot be told.
+
+    :param output_path: file path, or a file object (format from the profile only)
+    :param encoder: encoder setting (see get_profile)
+    """
+    fmt = get_profile(encoder).get("format")
+    if fmt:
+        fmt = fmt.upper()
+    elif isinstance(output_path, str):
+        ext = os.path.splitext(output_path)[1].lower()
+        # common formats are known after preinit; only fall back to loading every plugin
+        Image.preinit()
+        fmt = Image.EXTENSION.get(ext) or Image.registered_extensions().get(ext)
+    if fmt:
+        require_encoder(fmt)
+    return fmt
+
+
+def require_encoder(fmt):
+    """
+    :raises OSError: if Pillow cannot write fmt (e.g. a read-only input format)
+    """
+    if fmt not in Image.SAVE:
+        Image.init()
+        if fmt not in Image.SAVE:
+            raise OSError(f"No {fmt} encoder available in this Pillow build")
+
+
+def stores_mode(fmt, mode):
+    """:return: whether the writer for fmt stores mode as-is (no conversion in writable())"""
+    modes = _WRITABLE_MODES.get(fmt)
+    return modes is None or mode in modes
+
+
+def writable(img, fmt):
+    """
+    :return: img in a mode the writer for fmt can store; img itself when it
+             already can (or the format is not in _WRITABLE_MODES)
+    """
+    if stores_mode(fmt, img.mode):
+        return img
+    modes = _WRITABLE_MODES[fmt]
+    alpha = img.mode in ("RGBA", "LA", "PA", "RGBa", "La") or "transparency" in img.info
+    if img.mode in HIGH_BIT_MODES and "L" in modes:
+        # scale 16-bit levels down instead of clipping them
+        factor = HIGH_BIT_MODES[img.mode]
+        img = img.convert("F" if img.mode == "F" else "I")
+        if factor != 1:
+            img = img.point(lambda v: v / factor)
+        return img.convert("L")
+    if img.mode in ("1", "LA", "La") and "L" in modes:
+        return img.convert("L")
+    if alpha and "RGBA" in modes:
+        return img.convert("RGBA")
+    if "RGB" in modes:
+        return img.convert("RGB")
+    return img.convert(modes[-1])
+
+
+def save_params(fmt, encoder=None):
+    """
+    :return: Image.save keyword arguments of the profile that apply to fmt
+    """
+    profile = get_profile(encoder)
+    return {k: profile[k] for k in _FORMAT_PARAMS.get(fmt, ()) if profile.get(k) is not None}
+
+
+def encode(img, fp, fmt, encoder=None):
+    """
+    Save img to a path or file object with the profile's settings for fmt.
+    The image must already be in a writable mode (see writable()).
+    """
+    img.save(fp, format=fmt, **save_params(fmt, encoder))
+
+
+def can_passthrough(source_format, fmt, encoder=None):
+    """
+    Whether unchanged pixels may be written by copying the source file.
+    :param source_format: Image.format of the opened input
+    :param fmt: output format
+    """
+    return bool(source_format) and source_format == fmt and get_profile(encoder).get("passthrough", True)
@@ -0,0 +1,239 @@
+# fonts.py
+
+import os
+import json
+from functools import lru_cache
+from PIL import ImageFont
+from config import BASE, DEFAULT_FONT_PATH
+
+# Bundled fonts and their persisted index in <project_root>/font_index.json
+FONTS_DIR = os.path.join(BASE, "assets", "fonts")
+FONT_INDEX_FILE = os.path.join(BASE, "font_index.json")
+FONT_EXTENSIONS = (".ttf", ".otf")
+SYSTEM_FONTS = ("arial.ttf", "Calibri.ttf")
+
+# Loaded FreeType faces kept per process, keyed by (path, size, variation)
+FONT_CACHE_SIZE = 128
+
+_WEIGHTS = {
+    "thin": 100, "hairline": 100,
+    "extralight": 200, "ultralight": 200,
+    "light": 300,
+    "regular": 400, "normal": 400, "book": 400,
+    "medium": 500,
+    "semibold": 600, "demibold": 600,
+    "bold": 700,
+    "extrabold": 800, "ultrabold": 800,
+    "black": 900, "heavy": 900,
+}
+
+_index = None
+
+
+def _style_weight(style):
+    """Internal: map a style name like 'SemiBold Italic' to a CSS weight."""
+    words = style.lower().replace("-", " ").split()
+    for i, word in enumerate(words):
+        # two-word forms first ("extra bold" -> "extrabold")
+        pair = word + (words[i + 1] if i + 1 < len(words) else "")
+        if pair in _WEIGHTS:
+            return _WEIGHTS[pair]
+        if word in _WEIGHTS:
+            return _WEIGHTS[word]
+    return 400
+
+
+def _describe(path):
+    """Internal: read family, style and variation axes from one font file."""
+    font = ImageFont.truetype(path, 12)
+    family, style = font.getname()
+    try:
+        axes = [
+            {
+                "name": a["name"].decode() if isinstance(a["name"], bytes) else a["name"],
+                "min": a["minimum"],
+                "max": a["maximum"],
+                "default": a["default"],
+            }
+            for a in font.get_variation_axes()
+        ]
+        names = [n.decode() if isinstance(n, bytes) else n for n in font.get_variation_names()]
+    except OSError:
+        # not a variable font
+        axes, names = [], []
+    return {
+        "family": family,
+        "style": style,
+        "weight": _style_weight(style),
+        "italic": "italic" in style.lower() or "oblique" in style.lower(),
+        "axes": axes,
+        "instances": names,
+    }
+
+
+def _scan(fonts_dir, previous):
+    """
+    Internal: walk fonts_dir and describe every font file, reusing entries
+    from the previous index whose size and mtime are unchanged.
+    :return: (entries keyed by relative path, whether anything changed)
+    """
+    entries = {}
+    changed = False
+    for root, _, files in os.walk(fonts_dir):
+        for fname in files:
+            if not fname.lower().endswith(FONT_EXTENSIONS):
+                continue
+            path = os.path.join(root, fname)
+            rel = os.path.relpath(path, fonts_dir)
+            st = os.stat(path)
+            old = previous.get(rel)
+            if old and old.get("mtime") == st.st_mtime_ns and old.get("size") == st.st_size:
+                entries[rel] = old
+                continue
+            try:
+                entry = _describe(path)
+            except OSError:
+                continue
+            entry["mtime"] = st.st_mtime_ns
+            entry["size"] = st.st_size
+            entries[rel] = entry
+            changed = True
+    if set(previous) - set(entries):
+        changed = True
+    return entries, changed
+
+
+def _read_index_file():
+    """Internal: load the persisted index, return dict."""
+    try:
+        with open(FONT_INDEX_FILE, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("fonts_dir") != FONTS_DIR:
+        return {}
+    return data.get("fonts", {})
+
+
+def _write_index_file(entries):
+    """Internal: persist the index atomically; a read-only tree is not an error."""
+    tmp = f"{FONT_INDEX_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump({"fonts_dir": FONTS_DIR, "fonts": entries}, f, indent=4)
+        os.replace(tmp, FONT_INDEX_FILE)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def font_index(refresh=False):
+    """
+    Index of the bundled fonts, built on first use and persisted to disk.
+    Only files added or modified since the last run are opened with FreeType.
+
+    :param refresh: re-check the fonts directory even if already indexed
+    :return: dict of relative path -> {family, style, weight, italic, axes, instances}
+    """
+    global _index
+    if _index is None or refresh:
+        previous = _index if _index is not None else _read_index_file()
+        entries, changed = _scan(FONTS_DIR, previous)
+        if changed:
+            _write_index_file(entries)
+        _index = entries
+    return _index
+
+
+def list_families():
+    """
+    List the font families available in assets/fonts.
+    :return: sorted list of str
+    """
+    return sorted({entry["family"] for entry in font_index().values()})
+
+
+def find_font(family, weight=400, italic=False):
+    """
+    Find the bundled font file closest to the requested family and style.
+    Static faces are preferred; a variable face covering the weight is the
+    fallback, returned with the axis values that select that weight.
+
+    :param family: family name, case-insensitive prefix (e.g. 'Inter', 'Oswald')
+    :param weight: CSS weight 100-900
+    :param italic: whether an italic face is wanted
+    :return: (absolute font path, variation for get_font/load_font or None),
+             or (None, None) if the family is not bundled
+    """
+    family = family.lower()
+    best, best_score, best_variation = None, None, None
+    for rel, entry in font_index().items():
+        if not entry["family"].lower().startswith(family):
+            continue
+        score = 0 if entry["italic"] == italic else 1000
+        variation = None
+        wght = next((a for a in entry["axes"] if a["name"].lower() == "weight"), None)
+        if wght and wght["min"] <= weight <= wght["max"]:
+            score += 1
+            # every axis at its default except the weight
+            variation = tuple(
+                weight if a is wght else a["default"] for a in entry["axes"]
+            )
+        else:
+            score += abs(entry["weight"] - weight)
+        if best_score is None or score < best_score:
+            best, best_score, best_variation = rel, score, variation
+    if best is None:
+        return None, None
+    return os.path.join(FONTS_DIR, best), best_variation
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def get_font(font_path, size, variation=None):
+    """
+    Load a FreeType face, cached per (path, size, variation).
+
+    :param font_path: path to .ttf/.otf font file
+    :param size: font size in points
+    :param variation: None, a named instance (e.g. 'Bold') or a tuple of axis values
+    :return: ImageFont.FreeTypeFont
+    :raises OSError: if the file cannot be loaded or the variation is invalid
+    """
+    font = ImageFont.truetype(font_path, size)
+    if isinstance(variation, str):
+        font.set_variation_by_name(variation)
+    elif variation:
+        font.set_variation_by_axes(list(variation))
+    return font
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(font_path=None, size=36, variation=None):
+    """
+    Load a font, falling back to the bundled default, then common system
+    fonts, then Pillow's built-in font. The result, fallbacks included,
+    is cached so missing fonts are only probed once per process.
+
+    :param font_path: path to .ttf font file or None for default
+    :param size: font size in points
+    :param variation: see get_font
+    :return: ImageFont font object
+    """
+    for path in (font_path, DEFAULT_FONT_PATH) + SYSTEM_FONTS:
+        if not path:
+            continue
+        try:
+            return get_font(path, size, variation if path == font_path else None)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def clear_cache():
+    """Drop every cached font face and the in-memory index."""
+    global _index
+    get_font.cache_clear()
+    load_font.cache_clear()
+    _index = None
@@ -1,6 +1,25 @@
 # image_editor.py
 
+import math
 from PIL import Image, ImageOps
+from encoders import encode, output_format, writable
+
+# Pipeline.resize: shrink by whole factors with reduce() first while the remaining
+# LANCZOS pass still has at least this factor to go (see Image.resize)
+REDUCING_GAP = 3.0
+
+# Flips / quarter turns as (swap axes, flip x, flip y), applied in that order
+_TRANSPOSES = {
+    (0, 1, 0): Image.Transpose.FLIP_LEFT_RIGHT,
+    (0, 0, 1): Image.Transpose.FLIP_TOP_BOTTOM,
+    (0, 1, 1): Image.Transpose.ROTATE_180,
+    (1, 0, 1): Image.Transpose.ROTATE_90,
+    (1, 1, 0): Image.Transpose.ROTATE_270,
+    (1, 0, 0): Image.Transpose.TRANSPOSE,
+    (1, 1, 1): Image.Transpose.TRANSVERSE,
+}
+_IDENTITY = (0, 0, 0)
+_QUARTER_TURNS = {90: (1, 0, 1), 180: (0, 1, 1), 270: (1, 1, 0)}  # counter-clockwise
 
 def load_image(path):
     """
@@ -10,20 +29,39 @@ def load_image(path):
     """
     return Image.open(path)
 
-def save_image(img, path, format=None, quality=95):
+def save_image(img, path, format=None, quality=95, encoder=None):
     """
     Save a PIL Image object to the specified path.
     :param img: PIL Image object.
     :param path: Output file path.
     :param format: Optional format override (e.g., 'JPEG', 'PNG').
     :param quality: For lossy formats (JPEG), quality from 1 (worst) to 95 (best).
+    :param encoder: Optional encoders profile name or dict; replaces format/quality.
     """
+    if encoder is not None:
+        fmt = output_format(path, encoder)
+        encode(writable(img, fmt), path, fmt, encoder)
+        return
     params = {}
     if quality and path.lower().endswith(('.jpg', '.jpeg')):
         params['quality'] = quality
         params['optimize'] = True
     img.save(path, format=format, **params)
 
+def _target_size(size, width, height, keep_aspect_ratio):
+    """Internal: resize_image's output size for an image of size, or None for no resize."""
+    orig_w, orig_h = size
+    if keep_aspect_ratio:
+        if width and not height:
+            height = int(orig_h * (width / orig_w))
+        elif height and not width:
+            width = int(orig_w * (height / orig_h))
+        elif not width and not height:
+            return None
+    elif not (width and height):
+        return None
+    return width, height
+
 def resize_image(img, width=None, height=None, keep_aspect_ratio=True):
     """
     Resize the image to the given width and/or height.
@@ -34,21 +72,10 @@ def resize_image(img, width=None, height=None, keep_aspect_ratio=True):
     :param keep_aspect_ratio: Preserve original aspect ratio.
     :return: Resized PIL Image object.
     """
-    orig_w, orig_h = img.size
-    if keep_aspect_ratio:
-        if width and not height:
-            ratio = width / orig_w
-            height = int(orig_h * ratio)
-        elif height and not width:
-            ratio = height / orig_h
-            width = int(orig_w * ratio)
-        elif not width and not height:
-            return img.copy()
-    else:
-        if not (width and height):
-            return img.copy()
-
-    return img.resize((width, height), Image.ANTIALIAS)
+    size = _target_size(img.size, width, height, keep_aspect_ratio)
+    if size is None:
+        return img.copy()
+    return img.resize(size, Image.Resampling.LANCZOS)
 
 def crop_image(img, left, upper, right, lower):
     """
@@ -115,3 +142,257 @@ def compress_image(input_path, output_path, quality=85):
     """
     with Image.open(input_path) as img:
         img.save(output_path, quality=quality, optimize=True)
+
+def _compose(first, then):
+    """Internal: the (swap, flip x, flip y) transform equal to `first` followed by `then`."""
+    swap, fx, fy = first
+    if then[0]:
+        fx, fy = fy, fx
+    return (swap ^ then[0], fx ^ then[1], fy ^ then[2])
+
+def _rotated_size(size, angle):
+    """Internal: output size of Image.rotate(angle, expand=True), computed the way Pillow does."""
+    w, h = size
+    a = -math.radians(angle % 360.0)
+    m = [round(math.cos(a), 15), round(math.sin(a), 15), 0.0,
+         round(-math.sin(a), 15), round(math.cos(a), 15), 0.0]
+    cx, cy = w / 2.0, h / 2.0
+    m[2] = m[0] * -cx + m[1] * -cy + cx
+    m[5] = m[3] * -cx + m[4] * -cy + cy
+    xs = [m[0] * x + m[1] * y + m[2] for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    ys = [m[3] * x + m[4] * y + m[5] for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    return (math.ceil(max(xs)) - math.floor(min(xs)),
+            math.ceil(max(ys)) - math.floor(min(ys)))
+
+class Pipeline:
+    """
+    Lazy chain of edits on one image, run with a single decode and a single
+    encode:
+
+        Pipeline("in.jpg").resize(width=1600).crop(0, 0, 1600, 900).rotate(90) \\
+            .text_watermark("© Studio", position="tiled").save("out.jpg", encoder="web")
+
+    Before running, each stretch of crops, resizes, flips and quarter turns
+    is folded into at most one resize (or crop) and one transpose: crops
+    become the source box of the resize, so only the kept region is
+    resampled, and chained flips/rotations collapse into a single
+    transpose. When the plan downsizes, JPEGs are decoded at reduced scale
+    (draft) and other formats are shrunk with reduce() before the LANCZOS
+    pass; both stop while that pass still has REDUCING_GAP to go, which
+    keeps the result within about 1/255 of plain LANCZOS on average.
+    Watermark steps, arbitrary-angle rotations and crops reaching outside
+    the image run as written and are not moved across. Sizes always match
+    the step-by-step functions, and crop/flip/quarter-turn chains match
+    them pixel for pixel.
+    """
+
+    def __init__(self, source):
+        """
+        :param source: image path or binary file object
+        """
+        self.source = source
+        self.ops = []
+
+    def resize(self, width=None, height=None, keep_aspect_ratio=True):
+        """Record resize_image(width, height, keep_aspect_ratio). :return: self"""
+        self.ops.append(("resize", width, height, keep_aspect_ratio))
+        return self
+
+    def crop(self, left, upper, right, lower):
+        """Record crop_image(left, upper, right, lower). :return: self"""
+        self.ops.append(("crop", (left, upper, right, lower)))
+        return self
+
+    def rotate(self, angle, expand=True):
+        """Record rotate_image(angle, expand). :return: self"""
+        self.ops.append(("rotate", angle, expand))
+        return self
+
+    def flip_horizontal(self):
+        """:return: self"""
+        self.ops.append(("transpose", (0, 1, 0)))
+        return self
+
+    def flip_vertical(self):
+        """:return: self"""
+        self.ops.append(("transpose", (0, 0, 1)))
+        return self
+
+    def grayscale(self):
+        """:return: self"""
+        self.ops.append(("grayscale",))
+        return self
+
+    def text_watermark(self, text, **options):
+        """Record apply_text_watermark_to_image(text, **options). :return: self"""
+        self.ops.append(("watermark", "text", text, options))
+        return self
+
+    def logo_watermark(self, logo_path, **options):
+        """Record apply_logo_watermark_to_image(logo_path, **options). :return: self"""
+        self.ops.append(("watermark", "logo", logo_path, options))
+        return self
+
+    def plan(self, size):
+        """
+        Simplified steps for a source image of the given size.
+
+        :param size: (width, height) of the source image
+        :return: list of steps: ("convert", "L"), ("resize", size, box),
+                 ("crop", box), ("transpose", Image.Transpose), ("rotate", angle, expand),
+                 ("crop_pad", box) or ("watermark", kind, content, options)
+        """
+        steps = []
+        # current stretch: region `box` of the stretch's input, resampled to
+        # `out` pixels, then transposed by `t`
+        box = out = t = None
+        resized = gray = False
+
+        def begin(size):
+            nonlocal box, out, t, resized, gray
+            box, out, t = (0, 0) + tuple(size), tuple(size), _IDENTITY
+            resized = gray = False
+
+        def flush():
+            """Emit the folded stretch; return the size it produces."""
+            if gray:
+                # before resampling: one channel instead of three
+                steps.append(("convert", "L"))
+            if resized:
+                steps.append(("resize", out, box))
+            elif box != (0, 0) + size_in:
+                steps.append(("crop", tuple(int(round(v)) for v in box)))
+            if t != _IDENTITY:
+                steps.append(("transpose", _TRANSPOSES[t]))
+            return current()
+
+        def current():
+            return (out[1], out[0]) if t[0] else out
+
+        size_in = tuple(size)
+        begin(size_in)
+        for op in self.ops:
+            kind = op[0]
+            if kind == "resize":
+                target = _target_size(current(), *op[1:])
+                if target and target != current():
+                    out = (target[1], target[0]) if t[0] else tuple(target)
+                    resized = True
+            elif kind == "crop":
+                cw, ch = current()
+                left, upper, right, lower = op[1]
+                if not (0 <= left < right <= cw and 0 <= upper < lower <= ch):
+                    # pads with black outside the image: keep it as written
+                    size_in = flush()
+                    steps.append(("crop_pad", op[1]))
+                    size_in = (right - left, lower - upper)
+                    begin(size_in)
+                    continue
+                # undo the pending transpose: flips first, then the axis swap
+                if t[1]:
+                    left, right = cw - right, cw - left
+                if t[2]:
+                    upper, lower = ch - lower, ch - upper
+                if t[0]:
+                    left, upper, right, lower = upper, left, lower, right
+                # then map onto the source box of the pending resize
+                sx = (box[2] - box[0]) / out[0]
+                sy = (box[3] - box[1]) / out[1]
+                box = (box[0] + left * sx, box[1] + upper * sy,
+                       box[0] + right * sx, box[1] + lower * sy)
+                out = (right - left, lower - upper)
+            elif kind == "transpose":
+                t = _compose(t, op[1])
+            elif kind == "rotate":
+                angle, expand = op[1] % 360, op[2]
+                cw, ch = current()
+                if angle == 0:
+                    continue
+                if angle in _QUARTER_TURNS and (expand or angle == 180 or cw == ch):
+                    t = _compose(t, _QUARTER_TURNS[angle])
+                    continue
+                size_in = flush()
+                steps.append(("rotate", op[1], expand))
+                if expand:
+                    size_in = _rotated_size((cw, ch), op[1])
+                begin(size_in)
+            elif kind == "grayscale":
+                gray = True
+            elif kind == "watermark":
+                size_in = flush()
+                steps.append(op)
+                begin(size_in)
+        flush()
+        return steps
+
+    def run(self):
+        """
+        Decode once and apply the simplified plan.
+        :return: PIL Image
+        """
+        img = Image.open(self.source)
+        steps = self.plan(img.size)
+        self._draft(img, steps)
+        for step in steps:
+            img = self._apply(img, step)
+        return img
+
+    @staticmethod
+    def _draft(img, steps):
+        """
+        Internal: let libjpeg decode at reduced scale when the first resize
+        shrinks. Its DCT scaling is cruder than LANCZOS, so it only goes as
+        far as leaves the resize a REDUCING_GAP factor (like Image.thumbnail).
+        """
+        if img.format != "JPEG":
+            return
+        mode = img.mode
+        first = steps[:2]
+        if first and first[0] == ("convert", "L"):
+            mode, first = "L", first[1:]
+        if not first or first[0][0] != "resize":
+            if mode != img.mode:
+                img.draft(mode, img.size)
+            return
+        _, out, box = first[0]
+        w, h = img.size
+        # full-frame size at which the box would still be REDUCING_GAP * `out` pixels
+        requested = (math.ceil(w * out[0] / (box[2] - box[0]) * REDUCING_GAP),
+                     math.ceil(h * out[1] / (box[3] - box[1]) * REDUCING_GAP))
+        full = img.size
+        img.draft(mode, requested)
+        if img.size != full:
+            sx, sy = img.width / full[0], img.height / full[1]
+            index = steps.index(first[0])
+            steps[index] = ("resize", out, (box[0] * sx, box[1] * sy, box[2] * sx, box[3] * sy))
+
+    @staticmethod
+    def _apply(img, step):
+        """Internal: run one planned step."""
+        kind = step[0]
+        if kind == "convert":
+            return img if img.mode == step[1] else img.convert(step[1])
+        if kind == "resize":
+            return img.resize(step[1], Image.Resampling.LANCZOS, box=step[2],
+                              reducing_gap=REDUCING_GAP)
+        if kind in ("crop", "crop_pad"):
+            return img.crop(step[1])
+        if kind == "transpose":
+            return img.transpose(step[1])
+        if kind == "rotate":
+            return img.rotate(step[1], expand=step[2])
+        if kind == "watermark":
+            from watermark import apply_logo_watermark_to_image, apply_text_watermark_to_image
+
+            _, wm_kind, content, options = step
+            img.load()
+            if wm_kind == "text":
+                return apply_text_watermark_to_image(img, content, copy=False, **options)
+            return apply_logo_watermark_to_image(img, content, copy=False, **options)
+        raise ValueError(f"Unknown pipeline step: {kind!r}")
+
+    def save(self, path, format=None, quality=95, encoder=None):
+        """
+        Run the pipeline and encode the result once (see save_image).
+        """
+        save_image(self.run(), path, format=format, quality=quality, encoder=encoder)
@@ -0,0 +1,143 @@
+# loadtest.py
+"""
+Load generator for the watermarking service (service.py).
+
+Keeps a fixed number of requests in flight against POST /watermark and
+reports latency percentiles, throughput and the status code mix, so the
+effect of --workers / --max-pending can be measured.
+
+    python -m watermark_app serve --port 8765 --workers 4 &
+    python loadtest.py --image photo.jpg --concurrency 8 --requests 200
+    python loadtest.py --image photo.jpg --duration 30 --query 'text=hi&position=tiled'
+"""
+
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from service import DEFAULT_HOST, DEFAULT_PORT
+
+
+def _percentile(values, fraction):
+    """Internal: nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def run(url, data, query="text=loadtest", concurrency=4, requests=100, duration=None):
+    """
+    Send POST /watermark requests with `concurrency` clients, each on its own
+    keep-alive connection.
+
+    :param url: service base URL, e.g. http://127.0.0.1:8765
+    :param data: encoded image bytes to upload
+    :param query: settings query string (see service.QUERY_SETTINGS)
+    :param requests: total requests to send (ignored when duration is given)
+    :param duration: seconds to keep sending instead of a fixed count
+    :return: dict with latency statistics (seconds), throughput and status counts
+    """
+    parts = urlsplit(url)
+    path = f"/watermark?{query}" if query else "/watermark"
+    headers = {"Content-Type": "application/octet-stream"}
+    lock = threading.Lock()
+    latencies, statuses = [], {}
+    remaining = [requests]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def take():
+        with lock:
+            if deadline is not None:
+                return time.perf_counter() < deadline
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def client():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=120)
+        try:
+            while take():
+                started = time.perf_counter()
+                try:
+                    conn.request("POST", path, body=data, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    status = response.status
+                    if response.getheader("Connection", "").lower() == "close":
+                        conn.close()
+                except (OSError, http.client.HTTPException) as e:
+                    status = type(e).__name__
+                    conn.close()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if status == 200:
+                        latencies.append(elapsed)
+        finally:
+            conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": sum(statuses.values()),
+        "wall_seconds": round(wall, 3),
+        "ok_per_second": round(len(latencies) / wall, 2) if wall else None,
+        "latency_p50": _percentile(latencies, 0.50),
+        "latency_p99": _percentile(latencies, 0.99),
+        "latency_mean": sum(latencies) / len(latencies) if latencies else None,
+        "latency_max": latencies[-1] if latencies else None,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+    }
+
+
+def _format(report):
+    """Internal: human-readable report."""
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.1f} ms"
+
+    statuses = ", ".join(f"{k}: {v}" for k, v in report["statuses"].items())
+    return (
+        f"{report['requests']} requests in {report['wall_seconds']:.2f}s "
+        f"at concurrency {report['concurrency']}: {report['ok_per_second']} ok/s\n"
+        f"latency p50 {ms(report['latency_p50'])}, p99 {ms(report['latency_p99'])}, "
+        f"mean {ms(report['latency_mean'])}, max {ms(report['latency_max'])}\n"
+        f"statuses: {statuses}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the watermarking service.")
+    parser.add_argument("--url", default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+    parser.add_argument("--image", required=True, help="image file to upload")
+    parser.add_argument("--query", default="text=loadtest",
+                        help="settings query string, e.g. 'preset=client' (default text=loadtest)")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight")
+    count = parser.add_mutually_exclusive_group()
+    count.add_argument("--requests", type=int, default=100, help="total requests (default 100)")
+    count.add_argument("--duration", type=float, help="seconds to run instead of a request count")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    with open(args.image, "rb") as f:
+        data = f.read()
+    report = run(args.url, data, args.query, args.concurrency, args.requests, args.duration)
+    print(json.dumps(report, indent=2) if args.json else _format(report))
+    return 0 if report["statuses"].get("200") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# logo_cache.py
+
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+# Memory budget for decoded logos and their scaled variants, per process
+LOGO_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def _file_key(path):
+    """Internal: identify one version of a file on disk."""
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+
+def _opacity_table(opacity):
+    """Internal: 256-entry lookup table scaling alpha by opacity/255."""
+    return [p * opacity // 255 for p in range(256)]
+
+
+class LogoCache:
+    """
+    Decodes each logo once, applies its opacity once, and keeps the
+    scaled variants keyed by target width in a byte-bounded LRU.
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes=LOGO_CACHE_BYTES):
+        """
+        :param max_bytes: evict least recently used entries above this many bytes
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        """Internal: return a cached image and mark it recently used, or None."""
+        img = self._entries.get(key)
+        if img is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return img
+
+    def _store(self, key, img):
+        """Internal: add an image and evict the oldest entries over budget."""
+        # two threads may resize the same miss: replace, don't count twice
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.width * old.height * 4
+        self._entries[key] = img
+        self._bytes += img.width * img.height * 4
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= old.width * old.height * 4
+
+    def source(self, logo_path, opacity=255, file_key=None):
+        """
+        Decoded RGBA logo with opacity already applied to its alpha channel.
+        Reloaded automatically when the file changes on disk.
+
+        :param logo_path: path to watermark logo (PNG with alpha)
+        :param opacity: 0-255 watermark opacity
+        :param file_key: internal, pre-computed file identity
+        :return: PIL Image (shared, do not modify)
+        """
+        key = (file_key or _file_key(logo_path)) + (opacity,)
+        with self._lock:
+            img = self._lookup(key)
+        if img is not None:
+            return img
+
+        img = Image.open(logo_path).convert('RGBA')
+        if opacity < 255:
+            img.putalpha(img.getchannel('A').point(_opacity_table(opacity)))
+        with self._lock:
+            self._store(key, img)
+        return img
+
+    def get(self, logo_path, width, opacity=255):
+        """
+        Logo scaled to the given width (aspect ratio kept) with opacity applied.
+        Each distinct width is resized once and then served from the cache.
+
+        :param logo_path: path to watermark logo (PNG with alpha)
+        :param width: target width in pixels
+        :param opacity: 0-255 watermark opacity
+        :return: PIL Image (shared, do not modify)
+        """
+        file_key = _file_key(logo_path)
+        width = max(int(width), 1)
+        key = file_key + (opacity, width)
+        with self._lock:
+            img = self._lookup(key)
+        if img is not None:
+            return img
+
+        src = self.source(logo_path, opacity, file_key)
+        if width == src.width:
+            return src
+        ratio = src.height / src.width
+        img = src.resize(
+            (width, max(int(width * ratio), 1)),
+            resample=Image.Resampling.LANCZOS
+        )
+        with self._lock:
+            self._store(key, img)
+        return img
+
+    def memory_usage(self):
+        """
+        Snapshot of the cache state.
+        :return: dict with bytes, max_bytes, entries, hits and misses
+        """
+        with self._lock:
+            return {
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def clear(self):
+        """Drop every cached logo."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+# Shared per-process cache used by the watermark functions
+logo_cache = LogoCache()
@@ -1,4 +1,6 @@
+import os
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import filedialog, messagebox
 from tkinterdnd2 import Tk, DND_FILES
 from PIL import Image, ImageTk
@@ -8,10 +10,22 @@ from config import (
     DEFAULT_OPACITY, DEFAULT_POSITION,
     DEFAULT_WATERMARK_COLOR
 )
-from watermark import add_text_watermark, add_logo_watermark, apply_text_watermark_to_image
-from ui_utils import enable_drag_drop, apply_dark_mode, apply_light_mode, rgb_to_hex
+from watermark import (
+    apply_text_watermark_to_image, apply_logo_watermark_to_image, load_image,
+    text_watermark_layout
+)
+from image_editor import save_image
+from ui_utils import apply_dark_mode, apply_light_mode
 from undo_redo import UndoRedoManager
+from preview import PREVIEW_SIZE, load_preview, make_preview
+from batch_runner import BatchDialog
 
+# Debounce before re-rendering the live preview (ms)
+RENDER_DELAY_EDIT = 150
+RENDER_DELAY_DRAG = 30
+POLL_MS = 20
+# Logo width relative to the image width, on the canvas and in exports
+LOGO_SCALE = 0.1
 
 
 class WatermarkApp(Tk):
@@ -21,7 +35,22 @@ class WatermarkApp(Tk):
         self.geometry("800x600")
         self.image_path = None
         self.logo_path = None
+        # full-resolution history; only touched on self._worker
         self.state = UndoRedoManager()
+        # decoding, exports and history steps run here so the Tk loop never waits on Pillow
+        self._worker = ThreadPoolExecutor(max_workers=1)
+        self._preview_job = None
+        self._export_job = None
+        self._history_job = None
+        # worker only: full-resolution decode that exports render onto
+        self._full = None
+        # live preview renders run on their own worker, newest wins
+        self._render_worker = ThreadPoolExecutor(max_workers=1)
+        self._render_job = None
+        self._render_after = None
+        self._render_gen = 0
+        self._wm_mode = None
+        self._wm_pos = None
         self._build_ui()
 
     def on_start_drag(self, event):
@@ -34,10 +63,14 @@ class WatermarkApp(Tk):
        self.canvas.move(self.watermark_item, dx, dy)
        self._drag_data['x'] = event.x
        self._drag_data['y'] = event.y
+       if self._wm_pos:
+           self._wm_pos = (self._wm_pos[0] + dx, self._wm_pos[1] + dy)
+       if self._wm_mode == "text":
+           self._schedule_render(RENDER_DELAY_DRAG)
 
     def _build_ui(self):
         # --- Canvas para sa image + draggable watermark ---
-        self.canvas = tk.Canvas(self, width=600, height=400, bg='lightgray')
+        self.canvas = tk.Canvas(self, width=PREVIEW_SIZE[0], height=PREVIEW_SIZE[1], bg='lightgray')
         self.canvas.pack(pady=10)
 
         self.watermark_item = None
@@ -63,20 +96,39 @@ class WatermarkApp(Tk):
         self.entry = tk.Entry(self, width=40)
         self.entry.insert(0, "Watermark text")
         self.entry.pack(pady=5)
+        self.entry.bind("<KeyRelease>", lambda e: self._schedule_render())
+
+        # Size/opacity sliders update the live preview
+        opts = tk.Frame(self)
+        opts.pack(pady=5)
+        self.size_var = tk.IntVar(value=DEFAULT_FONT_SIZE)
+        self.opacity_var = tk.IntVar(value=DEFAULT_OPACITY)
+        tk.Label(opts, text="Size").pack(side=tk.LEFT)
+        tk.Scale(opts, from_=8, to=200, orient=tk.HORIZONTAL, variable=self.size_var,
+                 command=lambda v: self._schedule_render()).pack(side=tk.LEFT, padx=5)
+        tk.Label(opts, text="Opacity").pack(side=tk.LEFT)
+        tk.Scale(opts, from_=0, to=255, orient=tk.HORIZONTAL, variable=self.opacity_var,
+                 command=lambda v: self._schedule_render()).pack(side=tk.LEFT, padx=5)
         tk.Button(self, text="Add Text Watermark", command=self.add_text).pack(pady=5)
 
         # Logo watermark
         tk.Button(self, text="Upload Logo", command=self.upload_logo).pack(pady=5)
         tk.Button(self, text="Add Logo Watermark", command=self.add_logo).pack(pady=5)
 
+        # Batch watermark (runs off the UI thread)
+        tk.Button(self, text="Batch…", command=self.batch).pack(pady=5)
+
+        # Full-resolution export of the placed watermark (runs off the UI thread)
+        tk.Button(self, text="Export…", command=self.export).pack(pady=5)
+
         # Theme toggle
         theme = tk.Frame(self)
         theme.pack(pady=5)
         tk.Button(theme, text="Dark Mode",
-                  command=lambda: apply_dark_mode(self, [self.lbl_image, self.entry])
+                  command=lambda: apply_dark_mode(self, [self.canvas, self.entry])
                  ).pack(side=tk.LEFT, padx=5)
         tk.Button(theme, text="Light Mode",
-                  command=lambda: apply_light_mode(self, [self.lbl_image, self.entry])
+                  command=lambda: apply_light_mode(self, [self.canvas, self.entry])
                  ).pack(side=tk.LEFT, padx=5)
 
     def open_image(self, path=None):
@@ -92,11 +144,31 @@ class WatermarkApp(Tk):
         if not path:
             return
 
-        # 3) Load & thumbnail the PIL image
+        # 3) Decode a canvas-sized proxy off the UI thread; the previous
+        #    image's exports, history steps and full decode are dropped
         self.image_path = path
-        pil = Image.open(path)
-        pil.thumbnail((600, 400), resample=Image.Resampling.LANCZOS)
+        self._export_job = self._history_job = None
+        self._worker.submit(self._forget_source)
+        self._preview_job = self._worker.submit(load_preview, path, PREVIEW_SIZE)
+        self.after(20, self._poll_preview, self._preview_job)
+
+    def _poll_preview(self, job):
+        # a newer open_image call supersedes this one
+        if job is not self._preview_job:
+            return
+        if not job.done():
+            self.after(20, self._poll_preview, job)
+            return
+        try:
+            pil, full_size = job.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Cannot open image:\n{e}")
+            return
+
+        # proxy image only; full resolution is decoded at export time
         self.current_img = pil
+        self.full_size = full_size
+        self.preview_scale = full_size[0] / pil.width
 
         # 4) Clear canvas and draw background
         self.canvas.delete("all")
@@ -107,15 +179,23 @@ class WatermarkApp(Tk):
 
         # 5) Reset watermark placeholder
         self.watermark_item = None
-
-    def _refresh(self, out):
-        img = Image.open(out)
-        img.thumbnail((600, 400))
-        self.current_img = img.copy()
-        self.state.add_state(self.current_img.copy())
-        self.img_tk = ImageTk.PhotoImage(img)
-        self.lbl_image.config(image=self.img_tk)
-        messagebox.showinfo("Saved", f"File saved to:\n{out}")
+        self._wm_mode = None
+        self._wm_pos = None
+
+    def _show(self, proxy):
+        # new background proxy (an export or a history step) under the live watermark
+        self.current_img = proxy
+        self.preview_scale = self.full_size[0] / proxy.width
+        self.tk_img = ImageTk.PhotoImage(proxy)
+        self.canvas.itemconfig(self.bg_img_item, image=self.tk_img)
+        self._schedule_render(0)
+
+    def _clear_watermark(self):
+        if self.watermark_item:
+            self.canvas.delete(self.watermark_item)
+            self.watermark_item = None
+        self._wm_mode = None
+        self._wm_pos = None
 
     def add_text(self):
         # 1) Ensure image loaded
@@ -126,6 +206,7 @@ class WatermarkApp(Tk):
         # 2) Remove old watermark
         if self.watermark_item:
             self.canvas.delete(self.watermark_item)
+            self.watermark_item = None
 
         # 3) Get text
         txt = self.entry.get().strip()
@@ -133,24 +214,89 @@ class WatermarkApp(Tk):
             messagebox.showerror("Error", "Enter watermark text!")
             return
 
-        # 4) Default position
-        x = self.canvas.winfo_width() // 2
-        y = self.canvas.winfo_height() - 30
-
-        # 5) Create text item with hex color
-        color_hex = rgb_to_hex(DEFAULT_WATERMARK_COLOR)
-        self.watermark_item = self.canvas.create_text(
-            x, y,
-            text=txt,
-            font=("Arial", DEFAULT_FONT_SIZE),
-            fill=color_hex,
-            tags="watermark"
+        # 4) Default position, as an explicit point on the proxy
+        self._wm_mode = "text"
+        self._wm_pos, _ = text_watermark_layout(
+            self.current_img.size, txt, DEFAULT_POSITION,
+            DEFAULT_FONT_PATH, self._preview_font_size(),
+            DEFAULT_WATERMARK_COLOR, self.opacity_var.get()
         )
 
+        # 5) Render the real Pillow watermark onto the proxy
+        self._schedule_render(0)
+
         # 6) Bind drag events
         self.canvas.tag_bind("watermark", "<Button-1>", self.on_start_drag)
         self.canvas.tag_bind("watermark", "<B1-Motion>", self.on_drag)
 
+    def _preview_font_size(self):
+        # output font size scaled down to the proxy
+        return max(1, round(self.size_var.get() / getattr(self, "preview_scale", 1)))
+
+    def _schedule_render(self, delay=RENDER_DELAY_EDIT):
+        # debounce: only the last change within `delay` ms triggers a render
+        if self._wm_mode != "text":
+            return
+        if self._render_after:
+            self.after_cancel(self._render_after)
+        self._render_after = self.after(delay, self._start_render)
+
+    def _start_render(self):
+        self._render_after = None
+        txt = self.entry.get().strip()
+        if not txt or not getattr(self, "current_img", None):
+            return
+
+        # newer generation makes any queued or running render stale
+        self._render_gen += 1
+        if self._render_job:
+            self._render_job.cancel()
+        self._render_job = self._render_worker.submit(
+            self._render_preview, self._render_gen, self.current_img, txt,
+            self._wm_pos, self._preview_font_size(), self.opacity_var.get()
+        )
+        self.after(POLL_MS, self._poll_render, self._render_job)
+
+    def _render_preview(self, gen, proxy, txt, pos, size, opacity):
+        # worker thread: render only the box the watermark touches
+        if gen != self._render_gen:
+            return None
+        _, box = text_watermark_layout(
+            proxy.size, txt, pos, DEFAULT_FONT_PATH, size,
+            DEFAULT_WATERMARK_COLOR, opacity
+        )
+        if box is None:
+            return gen, None, None
+        patch = apply_text_watermark_to_image(
+            proxy.crop(box), txt, (pos[0] - box[0], pos[1] - box[1]),
+            DEFAULT_FONT_PATH, size, DEFAULT_WATERMARK_COLOR, opacity
+        )
+        return gen, box, patch
+
+    def _poll_render(self, job):
+        if job is not self._render_job or job.cancelled():
+            return
+        if not job.done():
+            self.after(POLL_MS, self._poll_render, job)
+            return
+        result = job.result()
+        if not result or result[0] != self._render_gen:
+            return
+        _, box, patch = result
+
+        # swap the overlay patch; Tk repaints only the old and new item bounds
+        if box is None:
+            if self.watermark_item:
+                self.canvas.itemconfig(self.watermark_item, state="hidden")
+            return
+        self._wm_tk = ImageTk.PhotoImage(patch)
+        if self.watermark_item:
+            self.canvas.itemconfig(self.watermark_item, image=self._wm_tk, state="normal")
+            self.canvas.coords(self.watermark_item, box[0], box[1])
+        else:
+            self.watermark_item = self.canvas.create_image(
+                box[0], box[1], anchor="nw", image=self._wm_tk, tags="watermark"
+            )
 
     def upload_logo(self):
         path = filedialog.askopenfilename(
@@ -168,10 +314,11 @@ class WatermarkApp(Tk):
         # 2) Remove old watermark
         if self.watermark_item:
             self.canvas.delete(self.watermark_item)
+            self.watermark_item = None
 
         # 3) Load, scale, convert logo
         logo = Image.open(self.logo_path).convert("RGBA")
-        max_w = int(self.current_img.width * 0.1)
+        max_w = int(self.current_img.width * LOGO_SCALE)
         ratio = logo.height / logo.width
         logo = logo.resize(
             (max_w, int(max_w * ratio)),
@@ -182,6 +329,8 @@ class WatermarkApp(Tk):
         # 4) Default position: bottom-left
         x = 10
         y = self.canvas.winfo_height() - logo.height - 10
+        self._wm_mode = "logo"
+        self._wm_pos = (x, y)
 
         self.watermark_item = self.canvas.create_image(
             x, y, anchor="nw", image=self.logo_tk, tags="watermark"
@@ -191,17 +340,143 @@ class WatermarkApp(Tk):
         self.canvas.tag_bind("watermark", "<Button-1>", self.on_start_drag)
         self.canvas.tag_bind("watermark", "<B1-Motion>", self.on_drag)
 
+    def batch(self):
+        # 1) Text from the entry, or the uploaded logo
+        txt = self.entry.get().strip()
+        logo = getattr(self, "logo_path", None)
+        if not txt and not logo:
+            messagebox.showerror("Error", "Enter text or upload a logo first!")
+            return
+
+        # 2) Pick inputs and output folder
+        images = filedialog.askopenfilenames(
+            filetypes=[("Images", "*.jpg *.jpeg *.png")]
+        )
+        if not images:
+            return
+        output_dir = filedialog.askdirectory(title="Output folder")
+        if not output_dir:
+            return
+
+        # 3) Logo mode if the last watermark placed was a logo
+        if self._wm_mode == "logo" and logo:
+            options = dict(watermark_type="logo", logo_path=logo)
+        else:
+            options = dict(
+                watermark_type="text", watermark_content=txt,
+                font_path=DEFAULT_FONT_PATH, font_size=self.size_var.get(),
+                color=DEFAULT_WATERMARK_COLOR
+            )
+        BatchDialog(
+            self, images, output_dir, position=DEFAULT_POSITION,
+            opacity=self.opacity_var.get(), workers=0, executor="spawn", **options
+        )
+
+    def export(self):
+        # 1) Needs a placed watermark; one export at a time (each builds on the last)
+        if self._export_job is not None:
+            return
+        if not getattr(self, "current_img", None) or not self._wm_pos:
+            messagebox.showerror("Error", "Add a watermark first!")
+            return
+        if self._wm_mode == "text":
+            content = self.entry.get().strip()
+            if not content:
+                messagebox.showerror("Error", "Enter watermark text!")
+                return
+        else:
+            content = self.logo_path
+
+        # 2) Output file
+        out = filedialog.asksaveasfilename(
+            title="Export", defaultextension=os.path.splitext(self.image_path)[1],
+            filetypes=[("Images", "*.jpg *.jpeg *.png")]
+        )
+        if not out:
+            return
+
+        # 3) Canvas position (proxy pixels) -> full-resolution pixels
+        s = self.preview_scale
+        pos = (round(self._wm_pos[0] * s), round(self._wm_pos[1] * s))
+        self._export_job = self._worker.submit(
+            self._render_export, self.image_path, out, self._wm_mode, content, pos,
+            self.size_var.get(), self.opacity_var.get()
+        )
+        self.after(POLL_MS, self._poll_export, self._export_job)
+
+    def _forget_source(self):
+        # worker thread: a new image starts with no full decode and no history
+        self._full = None
+        self.state.clear()
+
+    def _render_export(self, path, out, mode, content, pos, font_size, opacity):
+        # worker thread: the full decode is read once and reused by later exports
+        if self._full is None:
+            self._full = load_image(path)
+            self.state.add_state(self._full)
+        if mode == "text":
+            result = apply_text_watermark_to_image(
+                self._full, content, pos, DEFAULT_FONT_PATH, font_size,
+                DEFAULT_WATERMARK_COLOR, opacity
+            )
+        else:
+            result = apply_logo_watermark_to_image(self._full, content, pos, opacity, LOGO_SCALE)
+        save_image(result, out, encoder="default")
+
+        # the watermark is now part of the image; history keeps tile deltas only
+        self._full = result
+        self.state.add_state(result)
+        return make_preview(result, PREVIEW_SIZE)
+
+    def _poll_export(self, job):
+        if job is not self._export_job:
+            return
+        if not job.done():
+            self.after(POLL_MS, self._poll_export, job)
+            return
+        self._export_job = None
+        try:
+            proxy = job.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Export failed:\n{e}")
+            return
+
+        # the canvas watermark was rendered into the image
+        self._clear_watermark()
+        self._show(proxy)
+
+    def _restore(self, step):
+        # worker thread: step the full-resolution history, preview the result
+        img = step()
+        if img is None:
+            return None
+        self._full = img
+        return make_preview(img, PREVIEW_SIZE)
+
+    def _step_history(self, step):
+        self._history_job = self._worker.submit(self._restore, step)
+        self.after(POLL_MS, self._poll_history, self._history_job)
+
+    def _poll_history(self, job):
+        if job is not self._history_job:
+            return
+        if not job.done():
+            self.after(POLL_MS, self._poll_history, job)
+            return
+        self._history_job = None
+        try:
+            proxy = job.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Undo/redo failed:\n{e}")
+            return
+        if proxy is not None:
+            self._show(proxy)
+
     def undo(self):
-        img = self.state.undo()
-        if img:
-            self.img_tk = ImageTk.PhotoImage(img)
-            self.lbl_image.config(image=self.img_tk)
+        self._step_history(self.state.undo)
 
     def redo(self):
-        img = self.state.redo()
-        if img:
-            self.img_tk = ImageTk.PhotoImage(img)
-            self.lbl_image.config(image=self.img_tk)
+        self._step_history(self.state.redo)
 
 
 if __name__ == "__main__":
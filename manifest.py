@@ -0,0 +1,165 @@
+# manifest.py
+
+import os
+import json
+import hashlib
+
+# Journal kept in each batch output directory
+MANIFEST_NAME = ".watermark_manifest.jsonl"
+HASH_CHUNK = 1024 * 1024
+
+
+def file_hash(path):
+    """
+    Hash a file's content in chunks.
+    :param path: file path
+    :return: hex digest (blake2b, 128-bit)
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def settings_fingerprint(settings):
+    """
+    Hash effective watermark settings. Entries ending in '_path' (font, logo)
+    are replaced by the hash of the file they point to, so editing a logo
+    in place invalidates outputs too.
+
+    :param settings: dict of effective settings (JSON-serializable values)
+    :return: hex digest
+    """
+    resolved = {}
+    for key, value in settings.items():
+        if key.endswith("_path") and value and os.path.isfile(value):
+            value = file_hash(value)
+        elif isinstance(value, tuple):
+            value = list(value)
+        resolved[key] = value
+    blob = json.dumps(resolved, sort_keys=True).encode()
+    return hashlib.blake2b(blob, digest_size=16).hexdigest()
+
+
+def is_current(entry, input_hash, settings_hash):
+    """
+    Whether a manifest entry still describes up-to-date outputs: every
+    file it records (each rendition) must still exist.
+    :param entry: entry dict from Manifest.get, or None
+    :return: bool
+    """
+    return bool(
+        entry
+        and entry.get("input_hash") == input_hash
+        and entry.get("settings_hash") == settings_hash
+        and all(os.path.exists(path or "") for path in entry_outputs(entry))
+    )
+
+
+def entry_outputs(entry):
+    """
+    :param entry: manifest entry dict
+    :return: list of the output files it records (entries written before
+             renditions were listed name only their first output)
+    """
+    return entry.get("outputs") or [entry.get("output")]
+
+
+class Manifest:
+    """
+    Append-only record of rendered outputs in a batch output directory.
+    Each line is one JSON entry {input, size, mtime, input_hash,
+    settings_hash, output, outputs}, where outputs lists every file written
+    (all renditions) and output is the first. The last line for an input
+    wins, and a torn final line from a crash is ignored. Lines are flushed
+    as they are written, so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, output_dir):
+        """
+        :param output_dir: batch output directory holding the manifest
+        """
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self._entries = {}
+        self._lines = 0
+        self._fh = None
+        self._torn = False
+        self._load()
+
+    def _load(self):
+        """Internal: replay the journal."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                self._torn = not line.endswith("\n")
+                try:
+                    entry = json.loads(line)
+                    self._entries[entry["input"]] = entry
+                    self._lines += 1
+                except (ValueError, KeyError):
+                    continue
+
+    def get(self, input_path):
+        """
+        :param input_path: input image path
+        :return: last recorded entry dict, or None
+        """
+        return self._entries.get(os.path.abspath(input_path))
+
+    def record(self, input_path, size, mtime, input_hash, settings_hash, output, outputs=None):
+        """
+        Append one rendered input to the journal and flush it.
+        :param output: first output file
+        :param outputs: every output file of the input (default [output])
+        """
+        entry = {
+            "input": os.path.abspath(input_path),
+            "size": size,
+            "mtime": mtime,
+            "input_hash": input_hash,
+            "settings_hash": settings_hash,
+            "output": output,
+            "outputs": list(outputs) if outputs else [output],
+        }
+        if self._fh is None:
+            self._fh = open(self.path, "a")
+            if self._torn:
+                # keep a half-written line from a crash off the new entry
+                self._fh.write("\n")
+                self._torn = False
+        self._fh.write(json.dumps(entry) + "\n")
+        self._fh.flush()
+        self._entries[entry["input"]] = entry
+        self._lines += 1
+
+    def compact(self):
+        """Rewrite the journal with one line per input (atomic replace)."""
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp, self.path)
+        self._lines = len(self._entries)
+
+    def close(self):
+        """Close the journal, compacting it if most lines are superseded."""
+        if self._lines > 2 * len(self._entries) + 100:
+            self.compact()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self._entries)
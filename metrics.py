@@ -0,0 +1,258 @@
+# metrics.py
+
+import json
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+# Pipeline stages recorded per image, in pipeline order
+STAGES = ("decode", "resize", "convert", "render", "composite", "encode", "write")
+
+# Histogram bucket upper bounds in seconds (Prometheus-style, +Inf implied)
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+_NO_STAGE = nullcontext()
+
+
+def no_stage(name):
+    """Stand-in for StageRecorder.stage when instrumentation is off."""
+    return _NO_STAGE
+
+
+class _Stage:
+    """Internal: context manager adding elapsed time to one stage."""
+    __slots__ = ("_durations", "_name", "_started")
+
+    def __init__(self, durations, name):
+        self._durations = durations
+        self._name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._started
+        self._durations[self._name] = self._durations.get(self._name, 0.0) + elapsed
+        return False
+
+
+class StageRecorder:
+    """
+    Collects stage durations and byte counts for a single image.
+    Pass one as metrics= to the watermark functions.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.bytes = {}
+
+    def stage(self, name):
+        """
+        Time a block of work:  with recorder.stage("decode"): ...
+        :param name: one of STAGES
+        """
+        return _Stage(self.durations, name)
+
+    def add_bytes(self, name, count):
+        """
+        Record bytes read or written by a stage.
+        :param name: one of STAGES
+        :param count: number of bytes
+        """
+        self.bytes[name] = self.bytes.get(name, 0) + count
+
+
+class _Histogram:
+    """Internal: cumulative-bucket histogram with sum and count."""
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(DURATION_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(DURATION_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total, out = 0, []
+        for c in self.counts:
+            total += c
+            out.append(total)
+        return out
+
+
+def _status_bytes(field):
+    """Internal: a memory field (kB) of /proc/self/status in bytes, or None off Linux."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class PeakMemory:
+    """
+    Peak resident memory of the current process over a block of work, above
+    its resident size at the start. Uses the kernel's resettable high-water
+    mark (Linux: /proc/self/clear_refs, VmHWM); elsewhere, or where the reset
+    is not permitted, the peak is None. Process-wide, so only meaningful when
+    one image is processed at a time per process.
+    """
+
+    def __init__(self):
+        self.peak = None
+        self._baseline = None
+
+    def start(self):
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")  # reset VmHWM to the current RSS
+        except OSError:
+            self._baseline = None
+            return self
+        self._baseline = _status_bytes("VmRSS")
+        return self
+
+    def stop(self):
+        """:return: peak bytes above the starting RSS, or None if not measurable"""
+        if self._baseline is not None:
+            high = _status_bytes("VmHWM")
+            if high is not None:
+                self.peak = max(0, high - self._baseline)
+        return self.peak
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+class BatchMetrics:
+    """
+    Aggregates per-image stage timings of a batch into histograms.
+    Export with to_json() or to_prometheus().
+    """
+
+    def __init__(self, prefix="watermark"):
+        """
+        :param prefix: metric name prefix for the Prometheus export
+        """
+        self.prefix = prefix
+        self._durations = {}
+        self._bytes = {}
+        self._status = {}
+        self._memory = {"images": 0, "estimate_bytes": 0, "peak_bytes": 0,
+                        "max_peak_bytes": 0, "underestimated": 0}
+
+    def observe(self, durations, byte_counts=None, status="ok", memory=None):
+        """
+        Add one image's measurements.
+
+        :param durations: dict stage -> seconds (e.g. StageRecorder.durations)
+        :param byte_counts: dict stage -> bytes
+        :param status: outcome of the image ("ok", "skipped", "error")
+        :param memory: optional (estimated, measured peak) bytes, e.g. from BatchResult
+        """
+        if memory and None not in memory:
+            estimate, peak = memory
+            m = self._memory
+            m["images"] += 1
+            m["estimate_bytes"] += estimate
+            m["peak_bytes"] += peak
+            m["max_peak_bytes"] = max(m["max_peak_bytes"], peak)
+            m["underestimated"] += peak > estimate
+        for name, seconds in durations.items():
+            hist = self._durations.get(name)
+            if hist is None:
+                hist = self._durations[name] = _Histogram()
+            hist.observe(seconds)
+        for name, count in (byte_counts or {}).items():
+            self._bytes[name] = self._bytes.get(name, 0) + count
+        self._status[status] = self._status.get(status, 0) + 1
+
+    def _ordered(self, mapping):
+        """Internal: items with known stages first, in pipeline order."""
+        return sorted(mapping.items(), key=lambda kv: (
+            STAGES.index(kv[0]) if kv[0] in STAGES else len(STAGES), kv[0]
+        ))
+
+    def to_dict(self):
+        """
+        :return: dict with per-stage histograms, byte totals and image counts
+        """
+        return {
+            "buckets": list(DURATION_BUCKETS),
+            "stages": {
+                name: {
+                    "count": h.count,
+                    "sum": h.sum,
+                    "mean": h.sum / h.count if h.count else 0.0,
+                    "counts": h.counts,
+                }
+                for name, h in self._ordered(self._durations)
+            },
+            "bytes": dict(self._ordered(self._bytes)),
+            "images": dict(self._status),
+            "memory": dict(self._memory),
+        }
+
+    def to_json(self, **kwargs):
+        """:return: to_dict() serialized as JSON"""
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self):
+        """
+        :return: metrics in Prometheus text exposition format
+        """
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_duration_seconds Time spent per pipeline stage.",
+            f"# TYPE {p}_stage_duration_seconds histogram",
+        ]
+        bounds = [repr(b) for b in DURATION_BUCKETS] + ["+Inf"]
+        for name, h in self._ordered(self._durations):
+            for le, c in zip(bounds, h.cumulative()):
+                lines.append(f'{p}_stage_duration_seconds_bucket{{stage="{name}",le="{le}"}} {c}')
+            lines.append(f'{p}_stage_duration_seconds_sum{{stage="{name}"}} {h.sum!r}')
+            lines.append(f'{p}_stage_duration_seconds_count{{stage="{name}"}} {h.count}')
+
+        lines += [
+            f"# HELP {p}_stage_bytes_total Bytes read or written per pipeline stage.",
+            f"# TYPE {p}_stage_bytes_total counter",
+        ]
+        for name, count in self._ordered(self._bytes):
+            lines.append(f'{p}_stage_bytes_total{{stage="{name}"}} {count}')
+
+        lines += [
+            f"# HELP {p}_images_total Images processed by outcome.",
+            f"# TYPE {p}_images_total counter",
+        ]
+        for status, count in sorted(self._status.items()):
+            lines.append(f'{p}_images_total{{status="{status}"}} {count}')
+
+        m = self._memory
+        if m["images"]:
+            lines += [
+                f"# HELP {p}_memory_bytes_total Estimated and measured per-image peak memory.",
+                f"# TYPE {p}_memory_bytes_total counter",
+                f'{p}_memory_bytes_total{{kind="estimate"}} {m["estimate_bytes"]}',
+                f'{p}_memory_bytes_total{{kind="peak"}} {m["peak_bytes"]}',
+                f"# HELP {p}_memory_peak_bytes_max Largest measured per-image peak memory.",
+                f"# TYPE {p}_memory_peak_bytes_max gauge",
+                f"{p}_memory_peak_bytes_max {m['max_peak_bytes']}",
+                f"# HELP {p}_memory_underestimated_total Images whose peak exceeded the estimate.",
+                f"# TYPE {p}_memory_underestimated_total counter",
+                f"{p}_memory_underestimated_total {m['underestimated']}",
+            ]
+        return "\n".join(lines) + "\n"
@@ -1,56 +1,213 @@
 import os
+import copy
 import json
+import threading
+from contextlib import contextmanager
 from config import BASE
 
+try:
+    import fcntl
+except ImportError:  # Windows: writers in one process are still serialized
+    fcntl = None
+
 # Presets stored in <project_root>/presets.json
 PRESETS_FILE = os.path.join(BASE, "presets.json")
 
-def _load_presets():
-    """Internal: load all presets from file, return dict."""
-    if os.path.exists(PRESETS_FILE):
+_DELETED = object()
+
+
+class PresetStore:
+    """
+    In-memory view of a presets file.
+    Reloads only when the file's mtime/size/inode change, and writes by
+    replacing the whole file atomically (temp file + rename), so readers in
+    other processes never see a half-written file. Mutations made inside
+    batch() are grouped into a single write.
+    """
+
+    def __init__(self, path=PRESETS_FILE):
+        """
+        :param path: JSON file holding the presets
+        """
+        self.path = path
+        self._presets = {}
+        self._signature = None
+        self._pending = None
+        self._lock = threading.RLock()
+
+    def _stat(self):
+        """Internal: identity of the file version on disk, or None."""
         try:
-            with open(PRESETS_FILE, "r") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return {}
-    return {}
-
-def _save_presets(presets):
-    """Internal: save the full presets dict to file."""
-    os.makedirs(os.path.dirname(PRESETS_FILE), exist_ok=True)
-    with open(PRESETS_FILE, "w") as f:
-        json.dump(presets, f, indent=4)
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _refresh(self):
+        """Internal: reload the file if it changed since the last read."""
+        signature = self._stat()
+        if signature == self._signature:
+            return
+        presets = {}
+        if signature is not None:
+            try:
+                with open(self.path, "r") as f:
+                    presets = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                presets = {}
+        self._presets = presets if isinstance(presets, dict) else {}
+        self._signature = signature
+
+    @contextmanager
+    def _file_lock(self):
+        """Internal: exclusive lock between writer processes (where supported)."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _commit(self, mutations):
+        """Internal: apply mutations on top of the latest file and replace it."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._file_lock():
+            # pick up writes other processes made since our last read
+            self._refresh()
+            presets = dict(self._presets)
+            for name, settings in mutations.items():
+                if settings is _DELETED:
+                    presets.pop(name, None)
+                else:
+                    presets[name] = settings
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(presets, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            self._presets = presets
+            self._signature = self._stat()
+
+    def _mutate(self, name, settings):
+        """Internal: queue inside batch(), otherwise write immediately."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending[name] = settings
+            else:
+                self._commit({name: settings})
+
+    @contextmanager
+    def batch(self):
+        """
+        Group several saves/deletes into one atomic write:
+
+            with store.batch():
+                store.save("a", {...})
+                store.delete("b")
+        """
+        with self._lock:
+            outer = self._pending is None
+            if outer:
+                self._pending = {}
+            try:
+                yield self
+                if outer and self._pending:
+                    self._commit(self._pending)
+            finally:
+                if outer:
+                    self._pending = None
+
+    def get(self, name):
+        """
+        :return: copy of the preset dict, or None if not found
+        """
+        with self._lock:
+            if self._pending and name in self._pending:
+                settings = self._pending[name]
+                return None if settings is _DELETED else copy.deepcopy(settings)
+            self._refresh()
+            settings = self._presets.get(name)
+        return copy.deepcopy(settings)
+
+    def names(self):
+        """
+        :return: list of preset names (including unwritten batch changes)
+        """
+        with self._lock:
+            self._refresh()
+            names = dict.fromkeys(self._presets)
+            for name, settings in (self._pending or {}).items():
+                if settings is _DELETED:
+                    names.pop(name, None)
+                else:
+                    names[name] = None
+        return list(names)
+
+    def save(self, name, settings):
+        """Save or update a preset."""
+        self._mutate(name, copy.deepcopy(settings))
+
+    def delete(self, name):
+        """Remove a preset by name (no error if missing)."""
+        self._mutate(name, _DELETED)
+
+
+_stores = {}
+
+
+def _store():
+    """Internal: shared store for the current PRESETS_FILE."""
+    store = _stores.get(PRESETS_FILE)
+    if store is None:
+        store = _stores[PRESETS_FILE] = PresetStore(PRESETS_FILE)
+    return store
+
+def batch():
+    """
+    Group several save_preset/delete_preset calls into one atomic write.
+    Use as a context manager.
+    """
+    return _store().batch()
 
 def save_preset(name, settings):
     """
     Save or update a preset.
     :param name: str, preset identifier
-    :param settings: dict, watermark settings to store
+    :param settings: dict, watermark settings to store; an "encoder" entry
+                     (profile name or dict, see encoders.py) selects the output
+                     encoding when the preset is applied by the CLI's
+                     --preset option or the service's ?preset= parameter
     """
-    presets = _load_presets()
-    presets[name] = settings
-    _save_presets(presets)
+    _store().save(name, settings)
 
 def load_preset(name):
     """
     Load a single preset by name.
     :return: dict or None if not found
     """
-    return _load_presets().get(name)
+    return _store().get(name)
 
 def list_presets():
     """
     List all saved preset names.
     :return: list of str
     """
-    return list(_load_presets().keys())
+    return _store().names()
 
 def delete_preset(name):
     """
     Remove a preset by name.
     :param name: str, preset to delete
     """
-    presets = _load_presets()
-    if name in presets:
-        del presets[name]
-        _save_presets(presets)
+    with _store().batch() as store:
+        if name in store.names():
+            store.delete(name)
@@ -0,0 +1,65 @@
+# preview.py
+
+from PIL import Image
+
+# Canvas size used for the GUI proxy image
+PREVIEW_SIZE = (600, 400)
+
+
+def _shrink(img, size):
+    """Internal: palette/bilevel to RGB(A), then reduce() by the largest whole factor staying >= size."""
+    if img.mode in ('1', 'P'):
+        # reduce() does not handle palette or bilevel images
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    factor = min(img.width // size[0], img.height // size[1])
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img
+
+
+def _finish(img, size):
+    """Internal: display mode and the final LANCZOS pass (in place)."""
+    if img.mode not in ('RGB', 'RGBA', 'L'):
+        img = img.convert('RGB')
+    img.thumbnail(size, resample=Image.Resampling.LANCZOS)
+    img.load()
+    return img
+
+
+def load_preview(path, size=PREVIEW_SIZE):
+    """
+    Decode an image at reduced scale for on-screen preview.
+    JPEGs are decoded through the DCT scaler (draft mode); other formats are
+    shrunk with reduce() before the final LANCZOS pass. Safe to call from
+    a worker thread.
+
+    :param path: path to the image file
+    :param size: (width, height) box the preview must fit in
+    :return: (preview PIL Image, original (width, height))
+    """
+    img = Image.open(path)
+    full_size = img.size
+
+    if img.format == 'JPEG':
+        # let libjpeg decode at 1/2, 1/4 or 1/8 scale while staying >= size
+        img.draft(img.mode, size)
+    else:
+        img = _shrink(img, size)
+    return _finish(img, size), full_size
+
+
+def make_preview(img, size=PREVIEW_SIZE):
+    """
+    Downscale an already decoded image (e.g. a full-resolution export) for
+    on-screen preview, the same way load_preview does. img is not modified.
+    Safe to call from a worker thread.
+
+    :param img: PIL Image
+    :param size: (width, height) box the preview must fit in
+    :return: preview PIL Image
+    """
+    small = _shrink(img, size)
+    if small is img:
+        # thumbnail() resizes in place
+        small = img.copy()
+    return _finish(small, size)
@@ -58,6 +58,17 @@ class ProgressBar:
         """
         Update the current value of a determinate bar, refreshing the label.
 
+        :param value: New progress value between 0 and maximum.
+        """
+        self.set_progress(value)
+        # Force UI refresh
+        self.progress.update()
+
+    def set_progress(self, value):
+        """
+        Same as update() but without forcing a synchronous redraw; Tk repaints
+        on its next idle cycle. Use this from after() callbacks.
+
         :param value: New progress value between 0 and maximum.
         """
         if self.progress['mode'] == 'determinate':
@@ -66,8 +77,6 @@ class ProgressBar:
                 max_val = self.progress['maximum'] or 1
                 percent = int((value / max_val) * 100)
                 self._label.config(text=f'{percent}%')
-        # Force UI refresh
-        self.progress.update()
 
     def stop(self):
         """
@@ -0,0 +1,490 @@
+# service.py
+"""
+Local watermarking HTTP service.
+
+A long-running process keeps fonts, logos and rendered stamps warm in its
+worker processes, so each request only pays for decode, composite and
+encode. Start it with
+
+    python -m watermark_app serve --port 8765 --workers 4
+
+and POST image bytes with settings in the query string:
+
+    curl --data-binary @photo.jpg -o out.jpg \\
+        'http://127.0.0.1:8765/watermark?text=%C2%A9%20Studio&position=tiled&encoder=web'
+    curl --data-binary @photo.jpg -o out.jpg 'http://127.0.0.1:8765/watermark?preset=client'
+
+GET /health returns load as JSON; GET /metrics returns per-stage timings in
+the Prometheus text format. When every worker is busy and the queue is full
+the service answers 503 with Retry-After instead of queueing without bound.
+logo= and font= only name files inside the asset directories (presets may
+use any path).
+"""
+
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from config import BASE
+from watermark_app import BATCH_SETTINGS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 100 * 1024 * 1024
+REQUEST_TIMEOUT = 60  # seconds a request may wait for its render
+CHUNK_SIZE = 64 * 1024
+# Directories logo= and font= may name files in (relative paths resolve inside them)
+ASSET_DIRS = (os.path.join(BASE, "assets"),)
+
+# Query parameters that name a file, checked against the asset directories
+PATH_PARAMS = ("logo", "font")
+# Query parameter -> (batch_process setting, type)
+QUERY_SETTINGS = {
+    "text": ("watermark_content", str),
+    "logo": ("logo_path", str),
+    "position": ("position", str),
+    "opacity": ("opacity", int),
+    "font": ("font_path", str),
+    "font_size": ("font_size", int),
+    "scale": ("scale", float),
+    "spacing": ("spacing", int),
+    "angle": ("angle", float),
+    "encoder": ("encoder", str),
+}
+
+
+class BadRequest(ValueError):
+    """Invalid request settings; answered with 400."""
+
+
+def _bool(value):
+    """Internal: query-string boolean."""
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def _color(value):
+    """Internal: 'R,G,B' or '#rrggbb' -> tuple."""
+    try:
+        if value.startswith("#") and len(value) == 7:
+            return tuple(int(value[i:i + 2], 16) for i in (1, 3, 5))
+        rgb = tuple(int(v) for v in value.split(","))
+    except ValueError:
+        rgb = ()
+    if len(rgb) != 3 or not all(0 <= v <= 255 for v in rgb):
+        raise BadRequest(f"color: expected R,G,B or #rrggbb, got {value!r}")
+    return rgb
+
+
+def _asset_path(key, value, asset_dirs):
+    """
+    Internal: resolve a file named in the query string; it must lie inside
+    one of asset_dirs (after following symlinks), so a request cannot read
+    arbitrary files on the host.
+    """
+    for root in asset_dirs:
+        root = os.path.realpath(root)
+        path = os.path.realpath(os.path.join(root, value))
+        if os.path.commonpath((root, path)) == root and os.path.isfile(path):
+            return path
+    raise BadRequest(f"{key}: {value!r} is not a file in the asset directories")
+
+
+def request_settings(query, load_preset=None, asset_dirs=ASSET_DIRS):
+    """
+    Build watermark settings from query parameters, on top of a preset if
+    one is named (?preset=...).
+
+    :param query: dict of query parameters
+    :param load_preset: fn(name) -> dict or None (default presets.load_preset)
+    :param asset_dirs: directories logo= and font= may name files in
+    :return: dict of batch_process-style settings
+    """
+    settings = {}
+    if query.get("preset"):
+        if load_preset is None:
+            from presets import load_preset
+        preset = load_preset(query["preset"])
+        if preset is None:
+            raise BadRequest(f"unknown preset: {query['preset']!r}")
+        settings.update((k, v) for k, v in preset.items() if k in BATCH_SETTINGS)
+        if isinstance(settings.get("color"), list):
+            settings["color"] = tuple(settings["color"])
+
+    for key, (name, kind) in QUERY_SETTINGS.items():
+        if key in PATH_PARAMS and key in query:
+            settings[name] = _asset_path(key, query[key], asset_dirs)
+        elif key in query:
+            try:
+                settings[name] = kind(query[key])
+            except ValueError:
+                raise BadRequest(f"{key}: invalid value {query[key]!r}")
+    if "color" in query:
+        settings["color"] = _color(query["color"])
+    if "stagger" in query:
+        settings["stagger"] = _bool(query["stagger"])
+    if "text" in query:
+        settings["watermark_type"] = "text"
+    elif "logo" in query:
+        settings["watermark_type"] = "logo"
+
+    overrides = {}
+    if "format" in query:
+        overrides["format"] = query["format"].upper()
+    if "quality" in query:
+        try:
+            overrides["quality"] = int(query["quality"])
+        except ValueError:
+            raise BadRequest(f"quality: invalid value {query['quality']!r}")
+    if overrides:
+        encoder = settings.get("encoder")
+        if isinstance(encoder, dict):
+            settings["encoder"] = {**encoder, **overrides}
+        else:
+            settings["encoder"] = {"profile": encoder, **overrides}
+
+    if "encoder" in settings:
+        from encoders import get_profile
+        try:
+            get_profile(settings["encoder"])
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+    if not settings.get("watermark_content") and not settings.get("logo_path"):
+        raise BadRequest("nothing to apply: give text=, logo= or a preset that sets one")
+    return settings
+
+
+def _warm_up(tiled_cache=None):
+    """
+    Internal: worker initializer; import Pillow and load the default font once.
+    A worker process gets its share of the tiled overlay cache (tiled_cache).
+    """
+    from config import DEFAULT_FONT_PATH, DEFAULT_FONT_SIZE
+    from fonts import load_font
+    from watermark import set_tiled_cache_bytes
+
+    load_font(DEFAULT_FONT_PATH, DEFAULT_FONT_SIZE)
+    if tiled_cache is not None:
+        set_tiled_cache_bytes(tiled_cache)
+
+
+def render(data, settings):
+    """
+    Watermark one encoded image in memory. Runs in a worker process, whose
+    font, stamp and logo caches persist between requests.
+
+    :param data: encoded input image bytes
+    :param settings: dict from request_settings (batch-only settings such as
+                     renditions are ignored)
+    :return: (output bytes, Pillow format, stage durations, stage byte counts)
+    """
+    from PIL import Image
+    from encoders import output_format
+    from metrics import StageRecorder
+    from watermark import logo_watermark_bytes, text_watermark_bytes
+
+    settings = dict(settings)
+    watermark_type = settings.pop("watermark_type", "text")
+    text = settings.pop("watermark_content", None)
+    logo_path = settings.pop("logo_path", None)
+    encoder = settings.pop("encoder", None)
+    # a response carries one image: a preset's renditions do not apply
+    settings.pop("renditions", None)
+
+    fmt = output_format(None, encoder)
+    if not fmt:
+        # no format override: the output keeps the input's format
+        with Image.open(io.BytesIO(data)) as probe:
+            fmt = probe.format
+
+    recorder = StageRecorder()
+    if watermark_type == "logo" and logo_path:
+        for k in ("font_path", "font_size", "font_variation", "color"):
+            settings.pop(k, None)
+        out = logo_watermark_bytes(data, logo_path, encoder=encoder, metrics=recorder, **settings)
+    else:
+        settings.pop("scale", None)
+        out = text_watermark_bytes(data, text, encoder=encoder, metrics=recorder, **settings)
+    return out, fmt, recorder.durations, recorder.bytes
+
+
+class WatermarkService:
+    """
+    HTTP front end plus a bounded worker pool. At most max_pending renders
+    are admitted at once (running or queued); further requests get 503.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None,
+                 max_pending=None, executor="process", timeout=REQUEST_TIMEOUT,
+                 max_body=MAX_BODY_BYTES, asset_dirs=ASSET_DIRS):
+        """
+        :param host: interface to bind (default loopback only)
+        :param port: TCP port (0 picks a free one)
+        :param workers: render workers (default: all cores)
+        :param max_pending: admitted renders, running or queued (default 2 * workers)
+        :param executor: "process" (default) or "thread"
+        :param timeout: seconds a request may wait for its render (504 after)
+        :param max_body: largest accepted upload in bytes (413 above)
+        :param asset_dirs: directories logo= and font= may name files in
+        """
+        from metrics import BatchMetrics
+
+        if executor not in ("process", "thread"):
+            raise ValueError(f"Unknown executor: {executor!r} (expected 'process' or 'thread')")
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self.timeout = timeout
+        self.max_body = max_body
+        self.asset_dirs = tuple(asset_dirs)
+        self.executor = executor
+        self.pool = self._new_pool()
+        self.restarts = 0
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._started = time.time()
+        self.metrics = BatchMetrics(prefix="watermark_service")
+        self.rejected = 0
+
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.service = self
+
+    def _new_pool(self):
+        """Internal: a pool of warmed-up render workers."""
+        if self.executor == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+        from watermark import TILED_CACHE_BYTES
+
+        return ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_warm_up,
+            initargs=(TILED_CACHE_BYTES // self.workers,)
+        )
+
+    def replace_pool(self, broken):
+        """
+        Replace a pool that broke (a worker process died, e.g. killed for
+        memory); the renders it held fail and new ones go to the new pool.
+
+        :param broken: the pool that failed; if another request replaced it
+                       already, nothing happens
+        """
+        with self._lock:
+            if self.pool is not broken:
+                return
+            self.pool = self._new_pool()
+            self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        print("[service] Render workers died; started a new pool", flush=True)
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def admit(self):
+        """
+        Take an admission slot for one render, before its upload is read.
+        The slot belongs to the caller until it passes it to submit (or
+        gives it back with release).
+
+        :return: False when the service is saturated
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self._in_flight += 1
+        return True
+
+    def submit(self, data, settings):
+        """
+        Start an admitted render; its slot is freed when it finishes.
+
+        :return: (Future, the pool it runs in)
+        """
+        pool = self.pool
+        try:
+            future = pool.submit(render, data, settings)
+        except BrokenExecutor:
+            # broken by an earlier render that nobody was waiting for
+            self.replace_pool(pool)
+            pool = self.pool
+            try:
+                future = pool.submit(render, data, settings)
+            except BaseException:
+                self.release()
+                raise
+        except BaseException:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: self.release())
+        return future, pool
+
+    def release(self):
+        """Free an admission slot."""
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def observe(self, durations, byte_counts, status):
+        with self._lock:
+            self.metrics.observe(durations, byte_counts, status)
+
+    def health(self):
+        """:return: dict with load and counters"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._in_flight,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+                "images": dict(self.metrics.to_dict()["images"]),
+                "uptime_seconds": round(time.time() - self._started, 1),
+            }
+
+    def prometheus(self):
+        with self._lock:
+            return self.metrics.to_prometheus()
+
+    def serve_forever(self):
+        """Serve until shutdown() (or KeyboardInterrupt)."""
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.close()
+
+    def start(self):
+        """Serve on a background thread; returns the thread."""
+        thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        """Stop serving (from another thread) and release the workers."""
+        self.httpd.shutdown()
+        self.close()
+
+    def close(self):
+        self.httpd.server_close()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Internal: request handler; the service is reachable as self.server.service."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "WatermarkService"
+
+    def log_message(self, format, *args):
+        # one line per request is too chatty under load; errors still go to stderr
+        pass
+
+    def _reply(self, status, body, content_type="application/json", headers=None):
+        """Internal: send a complete response, writing the body in chunks."""
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        elif isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        view = memoryview(body)
+        for start in range(0, len(view), CHUNK_SIZE):
+            self.wfile.write(view[start:start + CHUNK_SIZE])
+
+    def do_GET(self):
+        service = self.server.service
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._reply(200, service.health())
+        elif path == "/metrics":
+            self._reply(200, service.prometheus(), "text/plain; version=0.0.4")
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        service = self.server.service
+        url = urlsplit(self.path)
+        if url.path != "/watermark":
+            self._reply(404, {"error": "not found"})
+            return
+
+        # everything up to the admission is answered without reading the
+        # upload, so the connection cannot be reused for another request
+        close, self.close_connection = self.close_connection, True
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self._reply(400, {"error": "Content-Length must be a number of bytes"})
+            return
+        if length <= 0:
+            self._reply(411, {"error": "Content-Length with the image bytes required"})
+            return
+        if length > service.max_body:
+            self._reply(413, {"error": f"image larger than {service.max_body} bytes"})
+            return
+        try:
+            settings = request_settings(dict(parse_qsl(url.query)), asset_dirs=service.asset_dirs)
+        except BadRequest as e:
+            self._reply(400, {"error": str(e)})
+            return
+        # take the slot first: a saturated service does not buffer uploads
+        if not service.admit():
+            self._reply(503, {"error": "busy"}, headers={"Retry-After": "1"})
+            return
+
+        try:
+            data = self.rfile.read(length)
+        except BaseException:
+            service.release()
+            raise
+        if len(data) < length:
+            service.release()
+            self._reply(400, {"error": "upload shorter than Content-Length"})
+            return
+        self.close_connection = close
+        future, pool = service.submit(data, settings)
+        try:
+            out, fmt, durations, byte_counts = future.result(timeout=service.timeout)
+        except TimeoutError:
+            service.observe({}, None, "error")
+            self._reply(504, {"error": "render timed out"})
+            return
+        except BrokenExecutor:
+            # a worker died (this render or another one in the pool)
+            service.replace_pool(pool)
+            service.observe({}, None, "error")
+            self._reply(503, {"error": "render workers restarted"}, headers={"Retry-After": "1"})
+            return
+        except Exception as e:
+            service.observe({}, None, "error")
+            self._reply(422, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        service.observe(durations, byte_counts, "ok")
+        from PIL import Image
+        # the plugins that register MIME types were loaded in the worker, not here
+        Image.preinit()
+        self._reply(200, out, Image.MIME.get(fmt, "application/octet-stream"))
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, max_pending=None,
+          executor="process", asset_dirs=ASSET_DIRS):
+    """Run the service in the foreground until interrupted."""
+    service = WatermarkService(host, port, workers, max_pending, executor, asset_dirs=asset_dirs)
+    print(f"Watermark service on {service.address} "
+          f"({service.workers} workers, {service.max_pending} max pending)")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
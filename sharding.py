@@ -0,0 +1,499 @@
+# sharding.py
+"""
+Shard a batch across worker processes or hosts that share only a filesystem.
+
+    python -m watermark_app shard create /shared/job photos/ -o /shared/out --preset client
+    python -m watermark_app shard work /shared/job          # on every node
+    python -m watermark_app shard run /shared/job --nodes 4  # or N local processes
+    python -m watermark_app shard summary /shared/job
+
+A job directory holds the batch settings (job.json) and the inputs split
+into work items of chunk_size images:
+
+    todo/     00000042.0.json        waiting (".0" = attempts so far)
+    claimed/  00000042.0.json@node   being rendered by node
+    done/     00000042.0.json        finished
+    failed/   00000042.3.json        abandoned after max_attempts claims
+    results/  00000042.jsonl         one line per image, written before done/
+
+A node claims an item by renaming it from todo/ to claimed/; rename is
+atomic, so exactly one node wins each item. A node renders its items
+through one pool, claiming the next item whenever the pool has room for
+more, and moves each item to done/ as its last image finishes. The
+claimed file's mtime is the lease: the node touches it while rendering, and any node that finds a
+lease older than `lease` seconds renames the item back into todo/ with
+one more attempt, so a crashed node's work is picked up again; an item
+whose render raises is handed back the same way at once. Every input has
+an output path of its own (create_job keeps subfolders below the scanned
+roots and refuses jobs whose outputs would still collide), so an item
+rendered twice by a slow node and its replacement writes the same files
+with the same content; summarize reports any output that several inputs
+wrote anyway. Leases compare the local clock with file mtimes, so node
+clocks (or the file server's) must agree to well within the lease.
+"""
+
+import json
+import os
+import random
+import re
+import socket
+import threading
+import time
+
+JOB_NAME = "job.json"
+SUMMARY_NAME = "summary.json"
+CHUNK_SIZE = 16       # images per work item
+LEASE_SECONDS = 300   # a claim not renewed for this long is taken back
+MAX_ATTEMPTS = 3      # claims per item before it is abandoned to failed/
+IDLE_POLL = 2.0       # wait between looks at the queue while others hold the last items
+_QUEUES = ("todo", "claimed", "done", "failed", "results")
+_ITEM = re.compile(r"^(\d+)\.(\d+)\.json(?:@(.+))?$")
+
+
+def _write_json(path, data):
+    """Internal: write JSON atomically (temp file + rename)."""
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def create_job(job_dir, images, output_dir, chunk_size=CHUNK_SIZE, lease=LEASE_SECONDS,
+               max_attempts=MAX_ATTEMPTS, roots=None, **settings):
+    """
+    Create a job directory from input images. The job is assembled next to
+    job_dir and renamed into place, so nodes never see a partial queue.
+
+    :param job_dir: job directory to create (must not exist)
+    :param images: iterable of input image paths (stored absolute)
+    :param output_dir: batch output directory shared by all nodes
+    :param chunk_size: images per work item
+    :param lease: seconds a claim stays valid without being renewed
+    :param max_attempts: claims per item before it is abandoned
+    :param roots: directories the inputs were scanned from (see
+                  batch_processor.output_paths); a job whose inputs would
+                  write the same output file is refused with ValueError
+    :param settings: watermark settings, as for batch_processor.iter_batch_process
+    :return: number of work items
+    """
+    from batch_processor import output_collisions
+
+    job_dir = os.path.abspath(job_dir)
+    if os.path.exists(job_dir):
+        raise FileExistsError(f"Job directory already exists: {job_dir}")
+    # items are rendered apart on different nodes, so no node could notice
+    images = [os.path.abspath(img_path) for img_path in images]
+    roots = [os.path.abspath(root) for root in roots] if roots else None
+    collisions = output_collisions(
+        images, output_dir, settings.get("encoder"), settings.get("renditions"), roots
+    )
+    if collisions:
+        output, inputs = next(iter(collisions.items()))
+        raise ValueError(
+            f"{len(collisions)} output file(s) would be written by several inputs, "
+            f"e.g. {output} by {', '.join(inputs)}"
+        )
+    staging = f"{job_dir}.tmp-{os.getpid()}"
+    for queue in _QUEUES:
+        os.makedirs(os.path.join(staging, queue))
+
+    items = 0
+    chunk = []
+
+    def flush():
+        nonlocal items
+        _write_json(os.path.join(staging, "todo", f"{items:08d}.0.json"), {"inputs": chunk})
+        items += 1
+
+    for img_path in images:
+        chunk.append(img_path)
+        if len(chunk) >= chunk_size:
+            flush()
+            chunk = []
+    if chunk:
+        flush()
+
+    if isinstance(settings.get("color"), tuple):
+        settings["color"] = list(settings["color"])
+    _write_json(os.path.join(staging, JOB_NAME), {
+        "output_dir": os.path.abspath(output_dir),
+        "roots": roots,
+        "settings": settings,
+        "items": items,
+        "lease": lease,
+        "max_attempts": max_attempts,
+        "created": time.time(),
+    })
+    os.rename(staging, job_dir)
+    return items
+
+
+def load_job(job_dir):
+    """
+    :return: the job description dict (see create_job)
+    """
+    with open(os.path.join(job_dir, JOB_NAME), encoding="utf-8") as f:
+        job = json.load(f)
+    if isinstance(job["settings"].get("color"), list):
+        job["settings"]["color"] = tuple(job["settings"]["color"])
+    return job
+
+
+def default_node_id():
+    """:return: hostname-pid, usable in claimed/ file names"""
+    return re.sub(r"[^\w.-]", "_", f"{socket.gethostname()}-{os.getpid()}")
+
+
+def _reclaim_expired(job_dir, lease, max_attempts):
+    """
+    Internal: move claims older than lease back to todo/ (or to failed/ once
+    max_attempts is reached). Losing a rename race to another node is fine.
+    :return: number of items taken back
+    """
+    claimed = os.path.join(job_dir, "claimed")
+    now = time.time()
+    taken = 0
+    for name in os.listdir(claimed):
+        m = _ITEM.match(name)
+        path = os.path.join(claimed, name)
+        try:
+            if not m or now - os.stat(path).st_mtime < lease:
+                continue
+            _requeue(job_dir, path, max_attempts)
+            taken += 1
+        except FileNotFoundError:
+            pass
+    return taken
+
+
+def _requeue(job_dir, path, max_attempts):
+    """
+    Internal: count one more attempt on a claimed item and move it back to
+    todo/, or to failed/ once max_attempts is reached.
+    :return: the queue it went to
+    """
+    m = _ITEM.match(os.path.basename(path))
+    seq, attempts = m.group(1), int(m.group(2)) + 1
+    queue = "failed" if attempts >= max_attempts else "todo"
+    os.rename(path, os.path.join(job_dir, queue, f"{seq}.{attempts}.json"))
+    return queue
+
+
+def claim(job_dir, node_id, lease=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """
+    Claim one work item by renaming it from todo/ into claimed/.
+
+    :return: path of the claimed item file, or None if todo/ is empty
+    """
+    _reclaim_expired(job_dir, lease, max_attempts)
+    todo = os.path.join(job_dir, "todo")
+    names = [name for name in os.listdir(todo) if _ITEM.match(name)]
+    # nodes starting together would all race for the same first item
+    random.shuffle(names)
+    for name in names:
+        source = os.path.join(todo, name)
+        target = os.path.join(job_dir, "claimed", f"{name}@{node_id}")
+        try:
+            # rename keeps the mtime, so start the lease first: an old item
+            # must not look expired the moment it lands in claimed/
+            os.utime(source)
+            os.rename(source, target)
+        except FileNotFoundError:
+            continue  # another node won this one
+        return target
+    return None
+
+
+class _Lease:
+    """Internal: renews a claim's mtime from a background thread until stopped."""
+
+    def __init__(self, path, lease):
+        self.path = path
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._renew, args=(lease / 3,), daemon=True)
+        self._thread.start()
+
+    def _renew(self, every):
+        while not self._stop.wait(every):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                # expired and taken back by another node
+                self.lost = True
+                return
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def _result_record(result, item, node_id):
+    """Internal: JSON line for one BatchResult."""
+    return {
+        "input": result.input,
+        "status": result.status,
+        "output": result.output,
+        "renditions": result.renditions,
+        "error": result.error,
+        "seconds": round(result.timings.get("total", 0.0), 4),
+        "item": item,
+        "node": node_id,
+    }
+
+
+class _Claimed:
+    """Internal: a claimed work item whose images are being rendered."""
+
+    def __init__(self, path, lease):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.seq = _ITEM.match(self.name).group(1)
+        self.inputs = []
+        self.records = []
+        self.lease = _Lease(path, lease)
+
+    def read(self):
+        """Load the item's inputs; :return: how many there are"""
+        with open(self.path, encoding="utf-8") as f:
+            self.inputs = json.load(f)["inputs"]
+        return len(self.inputs)
+
+
+def _finish(job_dir, item, node_id):
+    """Internal: write a rendered item's results and move it to done/."""
+    item.lease.stop()
+    # results first, so a done/ item always has them
+    tmp = os.path.join(job_dir, "results", f".{item.seq}.jsonl.tmp-{node_id}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for record in item.records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp, os.path.join(job_dir, "results", f"{item.seq}.jsonl"))
+    try:
+        os.rename(item.path, os.path.join(job_dir, "done", item.name.split("@")[0]))
+    except FileNotFoundError:
+        print(f"[sharding] Lease on item {item.seq} expired before it finished; "
+              "it will be retried")
+
+
+def process_items(job_dir, path, job, node_id, stop=None, **batch_kwargs):
+    """
+    Render a claimed work item, and the items this node claims while the
+    pool has room for more, through one iter_batch_process (one pool). Each
+    item moves to done/ as soon as its last image finishes.
+
+    :param path: claimed item file (from claim)
+    :param job: job description (load_job)
+    :param stop: optional threading.Event; once set, no further items are claimed
+    :param batch_kwargs: workers / executor / max_pending for iter_batch_process
+    :return: list of result records of the finished items, once todo/ is empty.
+             An item whose lease this node lost meanwhile stays claimed (and is
+             eventually taken back). If rendering raises, the unfinished items
+             go back to todo/ with one more attempt (failed/ at max_attempts)
+             and the records of the finished ones are returned; on
+             KeyboardInterrupt/SystemExit they go back unchanged and the
+             exception propagates
+    """
+    from batch_processor import iter_batch_process
+
+    records = []
+    first = _Claimed(path, job["lease"])
+    active = {first.seq: first}  # seq -> _Claimed, until done/
+    owners = {}  # stream index -> _Claimed
+
+    def inputs(item):
+        index = 0
+        while item is not None:
+            for img_path in item.inputs if item.read() else ():
+                owners[index] = item
+                index += 1
+                yield img_path
+            if not item.inputs:
+                del active[item.seq]
+                _finish(job_dir, item, node_id)
+            if stop and stop.is_set():
+                return
+            # only asked for more once the pool has room for it
+            claimed = claim(job_dir, node_id, job["lease"], job["max_attempts"])
+            item = None if claimed is None else _Claimed(claimed, job["lease"])
+            if item is not None:
+                active[item.seq] = item
+
+    try:
+        for result in iter_batch_process(
+            inputs(first), job["output_dir"], **job["settings"], roots=job.get("roots"),
+            **batch_kwargs
+        ):
+            item = owners.pop(result.index)
+            item.records.append(_result_record(result, item.seq, node_id))
+            if len(item.records) == len(item.inputs):
+                del active[item.seq]
+                _finish(job_dir, item, node_id)
+                records.extend(item.records)
+    except (KeyboardInterrupt, SystemExit):
+        for item in active.values():
+            item.lease.stop()
+            if not item.lease.lost:
+                # the node is stopping, not the item failing: hand it back
+                # untouched instead of waiting out the lease
+                try:
+                    os.rename(item.path,
+                              os.path.join(job_dir, "todo", item.name.split("@")[0]))
+                except FileNotFoundError:
+                    pass
+        raise
+    except Exception as e:
+        for item in active.values():
+            item.lease.stop()
+            if item.lease.lost:
+                continue
+            # counts as an attempt, so an item that always fails ends in failed/
+            try:
+                queue = _requeue(job_dir, item.path, job["max_attempts"])
+            except FileNotFoundError:
+                continue
+            print(f"[sharding] Item {item.seq} failed on {node_id} "
+                  f"({type(e).__name__}: {e}); moved to {queue}/")
+    return records
+
+
+def status(job_dir):
+    """
+    :return: dict of item counts per queue, plus the live claims as
+             {item file: {"node", "age"}}
+    """
+    counts = {}
+    for queue in ("todo", "claimed", "done", "failed"):
+        counts[queue] = sum(1 for name in os.listdir(os.path.join(job_dir, queue))
+                            if _ITEM.match(name))
+    now = time.time()
+    claims = {}
+    for name in os.listdir(os.path.join(job_dir, "claimed")):
+        m = _ITEM.match(name)
+        try:
+            if m:
+                age = now - os.stat(os.path.join(job_dir, "claimed", name)).st_mtime
+                claims[name.split("@")[0]] = {"node": m.group(3), "age": round(age, 1)}
+        except FileNotFoundError:
+            pass
+    counts["claims"] = claims
+    return counts
+
+
+def work(job_dir, node_id=None, stop=None, wait=True, **batch_kwargs):
+    """
+    Claim and render work items until the queue is empty.
+
+    :param job_dir: job directory (create_job)
+    :param node_id: name of this node in claimed/ and the results (default hostname-pid)
+    :param stop: optional threading.Event; set it to stop claiming items and exit
+                 once the ones in flight finish
+    :param wait: once todo/ is empty, keep watching other nodes' claims until they
+                 finish or expire (and take over expired ones); False exits at once
+    :param batch_kwargs: workers / executor / max_pending for iter_batch_process
+    :return: dict status -> image count rendered by this node
+    """
+    job = load_job(job_dir)
+    node_id = node_id or default_node_id()
+    counts = {"ok": 0, "unchanged": 0, "skipped": 0, "error": 0}
+    while not (stop and stop.is_set()):
+        path = claim(job_dir, node_id, job["lease"], job["max_attempts"])
+        if path is None:
+            if not wait or not os.listdir(os.path.join(job_dir, "claimed")):
+                break
+            time.sleep(IDLE_POLL)
+            continue
+        for record in process_items(job_dir, path, job, node_id, stop, **batch_kwargs):
+            counts[record["status"]] += 1
+    return counts
+
+
+def summarize(job_dir):
+    """
+    Merge every node's results into one summary and write it to summary.json.
+
+    :return: dict with queue counts, image counts by status and by node, total
+             render seconds, per-image errors, the inputs of abandoned items
+             and collisions: outputs written for more than one input
+    """
+    images = {"ok": 0, "unchanged": 0, "skipped": 0, "error": 0}
+    nodes = {}
+    errors = []
+    writers = {}  # output path -> inputs written to it
+    seconds = 0.0
+    results = os.path.join(job_dir, "results")
+    for name in sorted(os.listdir(results)):
+        if not name.endswith(".jsonl") or name.startswith("."):
+            continue
+        with open(os.path.join(results, name), encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                images[record["status"]] = images.get(record["status"], 0) + 1
+                nodes[record["node"]] = nodes.get(record["node"], 0) + 1
+                seconds += record["seconds"]
+                if record["status"] == "error":
+                    errors.append({"input": record["input"], "error": record["error"]})
+                outputs = (record["renditions"] or {}).values() or [record["output"]]
+                for output in outputs:
+                    if output:
+                        writers.setdefault(output, set()).add(record["input"])
+
+    abandoned = []
+    failed = os.path.join(job_dir, "failed")
+    for name in sorted(os.listdir(failed)):
+        if _ITEM.match(name):
+            with open(os.path.join(failed, name), encoding="utf-8") as f:
+                abandoned.extend(json.load(f)["inputs"])
+
+    queues = status(job_dir)
+    summary = {
+        "items": load_job(job_dir)["items"],
+        **{queue: queues[queue] for queue in ("todo", "claimed", "done", "failed")},
+        "complete": not queues["todo"] and not queues["claimed"],
+        "images": images,
+        "nodes": nodes,
+        "render_seconds": round(seconds, 3),
+        "errors": errors,
+        "abandoned": abandoned,
+        "collisions": [
+            {"output": output, "inputs": sorted(inputs)}
+            for output, inputs in sorted(writers.items()) if len(inputs) > 1
+        ],
+    }
+    _write_json(os.path.join(job_dir, SUMMARY_NAME), summary)
+    return summary
+
+
+def _local_node(job_dir, node_id, batch_kwargs):
+    """Internal: process entry point of a run_local node."""
+    work(job_dir, node_id, **batch_kwargs)
+
+
+def run_local(job_dir, nodes=None, **batch_kwargs):
+    """
+    Work a job with N local processes standing in for nodes.
+
+    :param nodes: number of node processes (default: all cores)
+    :param batch_kwargs: workers / executor / max_pending for each node
+    :return: merged summary (summarize)
+    """
+    import multiprocessing
+
+    nodes = nodes or os.cpu_count() or 1
+    prefix = default_node_id()
+    procs = [
+        multiprocessing.Process(
+            target=_local_node, args=(job_dir, f"{prefix}-node{i}", batch_kwargs)
+        )
+        for i in range(nodes)
+    ]
+    for proc in procs:
+        proc.start()
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.terminate()
+        raise
+    return summarize(job_dir)
@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+import batch_processor
+from batch_processor import batch_process, iter_batch_process, output_paths, scan_images
+
+
+def _image(path, color=(200, 40, 40)):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", (64, 48), color).save(path)
+    return path
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """in/a/x.jpg and in/b/x.jpg: same file name in two folders."""
+    root = tmp_path / "in"
+    _image(str(root / "a" / "x.jpg"), (255, 0, 0))
+    _image(str(root / "b" / "x.jpg"), (0, 0, 255))
+    return str(root)
+
+
+def test_scanned_tree_keeps_subdirectories(tree, tmp_path):
+    out = str(tmp_path / "out")
+    images = sorted(scan_images(tree))
+    saved = batch_process(images, out, watermark_content="hi", roots=[tree])
+
+    assert sorted(os.path.relpath(p, out) for p in saved) == [
+        os.path.join("a", "x_watermarked.jpg"), os.path.join("b", "x_watermarked.jpg")
+    ]
+    red, blue = (Image.open(p).convert("RGB").getpixel((0, 0)) for p in sorted(saved))
+    assert red[0] > 200 and blue[2] > 200
+
+
+def test_batch_process_rejects_colliding_outputs(tree, tmp_path):
+    out = tmp_path / "out"
+    with pytest.raises(ValueError, match="x_watermarked.jpg"):
+        batch_process(sorted(scan_images(tree)), str(out), watermark_content="hi")
+    assert not out.exists() or not os.listdir(out)
+
+
+def test_streamed_collision_is_an_error(tree, tmp_path):
+    out = str(tmp_path / "out")
+    results = list(iter_batch_process(sorted(scan_images(tree)), out, watermark_content="hi"))
+
+    assert [r.status for r in results] == ["ok", "error"]
+    assert "already written" in results[1].error
+    assert os.listdir(out) == ["x_watermarked.jpg"]
+
+
+def test_several_roots_get_their_own_subdirectories(tmp_path):
+    first = _image(str(tmp_path / "one" / "in" / "x.jpg"))
+    second = _image(str(tmp_path / "two" / "in" / "x.jpg"))
+    roots = [os.path.dirname(first), os.path.dirname(second)]
+
+    assert output_paths(first, "out", roots=roots)[0] == os.path.join("out", "in", "x_watermarked.jpg")
+    assert output_paths(second, "out", roots=roots)[0] == os.path.join("out", "in_2", "x_watermarked.jpg")
+    # inputs outside every root stay flat
+    assert output_paths("/elsewhere/y.png", "out", roots=roots)[0] == os.path.join("out", "y_watermarked.png")
+
+
+def test_tiled_budget_sets_the_overlay_cache_aside(tree, tmp_path):
+    import watermark
+
+    default = watermark._tiled_overlays.max_bytes
+    results = iter_batch_process(
+        sorted(scan_images(tree)), str(tmp_path / "out"), watermark_content="hi",
+        position="tiled", memory_budget=8 * 1024 * 1024, roots=[tree]
+    )
+    assert next(results).status == "ok"
+    assert watermark._tiled_overlays.max_bytes == 2 * 1024 * 1024
+    assert [r.status for r in results] == ["ok"]
+    assert watermark._tiled_overlays.max_bytes == default
+
+
+def test_resume_renders_again_when_a_rendition_is_missing(tree, tmp_path):
+    out = str(tmp_path / "out")
+    renditions = {"thumb": 32, "full": None}
+
+    def run():
+        return {os.path.relpath(r.input, tree): r for r in iter_batch_process(
+            sorted(scan_images(tree)), out, watermark_content="hi", renditions=renditions,
+            resume=True, roots=[tree]
+        )}
+
+    first = run()
+    assert [r.status for r in first.values()] == ["ok", "ok"]
+    assert [r.status for r in run().values()] == ["unchanged", "unchanged"]
+
+    os.remove(first[os.path.join("b", "x.jpg")].renditions["full"])
+    again = run()
+    assert again[os.path.join("a", "x.jpg")].status == "unchanged"
+    assert again[os.path.join("b", "x.jpg")].status == "ok"
+    assert os.path.exists(again[os.path.join("b", "x.jpg")].renditions["full"])
+
+
+@pytest.mark.parametrize("window, statuses", [(2, ["ok", "ok", "error"]), (1, ["ok", "ok", "ok"])])
+def test_streamed_collision_check_remembers_a_bounded_window(tmp_path, monkeypatch, window,
+                                                             statuses):
+    import batch_processor
+
+    monkeypatch.setattr(batch_processor, "COLLISION_WINDOW", window)
+    images = [_image(str(tmp_path / "in" / d / n)) for d, n in (("a", "x.jpg"), ("b", "y.jpg"),
+                                                                ("c", "x.jpg"))]
+    results = iter_batch_process(images, str(tmp_path / "out"), watermark_content="hi")
+    assert [r.status for r in results] == statuses
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    """Five differently coloured images, so mixed-up outputs would show."""
+    return [_image(str(tmp_path / "in" / f"{i}.jpg"), (40 * i, 200 - 30 * i, 90))
+            for i in range(5)]
+
+
+def _contents(paths, out):
+    return [(os.path.relpath(p, out), open(p, "rb").read()) for p in paths]
+
+
+@pytest.mark.parametrize("executor", ["process", "thread"])
+def test_pooled_run_matches_serial(inputs, tmp_path, executor):
+    serial = str(tmp_path / "serial")
+    pooled = str(tmp_path / executor)
+    expected = batch_process(inputs, serial, watermark_content="hi", position="tiled")
+    saved = batch_process(inputs, pooled, watermark_content="hi", position="tiled",
+                          workers=3, executor=executor)
+
+    assert _contents(saved, pooled) == _contents(expected, serial)
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_corrupt_input_does_not_abort_the_batch(inputs, tmp_path, workers):
+    with open(inputs[2], "wb") as f:
+        f.write(b"not an image")
+    out = str(tmp_path / "out")
+    progress = []
+    saved = batch_process(inputs, out, watermark_content="hi", workers=workers,
+                          executor="thread", progress_callback=lambda *p: progress.append(p))
+
+    assert [os.path.basename(p) for p in saved] == [
+        f"{i}_watermarked.jpg" for i in (0, 1, 3, 4)
+    ]
+    assert progress == [(done, 5) for done in range(1, 6)]
+
+
+class _Recorder:
+    """Stands in for _process_one: records start order and how many jobs overlap."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = []
+        self.running = set()
+        self.overlaps = {}  # input -> most other jobs seen running alongside it
+
+    def __call__(self, index, img_path, *args):
+        with self.lock:
+            self.started.append(os.path.basename(img_path))
+            self.running.add(img_path)
+            for path in self.running:
+                self.overlaps[path] = max(self.overlaps.get(path, 0), len(self.running) - 1)
+        time.sleep(0.05)
+        with self.lock:
+            self.running.discard(img_path)
+        return batch_processor.BatchResult(index, img_path, status="ok")
+
+
+@pytest.fixture
+def scheduled(tmp_path, monkeypatch):
+    """Fake memory estimates (taken from the file name) and a recording _process_one."""
+    recorder = _Recorder()
+    monkeypatch.setattr(batch_processor, "_process_one", recorder)
+    monkeypatch.setattr(batch_processor, "estimate_memory",
+                        lambda img_path, *args: int(os.path.basename(img_path).split(".")[0]))
+    return recorder
+
+
+def _run(images, tmp_path, **kwargs):
+    return list(iter_batch_process(images, str(tmp_path / "out"), watermark_content="hi",
+                                   executor="thread", **kwargs))
+
+
+def test_job_larger_than_the_budget_runs_alone(scheduled, tmp_path):
+    images = [str(tmp_path / name) for name in ("10.jpg", "500.jpg", "20.jpg", "30.jpg")]
+    results = _run(images, tmp_path, workers=3, memory_budget=100)
+
+    assert sorted(r.input for r in results) == sorted(images)
+    # tasks start in order: 500 waits for 10, then runs with nothing beside it
+    assert scheduled.started[:2] == ["10.jpg", "500.jpg"]
+    assert scheduled.overlaps[str(tmp_path / "500.jpg")] == 0
+    # the small ones after it fit the budget together
+    assert scheduled.overlaps[str(tmp_path / "20.jpg")] == 1
+    assert {r.memory_estimate for r in results} == {10, 20, 30, 500}
+
+
+def test_largest_first_within_max_pending(scheduled, tmp_path):
+    images = [str(tmp_path / f"{cost}.jpg") for cost in (30, 70, 10, 50, 20, 60)]
+    _run(images, tmp_path, workers=2, max_pending=1, largest_first=True, memory_budget=10**6)
+    assert scheduled.started == ["70.jpg", "60.jpg", "50.jpg", "30.jpg", "20.jpg", "10.jpg"]
+    assert max(scheduled.overlaps.values()) == 0
+
+    scheduled.__init__()
+    _run(images, tmp_path, workers=4, max_pending=2, memory_budget=10**6)
+    assert max(scheduled.overlaps.values()) == 1
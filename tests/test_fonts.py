@@ -0,0 +1,39 @@
+import fonts
+
+
+def test_find_font_prefers_static_face():
+    path, variation = fonts.find_font("Oswald", 600)
+    assert path.endswith("Oswald-SemiBold.ttf")
+    assert variation is None
+
+
+def test_find_font_sets_weight_axis_of_variable_face():
+    path, variation = fonts.find_font("Oswald", 650)
+    assert path.endswith("Oswald-VariableFont_wght.ttf")
+    assert variation == (650,)
+    heavy = fonts.load_font(path, 40, variation).getlength("Watermark")
+    default = fonts.load_font(path, 40).getlength("Watermark")
+    assert heavy > default
+
+
+def test_find_font_unknown_family():
+    assert fonts.find_font("No Such Family") == (None, None)
+
+
+def test_batch_applies_font_variation(tmp_path):
+    from PIL import Image, ImageStat
+
+    from batch_processor import batch_process
+
+    src = str(tmp_path / "in.jpg")
+    Image.new("RGB", (400, 120), "black").save(src)
+    path, _ = fonts.find_font("Oswald", 650)
+
+    ink = {}
+    for weight in (200, 700):
+        out = str(tmp_path / str(weight))
+        # a list, as the setting reads back from a preset or job file
+        batch_process([src], out, watermark_content="Watermark", font_path=path, font_size=60,
+                      opacity=255, position="center", font_variation=[weight])
+        ink[weight] = ImageStat.Stat(Image.open(out + "/in_watermarked.jpg").convert("L")).mean[0]
+    assert ink[700] > ink[200] * 1.3
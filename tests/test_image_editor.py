@@ -0,0 +1,99 @@
+import io
+import random
+
+import pytest
+from PIL import Image, ImageChops, ImageStat
+
+import image_editor
+from image_editor import Pipeline
+
+
+def _noise(size, seed=0):
+    """High-frequency content: the worst case for resampling differences."""
+    return Image.frombytes("RGB", size, random.Random(seed).randbytes(size[0] * size[1] * 3))
+
+
+def _encoded(img, format):
+    buffer = io.BytesIO()
+    img.save(buffer, format, **({"quality": 92} if format == "JPEG" else {}))
+    buffer.seek(0)
+    return buffer
+
+
+def _stepwise(img, ops):
+    """The recorded ops run one by one through the image_editor functions."""
+    for op in ops:
+        kind, args = op[0], op[1:]
+        if kind == "resize":
+            img = image_editor.resize_image(img, *args)
+        elif kind == "crop":
+            img = image_editor.crop_image(img, *args)
+        elif kind == "rotate":
+            img = image_editor.rotate_image(img, *args)
+        elif kind == "flip_horizontal":
+            img = image_editor.flip_horizontal(img)
+        elif kind == "flip_vertical":
+            img = image_editor.flip_vertical(img)
+    return img
+
+
+def _pipeline(source, ops):
+    pipeline = Pipeline(source)
+    for op in ops:
+        getattr(pipeline, op[0])(*op[1:])
+    return pipeline
+
+
+def _mean_difference(a, b):
+    return sum(ImageStat.Stat(ImageChops.difference(a, b)).mean) / len(a.getbands())
+
+
+GEOMETRY_CHAINS = [
+    [("rotate", 90), ("crop", 10, 5, 70, 45)],
+    [("flip_horizontal",), ("rotate", 270), ("crop", 3, 7, 40, 90), ("flip_vertical",)],
+    [("crop", 10, 10, 90, 60), ("rotate", 180), ("crop", 0, 5, 30, 40), ("rotate", 90)],
+    [("flip_vertical",), ("flip_vertical",), ("rotate", -90), ("rotate", 90, False)],
+    # pads outside the image: runs as written
+    [("rotate", 90), ("crop", -5, -5, 40, 200), ("flip_horizontal",)],
+    # arbitrary angle: runs as written
+    [("crop", 5, 5, 95, 65), ("rotate", 30), ("flip_horizontal",), ("crop", 10, 10, 50, 50)],
+]
+
+
+@pytest.mark.parametrize("ops", GEOMETRY_CHAINS)
+def test_geometry_chains_match_step_by_step_pixels(ops):
+    img = _noise((100, 70))
+    expected = _stepwise(img, ops)
+    result = _pipeline(_encoded(img, "PNG"), ops).run()
+    assert result.size == expected.size
+    assert result.tobytes() == expected.tobytes()
+
+
+def test_plan_folds_crops_and_turns_into_one_resize_and_transpose():
+    steps = Pipeline(None).resize(width=500).crop(0, 0, 400, 300).rotate(90) \
+        .flip_horizontal().plan((1000, 800))
+    assert steps == [
+        ("resize", (400, 300), (0, 0, 800, 600)),
+        ("transpose", Image.Transpose.TRANSVERSE),
+    ]
+
+
+RESIZE_CHAINS = [
+    [("resize", 400)],
+    [("resize", 150), ("crop", 10, 10, 140, 100), ("rotate", 90)],
+    [("crop", 100, 50, 700, 550), ("resize", 120), ("flip_horizontal",)],
+    [("rotate", 270), ("resize", 300, 300, False), ("crop", 0, 0, 200, 150)],
+]
+
+
+@pytest.mark.parametrize("format", ["PNG", "JPEG"])
+@pytest.mark.parametrize("ops", RESIZE_CHAINS)
+def test_resize_chains_match_step_by_step(ops, format):
+    source = _encoded(_noise((800, 600), seed=1), format)
+    expected = _stepwise(Image.open(source), ops)
+    source.seek(0)
+    result = _pipeline(source, ops).run()
+
+    assert result.size == expected.size
+    # JPEG: draft() decodes at reduced scale, but leaves LANCZOS a REDUCING_GAP
+    assert _mean_difference(result, expected) < 1
@@ -0,0 +1,18 @@
+from PIL import Image
+
+from logo_cache import LogoCache
+
+
+def test_storing_a_key_twice_counts_its_bytes_once(tmp_path):
+    logo = tmp_path / "logo.png"
+    Image.new("RGBA", (40, 20), (255, 0, 0, 255)).save(logo)
+    cache = LogoCache()
+
+    cache.get(str(logo), 10)
+    usage = cache.memory_usage()
+    # a concurrent miss on the same width stores the key again
+    key = next(reversed(cache._entries))
+    cache._store(key, Image.new("RGBA", (10, 5)))
+
+    assert cache.memory_usage()["bytes"] == usage["bytes"]
+    assert cache.memory_usage()["entries"] == usage["entries"]
@@ -0,0 +1,73 @@
+import json
+import os
+
+from manifest import MANIFEST_NAME, Manifest, file_hash, is_current, settings_fingerprint
+
+
+def test_record_survives_reopen(tmp_path):
+    out = tmp_path / "x_watermarked.jpg"
+    out.write_bytes(b"out")
+    with Manifest(str(tmp_path)) as manifest:
+        manifest.record("in/x.jpg", 10, 123, "h1", "s1", str(out))
+
+    entry = Manifest(str(tmp_path)).get("in/x.jpg")
+    assert entry["input"] == os.path.abspath("in/x.jpg")
+    assert (entry["size"], entry["mtime"], entry["input_hash"]) == (10, 123, "h1")
+    assert is_current(entry, "h1", "s1")
+    assert not is_current(entry, "h2", "s1")
+    assert not is_current(entry, "h1", "s2")
+    out.unlink()
+    assert not is_current(entry, "h1", "s1")
+
+
+def test_last_line_wins_and_torn_line_is_ignored(tmp_path):
+    with Manifest(str(tmp_path)) as manifest:
+        manifest.record("a.jpg", 1, 1, "old", "s", "o1")
+        manifest.record("a.jpg", 2, 2, "new", "s", "o2")
+    path = tmp_path / MANIFEST_NAME
+    with open(path, "a") as f:
+        f.write('{"input": "b.jpg", "size"')  # crash mid-write
+
+    manifest = Manifest(str(tmp_path))
+    assert manifest.get("a.jpg")["input_hash"] == "new"
+    assert manifest.get("b.jpg") is None
+    manifest.record("c.jpg", 3, 3, "h", "s", "o3")
+    manifest.close()
+
+    lines = path.read_text().splitlines()
+    assert json.loads(lines[-1])["input"] == os.path.abspath("c.jpg")
+    assert len(Manifest(str(tmp_path))) == 2
+
+
+def test_compact_keeps_one_line_per_input(tmp_path):
+    manifest = Manifest(str(tmp_path))
+    for i in range(5):
+        manifest.record("a.jpg", i, i, f"h{i}", "s", "o")
+    manifest.compact()
+    manifest.close()
+    assert len((tmp_path / MANIFEST_NAME).read_text().splitlines()) == 1
+    assert Manifest(str(tmp_path)).get("a.jpg")["input_hash"] == "h4"
+
+
+def test_fingerprint_follows_referenced_file_content(tmp_path):
+    logo = tmp_path / "logo.png"
+    logo.write_bytes(b"v1")
+    first = settings_fingerprint({"logo_path": str(logo), "color": (1, 2, 3)})
+    assert first == settings_fingerprint({"color": [1, 2, 3], "logo_path": str(logo)})
+    logo.write_bytes(b"v2")
+    assert settings_fingerprint({"logo_path": str(logo), "color": (1, 2, 3)}) != first
+    assert file_hash(str(logo)) != file_hash(__file__)
+
+
+def test_every_recorded_output_must_exist(tmp_path):
+    outputs = [tmp_path / f"x_watermarked_{label}.jpg" for label in ("thumb", "full")]
+    for path in outputs:
+        path.write_bytes(b"out")
+    with Manifest(str(tmp_path)) as manifest:
+        manifest.record("x.jpg", 1, 1, "h", "s", str(outputs[0]), [str(p) for p in outputs])
+
+    entry = Manifest(str(tmp_path)).get("x.jpg")
+    assert entry["outputs"] == [str(p) for p in outputs]
+    assert is_current(entry, "h", "s")
+    outputs[1].unlink()
+    assert not is_current(entry, "h", "s")
@@ -0,0 +1,92 @@
+import io
+import os
+import signal
+import socket
+
+import pytest
+from PIL import Image
+
+from service import BadRequest, WatermarkService, render, request_settings
+
+
+def _jpeg():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), "gray").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def _post(service, query, body=b"", content_length=None):
+    """Raw POST /watermark; returns the status code."""
+    host, port = service.httpd.server_address[:2]
+    length = len(body) if content_length is None else content_length
+    with socket.create_connection((host, port), timeout=10) as sock:
+        sock.sendall(
+            f"POST /watermark?{query} HTTP/1.1\r\nHost: x\r\nContent-Length: {length}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        status = sock.makefile("rb").readline().split()[1]
+    return int(status)
+
+
+@pytest.fixture
+def service():
+    service = WatermarkService(port=0, workers=1, max_pending=1, executor="thread")
+    service.start()
+    yield service
+    service.shutdown()
+
+
+def test_query_paths_stay_inside_the_asset_directories(tmp_path):
+    logo = tmp_path / "assets" / "logo.png"
+    logo.parent.mkdir()
+    Image.new("RGBA", (8, 8)).save(logo)
+    (tmp_path / "secret.png").write_bytes(b"")
+    assets = [str(tmp_path / "assets")]
+
+    assert request_settings({"logo": "logo.png"}, asset_dirs=assets)["logo_path"] == str(logo)
+    for value in ("../secret.png", str(tmp_path / "secret.png"), "missing.png"):
+        with pytest.raises(BadRequest, match="asset directories"):
+            request_settings({"logo": value}, asset_dirs=assets)
+
+    # presets are written by the operator and may point anywhere
+    preset = {"watermark_type": "logo", "logo_path": str(tmp_path / "secret.png")}
+    settings = request_settings({"preset": "p"}, lambda name: preset, asset_dirs=assets)
+    assert settings["logo_path"] == str(tmp_path / "secret.png")
+
+
+def test_bad_content_length_is_a_bad_request(service):
+    assert _post(service, "text=hi", content_length="many") == 400
+
+
+def test_saturated_service_answers_before_reading_the_upload(service):
+    assert service.admit()
+    try:
+        # the upload is never sent: the 503 must not wait for it
+        assert _post(service, "text=hi", content_length=10_000_000) == 503
+    finally:
+        service.release()
+    assert _post(service, "text=hi", _jpeg()) == 200
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+def test_dead_worker_process_is_replaced():
+    service = WatermarkService(port=0, workers=1)
+    service.start()
+    try:
+        assert _post(service, "text=hi", _jpeg()) == 200
+        os.kill(service.pool.submit(os.getpid).result(), signal.SIGKILL)
+
+        assert _post(service, "text=hi", _jpeg()) in (200, 503)
+        assert _post(service, "text=hi", _jpeg()) == 200
+        assert service.health()["restarts"] == 1
+    finally:
+        service.shutdown()
+
+
+def test_preset_renditions_are_ignored_by_render():
+    preset = {"watermark_type": "text", "watermark_content": "hi",
+              "renditions": {"thumb": 32, "full": None}}
+    settings = request_settings({"preset": "p"}, load_preset=lambda name: preset)
+    out, fmt, _, _ = render(_jpeg(), settings)
+    assert fmt == "JPEG"
+    assert Image.open(io.BytesIO(out)).size == (64, 48)
@@ -0,0 +1,105 @@
+import json
+import os
+
+import pytest
+from PIL import Image
+
+import batch_processor
+import sharding
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """in/a/x.jpg and in/b/x.jpg: same file name in two folders."""
+    root = tmp_path / "in"
+    for sub in ("a", "b"):
+        (root / sub).mkdir(parents=True)
+        Image.new("RGB", (64, 48), "red").save(root / sub / "x.jpg")
+    return str(root)
+
+
+def _queue(job, queue):
+    return sorted(os.listdir(os.path.join(job, queue)))
+
+
+def test_create_job_refuses_colliding_outputs(tree, tmp_path):
+    images = sorted(batch_processor.scan_images(tree))
+    with pytest.raises(ValueError, match="x_watermarked.jpg"):
+        sharding.create_job(str(tmp_path / "job"), images, str(tmp_path / "out"),
+                            watermark_content="hi")
+    assert not (tmp_path / "job").exists()
+
+    job = str(tmp_path / "job")
+    sharding.create_job(job, images, str(tmp_path / "out"), roots=[tree], watermark_content="hi")
+    sharding.work(job, "n1", wait=False)
+    summary = sharding.summarize(job)
+    assert summary["images"]["ok"] == 2 and summary["collisions"] == []
+    assert (tmp_path / "out" / "a" / "x_watermarked.jpg").exists()
+    assert (tmp_path / "out" / "b" / "x_watermarked.jpg").exists()
+
+
+def test_failing_item_uses_up_its_attempts(tree, tmp_path):
+    job = str(tmp_path / "job")
+    out = tmp_path / "out"
+    sharding.create_job(job, [os.path.join(tree, "a", "x.jpg")], str(out), max_attempts=2,
+                        watermark_content="hi")
+    out.write_bytes(b"")  # the output directory cannot be created
+
+    sharding.process_items(job, sharding.claim(job, "n1"), sharding.load_job(job), "n1")
+    assert _queue(job, "todo") == ["00000000.1.json"]
+
+    sharding.work(job, "n1", wait=False)
+    assert _queue(job, "todo") == [] and _queue(job, "failed") == ["00000000.2.json"]
+    assert sharding.summarize(job)["abandoned"] == [os.path.join(tree, "a", "x.jpg")]
+
+
+def test_interrupted_item_goes_back_unchanged(tree, tmp_path, monkeypatch):
+    job = str(tmp_path / "job")
+    sharding.create_job(job, [os.path.join(tree, "a", "x.jpg")], str(tmp_path / "out"),
+                        watermark_content="hi")
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+        yield
+
+    monkeypatch.setattr(batch_processor, "iter_batch_process", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        sharding.process_items(job, sharding.claim(job, "n1"), sharding.load_job(job), "n1")
+    assert _queue(job, "todo") == ["00000000.0.json"]
+
+
+def test_summary_reports_outputs_written_for_several_inputs(tree, tmp_path):
+    job = str(tmp_path / "job")
+    images = sorted(batch_processor.scan_images(tree))
+    sharding.create_job(job, images, str(tmp_path / "out"), roots=[tree], watermark_content="hi")
+    sharding.work(job, "n1", wait=False)
+
+    # e.g. results of an older job layout that flattened the tree
+    shared = str(tmp_path / "out" / "x_watermarked.jpg")
+    with open(os.path.join(job, "results", "00000001.jsonl"), "w") as f:
+        for img_path in images:
+            f.write(json.dumps({"input": img_path, "status": "ok", "output": shared,
+                                "renditions": None, "error": None, "seconds": 0.0,
+                                "item": "00000001", "node": "old"}) + "\n")
+
+    assert sharding.summarize(job)["collisions"] == [{"output": shared, "inputs": images}]
+
+
+def test_node_streams_all_its_items_through_one_pool(tree, tmp_path, monkeypatch):
+    job = str(tmp_path / "job")
+    images = sorted(batch_processor.scan_images(tree))
+    sharding.create_job(job, images, str(tmp_path / "out"), chunk_size=1, roots=[tree],
+                        watermark_content="hi")
+    streams = []
+    stream = batch_processor.iter_batch_process
+
+    def counted(*args, **kwargs):
+        streams.append(kwargs)
+        return stream(*args, **kwargs)
+
+    monkeypatch.setattr(batch_processor, "iter_batch_process", counted)
+    counts = sharding.work(job, "n1", wait=False, workers=2, executor="thread")
+
+    assert len(streams) == 1 and counts["ok"] == 2
+    assert _queue(job, "done") == ["00000000.0.json", "00000001.0.json"]
+    assert _queue(job, "results") == ["00000000.jsonl", "00000001.jsonl"]
@@ -0,0 +1,111 @@
+import random
+
+from PIL import Image, ImageDraw
+
+from undo_redo import UndoRedoManager
+
+
+def _noise(size, seed, mode="RGB"):
+    data = random.Random(seed).randbytes(size[0] * size[1] * 3)
+    return Image.frombytes("RGB", size, data).convert(mode)
+
+
+def _edits(base, count, seed=0):
+    """
+    Successive images, each with one small rectangle drawn on the previous
+    (noise does not compress, so frames are large next to the touched tiles).
+    """
+    rng = random.Random(seed)
+    images = [base]
+    for _ in range(count):
+        img = images[-1].copy()
+        x, y = rng.randrange(base.width - 20), rng.randrange(base.height - 20)
+        fill = rng.randrange(256) if img.mode in ("L", "P") else (255, 0, 0)
+        ImageDraw.Draw(img).rectangle((x, y, x + 12, y + 9), fill=fill)
+        images.append(img)
+    return images
+
+
+def _same(a, b):
+    return a.mode == b.mode and a.size == b.size and a.tobytes() == b.tobytes()
+
+
+def _walk(manager, images):
+    """Undo to the first state and redo to the last, checking every state."""
+    for expected in reversed(images[:-1]):
+        assert _same(manager.undo(), expected)
+    assert manager.undo() is None
+    for expected in images[1:]:
+        assert _same(manager.redo(), expected)
+    assert manager.redo() is None
+
+
+def test_small_edits_are_stored_as_tile_deltas():
+    images = _edits(_noise((400, 300), 1), 6)
+    manager = UndoRedoManager(tile_size=32)
+    for img in images:
+        manager.add_state(img)
+
+    usage = manager.memory_usage()
+    assert usage["keyframes"] == 1 and usage["deltas"] == 6
+    _walk(manager, images)
+
+
+def test_delta_chain_is_cut_by_keyframes():
+    images = _edits(_noise((256, 256), 2), 9)
+    manager = UndoRedoManager(tile_size=16, keyframe_every=4)
+    for img in images:
+        manager.add_state(img)
+    assert manager.memory_usage()["keyframes"] == 3
+    _walk(manager, images)
+
+
+def test_large_change_and_mode_change_start_keyframes():
+    first = _noise((64, 64), 3)
+    images = [first, _noise((64, 64), 4), _noise((64, 64), 4).convert("L")]
+    manager = UndoRedoManager(tile_size=16)
+    for img in images:
+        manager.add_state(img)
+    assert manager.memory_usage()["keyframes"] == 3
+    _walk(manager, images)
+
+
+def test_palette_images_round_trip():
+    images = _edits(_noise((160, 120), 5, "P"), 3)
+    manager = UndoRedoManager(tile_size=16)
+    for img in images:
+        manager.add_state(img)
+    for expected in reversed(images[:-1]):
+        restored = manager.undo()
+        assert _same(restored, expected) and restored.getpalette() == expected.getpalette()
+
+
+def test_eviction_rebases_deltas_on_a_new_keyframe():
+    images = _edits(_noise((320, 240), 6), 12)
+    probe = UndoRedoManager(tile_size=32)
+    probe.add_state(images[0])
+    keyframe_bytes = probe.memory_usage()["bytes"]
+
+    # room for about two keyframes: the oldest states must go
+    manager = UndoRedoManager(max_bytes=keyframe_bytes * 2, tile_size=32, keyframe_every=5)
+    for img in images:
+        manager.add_state(img)
+    usage = manager.memory_usage()
+    assert usage["bytes"] <= usage["max_bytes"]
+    assert 1 < usage["states"] < len(images)
+
+    kept = images[-usage["states"]:]
+    _walk(manager, kept)
+
+
+def test_new_action_drops_redo_states_and_objects_round_trip():
+    manager = UndoRedoManager()
+    manager.add_state({"text": "a"})
+    manager.add_state({"text": "b"})
+    assert manager.undo() == {"text": "a"}
+    manager.add_state({"text": "c"})
+    assert manager.redo() is None
+    assert manager.undo() == {"text": "a"}
+    assert manager.redo() == {"text": "c"}
+    manager.clear()
+    assert manager.memory_usage()["states"] == 0 and manager.undo() is None
@@ -0,0 +1,25 @@
+import os
+
+from PIL import Image
+
+from watcher import watch
+
+
+def test_watched_dirs_keep_same_named_files_apart(tmp_path):
+    for rel in ("d1/x.jpg", "d1/sub/x.jpg", "d2/x.jpg"):
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", (64, 48), "red").save(path)
+    out = tmp_path / "out"
+
+    results = watch([str(tmp_path / "d1"), str(tmp_path / "d2")], str(out), settle=0.1,
+                    interval=0.05, use_inotify=False, watermark_content="hi")
+    statuses = [next(results).status for _ in range(3)]
+    results.close()
+
+    assert statuses == ["ok"] * 3
+    assert sorted(os.path.relpath(os.path.join(d, f), out)
+                  for d, _, files in os.walk(out) for f in files if f.endswith(".jpg")) == [
+        os.path.join("d1", "sub", "x_watermarked.jpg"), os.path.join("d1", "x_watermarked.jpg"),
+        os.path.join("d2", "x_watermarked.jpg"),
+    ]
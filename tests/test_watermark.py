@@ -0,0 +1,107 @@
+import io
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+from fonts import load_font
+from watermark import (
+    _composite_stamp, _stamp_origin, _text_stamp, add_text_watermark, logo_watermark_bytes,
+    text_watermark_bytes,
+)
+
+
+def _noise(size, mode, seed=0):
+    bands = len(mode)
+    return Image.frombytes(mode, size, random.Random(seed).randbytes(size[0] * size[1] * bands))
+
+
+def _full_frame(base, text, position, font_size, color, opacity, margin):
+    """The original approach: draw on a transparent layer the size of the image."""
+    layer = Image.new('RGBA', base.size, (255, 255, 255, 0))
+    draw = ImageDraw.Draw(layer)
+    font = load_font(None, font_size)
+    bbox = draw.textbbox((0, 0), text, font=font)
+    x, y = _stamp_origin(position, base.width, base.height,
+                         bbox[2] - bbox[0], bbox[3] - bbox[1], margin)
+    draw.text((x, y), text, fill=color + (opacity,), font=font)
+    merged = Image.alpha_composite(base.convert('RGBA'), layer)
+    return merged if base.mode == 'RGBA' else merged.convert(base.mode)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+@pytest.mark.parametrize("position", ["bottom_right", "center"])
+def test_stamp_matches_full_frame_overlay(mode, position):
+    # RGBA noise: every alpha level, including fully transparent pixels
+    base = _noise((160, 90), mode)
+    text, font_size, color, opacity, margin = "Wg (c) 2024", 28, (250, 200, 10), 150, 10
+
+    stamp, (dx, dy), (text_w, text_h) = _text_stamp(text, None, font_size, color, opacity)
+    x, y = _stamp_origin(position, base.width, base.height, text_w, text_h, margin)
+    result = _composite_stamp(base.copy(), stamp, (x + dx, y + dy))
+
+    expected = _full_frame(base, text, position, font_size, color, opacity, margin)
+    assert result.mode == mode
+    assert result.tobytes() != base.tobytes()
+    assert result.tobytes() == expected.tobytes()
+
+
+def _source(mode):
+    if mode == 'I;16':
+        return Image.new(mode, (160, 90), 20000)
+    # converting from RGB gives P the web palette, which has white in it
+    return Image.new('RGB', (160, 90), (40, 60, 90)).convert(mode)
+
+
+def _brightest(img):
+    if img.mode == 'I;16':
+        return img.convert('I').getextrema()[1] / 257
+    return img.convert('RGB').convert('L').getextrema()[1]
+
+
+@pytest.mark.parametrize("mode, ext", [
+    ('L', '.png'), ('P', '.png'), ('CMYK', '.tif'), ('I;16', '.png'), ('RGBA', '.png'),
+])
+def test_watermark_keeps_the_input_mode(tmp_path, mode, ext):
+    source = _source(mode)
+    src, out = str(tmp_path / f"in{ext}"), str(tmp_path / f"out{ext}")
+    source.save(src)
+    add_text_watermark(src, "hi there", out, position="center", font_size=28, opacity=255)
+
+    with Image.open(out) as result:
+        assert result.mode == mode
+        # text is white: the stamped pixels get brighter than the background
+        assert _brightest(result) > _brightest(source)
+
+
+def _encoded(img, fmt):
+    buffer = io.BytesIO()
+    img.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP", "TIFF"])
+def test_bytes_api_keeps_the_input_format(tmp_path, fmt):
+    logo = tmp_path / "logo.png"
+    Image.new('RGBA', (20, 10), (255, 255, 255, 255)).save(logo)
+    data = _encoded(Image.new('RGB', (160, 90), (40, 60, 90)), fmt)
+
+    for out in (text_watermark_bytes(data, "hi", position="center", opacity=255),
+                logo_watermark_bytes(data, str(logo), position="center", opacity=255,
+                                     scale=0.5)):
+        assert out != data
+        with Image.open(io.BytesIO(out)) as result:
+            assert result.format == fmt
+            assert result.size == (160, 90)
+
+
+def test_bytes_api_rejects_a_format_it_cannot_write():
+    rows = ",\n".join(['"' + "a" * 64 + '"'] * 32)
+    xpm = ('/* XPM */\nstatic char *x[] = {\n"64 32 1 1",\n"a c #204060",\n'
+           + rows + "\n};\n").encode()
+    with pytest.raises(OSError, match="No XPM encoder"):
+        text_watermark_bytes(xpm, "hi", position="center", opacity=255)
+    # a profile with a format of its own converts instead
+    out = text_watermark_bytes(xpm, "hi", position="center", opacity=255,
+                               encoder={"format": "PNG"})
+    assert Image.open(io.BytesIO(out)).format == "PNG"
@@ -1,33 +1,187 @@
-import copy
+import hashlib
+import pickle
+import zlib
+from PIL import Image
+
+# Default na byte budget ng buong history (compressed)
+HISTORY_BYTES = 256 * 1024 * 1024
+TILE_SIZE = 64
+KEYFRAME_EVERY = 16
+COMPRESS_LEVEL = 1
+
+
+def _digest(buf):
+    """Internal: maikling hash ng isang band o tile"""
+    return hashlib.blake2b(buf, digest_size=16).digest()
+
+
+class _State:
+    """Internal: isang naka-compress na state (full, delta o object)"""
+    __slots__ = ("kind", "mode", "size", "palette", "data", "bands", "tiles", "depth", "nbytes", "raw")
+
+    def __init__(self, kind, data, nbytes, raw, mode=None, size=None, palette=None,
+                 bands=None, tiles=None, depth=0):
+        self.kind = kind
+        self.data = data
+        self.nbytes = nbytes
+        self.raw = raw
+        self.mode = mode
+        self.size = size
+        self.palette = palette
+        self.bands = bands
+        self.tiles = tiles or {}
+        self.depth = depth
+
 
 class UndoRedoManager:
-    """Mag-manage ng undo/redo states gamit ang deep copy ng image objects"""
-    def __init__(self):
+    """
+    Mag-manage ng undo/redo states na naka-compress, may byte budget.
+    Bawat PIL image state ay full keyframe (zlib) o tile-level delta laban
+    sa previous state; ang pinakalumang states ang tinatanggal kapag
+    lumampas sa budget.
+    """
+    def __init__(self, max_bytes=HISTORY_BYTES, tile_size=TILE_SIZE,
+                 keyframe_every=KEYFRAME_EVERY, compress_level=COMPRESS_LEVEL):
+        """
+        :param max_bytes: byte budget ng compressed history
+        :param tile_size: laki ng tile (pixels) para sa deltas
+        :param keyframe_every: max na haba ng delta chain bago mag-keyframe ulit
+        :param compress_level: zlib level (1 = pinakamabilis)
+        """
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size
+        self.keyframe_every = keyframe_every
+        self.compress_level = compress_level
         self._states = []
         self._index = -1
+        self._bytes = 0
 
     def add_state(self, image):
-        """I-save ang current state; pwede PIL.Image o anumang mutable object"""
+        """I-save ang current state; pwede PIL.Image o anumang picklable object"""
         # tanggalin ang future states kapag bagong action
+        for state in self._states[self._index + 1:]:
+            self._bytes -= state.nbytes
         self._states = self._states[:self._index + 1]
-        self._states.append(copy.deepcopy(image))
+
+        if isinstance(image, Image.Image):
+            state = self._encode_image(image)
+        else:
+            data = zlib.compress(pickle.dumps(image), self.compress_level)
+            state = _State("object", data, len(data), len(data))
+
+        self._states.append(state)
+        self._bytes += state.nbytes
         self._index += 1
+        self._evict()
+
+    def _encode_image(self, image):
+        """Internal: gawing keyframe o delta ang image"""
+        t = self.tile_size
+        raw = image.tobytes()
+        w, h = image.size
+        stride = len(raw) // h if h else 0
+        view = memoryview(raw)
+        bands = [_digest(view[y * stride:min(y + t, h) * stride]) for y in range(0, h, t)]
+        palette = image.getpalette() if image.mode == 'P' else None
+
+        prev = self._states[-1] if self._states else None
+        if (prev is not None and prev.kind != "object"
+                and (prev.mode, prev.size, prev.palette) == (image.mode, image.size, palette)
+                and prev.depth + 1 < self.keyframe_every):
+            tiles = dict(prev.tiles)
+            changes = []
+            nbytes = 0
+            for b, digest in enumerate(bands):
+                if digest == prev.bands[b]:
+                    continue
+                y0, y1 = b * t, min((b + 1) * t, h)
+                old_row = prev.tiles.get(b)
+                row = []
+                for i, x0 in enumerate(range(0, w, t)):
+                    box = (x0, y0, min(x0 + t, w), y1)
+                    tile = image.crop(box).tobytes()
+                    row.append(_digest(tile))
+                    if old_row is None or old_row[i] != row[-1]:
+                        data = zlib.compress(tile, self.compress_level)
+                        changes.append((box, data))
+                        nbytes += len(data)
+                tiles[b] = row
+            # malaking pagbabago: mas sulit ang bagong keyframe
+            if nbytes < len(raw) // 4:
+                return _State("delta", changes, nbytes, len(raw), image.mode, image.size,
+                              palette, bands, tiles, prev.depth + 1)
+
+        data = zlib.compress(raw, self.compress_level)
+        return _State("full", data, len(data), len(raw), image.mode, image.size,
+                      palette, bands)
+
+    def _decode(self, index):
+        """Internal: buuin ulit ang state sa index (isang bagong object)"""
+        state = self._states[index]
+        if state.kind == "object":
+            return pickle.loads(zlib.decompress(state.data))
+
+        # hanapin ang keyframe, tapos i-apply ang mga delta pasulong
+        start = index
+        while self._states[start].kind != "full":
+            start -= 1
+        key = self._states[start]
+        img = Image.frombytes(key.mode, key.size, zlib.decompress(key.data))
+        for delta in self._states[start + 1:index + 1]:
+            for box, data in delta.data:
+                tile = Image.frombytes(
+                    img.mode, (box[2] - box[0], box[3] - box[1]), zlib.decompress(data)
+                )
+                img.paste(tile, box[:2])
+        if key.palette is not None:
+            img.putpalette(key.palette)
+        return img
+
+    def _evict(self):
+        """Internal: tanggalin ang pinakalumang states hanggang pasok sa budget"""
+        while self._bytes > self.max_bytes and len(self._states) > 1:
+            nxt = self._states[1]
+            if nxt.kind == "delta":
+                # gawing keyframe ang susunod bago tanggalin ang base nito
+                img = self._decode(1)
+                data = zlib.compress(img.tobytes(), self.compress_level)
+                self._bytes += len(data) - nxt.nbytes
+                nxt.kind, nxt.data, nxt.nbytes, nxt.depth = "full", data, len(data), 0
+                for later in self._states[2:]:
+                    if later.kind != "delta":
+                        break
+                    later.depth -= 1
+            self._bytes -= self._states.pop(0).nbytes
+            self._index -= 1
 
     def undo(self):
         """Bumalik sa previous state; ibalik None kung wala nang undo"""
         if self._index > 0:
             self._index -= 1
-            return copy.deepcopy(self._states[self._index])
+            return self._decode(self._index)
         return None
 
     def redo(self):
         """Pumunta sa next state; ibalik None kung wala nang redo"""
         if self._index < len(self._states) - 1:
             self._index += 1
-            return copy.deepcopy(self._states[self._index])
+            return self._decode(self._index)
         return None
 
+    def memory_usage(self):
+        """Snapshot ng memory na gamit ng history (para sa UI)"""
+        return {
+            'states': len(self._states),
+            'index': self._index,
+            'keyframes': sum(1 for s in self._states if s.kind == "full"),
+            'deltas': sum(1 for s in self._states if s.kind == "delta"),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'uncompressed_bytes': sum(s.raw for s in self._states),
+        }
+
     def clear(self):
         """I-reset ang history"""
         self._states.clear()
         self._index = -1
+        self._bytes = 0
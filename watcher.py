@@ -0,0 +1,421 @@
+# watcher.py
+"""
+Watch folders: watermark files as they land in one or more drop directories.
+
+    python -m watermark_app watch drop/ -o out/ --text "© Studio" --done-dir done/
+
+Directory changes come from inotify where the platform has it (Linux, via
+ctypes, no extra dependency) and from polling directory mtimes elsewhere,
+so only directories that changed are listed again. A file is handed on once
+its size and mtime have stopped changing for `settle` seconds. Rendering
+goes through iter_batch_process with resume=True, which bounds the work in
+flight and keeps the content-hash manifest in the output directory; a
+restarted watcher therefore skips files it already finished.
+"""
+
+import heapq
+import os
+import select
+import shutil
+import struct
+import threading
+import time
+from collections import deque
+from config import SUPPORTED_IMAGE_FORMATS
+
+SETTLE_SECONDS = 2.0   # a file must be unchanged this long before it is processed
+POLL_INTERVAL = 1.0    # directory mtime polling period (polling mode)
+TICK = 0.25            # longest wait before results are handed back
+
+# inotify(7) constants
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+               | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; then the NUL-padded name
+
+
+class _Inotify:
+    """Internal: minimal ctypes binding of inotify; raises OSError where unavailable."""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            self._add = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except (OSError, AttributeError, TypeError):
+            raise OSError("inotify is not available on this platform")
+        self._add.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._errno = ctypes.get_errno
+        self.fd = init(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            err = self._errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path):
+        """:return: watch descriptor of directory path"""
+        wd = self._add(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = self._errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read(self, timeout):
+        """
+        Wait up to timeout seconds for events.
+        :return: list of (wd, mask, name) tuples
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT.size <= len(buf):
+            wd, mask, _cookie, length = _EVENT.unpack_from(buf, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(buf[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class Watcher:
+    """
+    Endless iterable of image paths that are ready to process. Yields None
+    as an idle tick at least every TICK seconds while nothing is ready, so
+    the consumer (iter_batch_process) can hand back finished results.
+    Iteration ends after stop().
+    """
+
+    def __init__(self, dirs, settle=SETTLE_SECONDS, interval=POLL_INTERVAL, recursive=True,
+                 formats=None, exclude=(), use_inotify=None):
+        """
+        :param dirs: directory path or list of directories to watch
+        :param settle: seconds a file's size and mtime must stay the same
+        :param interval: directory polling period when inotify is not used
+        :param recursive: also watch subdirectories (including ones created later)
+        :param formats: extensions to pick up (default config.SUPPORTED_IMAGE_FORMATS)
+        :param exclude: directories never to descend into (e.g. output and done dirs)
+        :param use_inotify: True (require it), False (poll) or None (inotify if available)
+        """
+        self.roots = [os.path.abspath(d) for d in ([dirs] if isinstance(dirs, str) else dirs)]
+        for root in self.roots:
+            if not os.path.isdir(root):
+                raise FileNotFoundError(f"Watch directory not found: {root}")
+        self.settle = settle
+        self.interval = interval
+        self.recursive = recursive
+        self.formats = tuple(f.lower() for f in (formats or SUPPORTED_IMAGE_FORMATS))
+        self.exclude = {os.path.abspath(d) for d in exclude if d}
+
+        self._stop = threading.Event()
+        self._dirs = {}        # watched dir -> inotify wd, or mtime_ns when polling
+        self._wds = {}         # inotify wd -> dir
+        self._done = {}        # dir -> {name: (size, mtime_ns)} of files handed on
+        self._pending = {}     # path -> ((size, mtime_ns), due) of files still settling
+        self._due = []         # heap of (due, path); stale entries are skipped
+        self._ready = deque()
+        self._last_poll = 0.0
+
+        self._inotify = None
+        if use_inotify is not False:
+            try:
+                self._inotify = _Inotify()
+            except OSError:
+                if use_inotify:
+                    raise
+
+    @property
+    def mode(self):
+        """'inotify' or 'polling'"""
+        return "inotify" if self._inotify is not None else "polling"
+
+    def root_of(self, path):
+        """:return: the watched root directory containing path, or None"""
+        path = os.path.abspath(path)
+        for root in self.roots:
+            if path.startswith(root + os.sep):
+                return root
+        return None
+
+    def stop(self):
+        """End iteration at the next tick (safe from other threads and signal handlers)."""
+        self._stop.set()
+
+    def close(self):
+        self.stop()
+        if self._inotify is not None:
+            self._inotify.close()
+
+    def __iter__(self):
+        for root in self.roots:
+            self._add_dir(root)
+        last = time.monotonic()
+        while not self._stop.is_set():
+            if self._ready:
+                yield self._ready.popleft()
+                if time.monotonic() - last < TICK:
+                    continue
+                # a long backlog must not starve event reading
+                self._poll(0)
+            else:
+                self._poll(self._timeout())
+            last = time.monotonic()
+            self._check_due(last)
+            if not self._ready:
+                yield None
+
+    def _timeout(self):
+        """Internal: how long the next poll may block."""
+        timeout = TICK
+        while self._due and self._due[0][1] not in self._pending:
+            heapq.heappop(self._due)
+        if self._due:
+            timeout = min(timeout, max(0.0, self._due[0][0] - time.monotonic()))
+        return timeout
+
+    def _wanted(self, name):
+        """Internal: whether a file name is an image to pick up (not a temp/hidden file)."""
+        return not name.startswith(".") and name.lower().endswith(self.formats)
+
+    def _add_dir(self, path):
+        """Internal: start watching a directory and pick up what is already in it."""
+        path = os.path.abspath(path)
+        if path in self._dirs or path in self.exclude:
+            return
+        if self._inotify is not None:
+            try:
+                wd = self._inotify.add_watch(path)
+            except OSError as e:
+                if not os.path.isdir(path):
+                    return
+                # typically the fs.inotify.max_user_watches limit
+                print(f"[watcher] inotify watch failed on {path} ({e.strerror}); polling instead")
+                self._fall_back()
+                return self._add_dir(path)
+            self._dirs[path] = wd
+            self._wds[wd] = path
+        else:
+            try:
+                self._dirs[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                return
+        # watch first, then list: files landing in between are seen either way
+        self._scan_dir(path)
+
+    def _fall_back(self):
+        """Internal: switch to polling, keeping the directories already watched."""
+        self._inotify.close()
+        self._inotify = None
+        self._wds.clear()
+        for path in list(self._dirs):
+            try:
+                self._dirs[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                del self._dirs[path]
+
+    def _remove_dir(self, path):
+        """Internal: forget a directory that was deleted or moved away."""
+        for known in [d for d in self._dirs if d == path or d.startswith(path + os.sep)]:
+            wd = self._dirs.pop(known)
+            if self._inotify is not None:
+                self._wds.pop(wd, None)
+            self._done.pop(known, None)
+
+    def _scan_dir(self, path):
+        """Internal: list one directory; new subdirectories are added, files touched."""
+        present = set()
+        try:
+            it = os.scandir(path)
+        except OSError:
+            self._remove_dir(path)
+            return
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive and not entry.name.startswith("."):
+                            self._add_dir(entry.path)
+                    elif self._wanted(entry.name):
+                        present.add(entry.name)
+                        self._touch(entry.path)
+                except OSError:
+                    continue
+        done = self._done.get(path)
+        if done:
+            # forget finished files that were moved away or deleted
+            for name in [n for n in done if n not in present]:
+                del done[name]
+
+    def _touch(self, path):
+        """Internal: a file appeared or changed; (re)start its settle timer."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._pending.pop(path, None)
+            return
+        sig = (st.st_size, st.st_mtime_ns)
+        directory, name = os.path.split(path)
+        if self._done.get(directory, {}).get(name) == sig:
+            return
+        previous = self._pending.get(path)
+        if previous and previous[0] == sig:
+            return
+        now = time.monotonic()
+        if previous is None and time.time() - st.st_mtime >= self.settle:
+            # already quiet for the settle time (e.g. left over from before a restart)
+            due = now
+        else:
+            due = now + self.settle
+        self._pending[path] = (sig, due)
+        heapq.heappush(self._due, (due, path))
+
+    def _check_due(self, now):
+        """Internal: hand on files whose settle time passed without a change."""
+        while self._due and self._due[0][0] <= now:
+            due, path = heapq.heappop(self._due)
+            pending = self._pending.get(path)
+            if pending is None or pending[1] != due:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            sig = (st.st_size, st.st_mtime_ns)
+            if sig != pending[0]:
+                # still being written
+                self._pending[path] = (sig, now + self.settle)
+                heapq.heappush(self._due, (now + self.settle, path))
+                continue
+            del self._pending[path]
+            directory, name = os.path.split(path)
+            self._done.setdefault(directory, {})[name] = sig
+            self._ready.append(path)
+
+    def _poll(self, timeout):
+        """Internal: take in directory changes, waiting up to timeout seconds."""
+        if self._inotify is not None:
+            self._read_events(timeout)
+            return
+        if timeout:
+            self._stop.wait(timeout)
+        now = time.monotonic()
+        if now - self._last_poll < self.interval:
+            return
+        self._last_poll = now
+        # only directories whose entries changed are listed again
+        for path, mtime in list(self._dirs.items()):
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                self._remove_dir(path)
+                continue
+            if current != mtime:
+                self._dirs[path] = current
+                self._scan_dir(path)
+
+    def _read_events(self, timeout):
+        """Internal: apply pending inotify events."""
+        for wd, mask, name in self._inotify.read(timeout):
+            if mask & _IN_Q_OVERFLOW:
+                # events were dropped: list everything once more
+                for path in list(self._dirs):
+                    self._scan_dir(path)
+                continue
+            directory = self._wds.get(wd)
+            if directory is None:
+                continue
+            if mask & (_IN_IGNORED | _IN_DELETE_SELF | _IN_MOVE_SELF):
+                if directory in self.roots and not mask & _IN_IGNORED:
+                    print(f"[watcher] Watch directory went away: {directory}")
+                self._remove_dir(directory)
+                continue
+            path = os.path.join(directory, name)
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO) and self.recursive and not name.startswith("."):
+                    self._add_dir(path)
+                elif mask & _IN_MOVED_FROM:
+                    self._remove_dir(path)
+            elif self._wanted(name):
+                if mask & (_IN_DELETE | _IN_MOVED_FROM):
+                    self._pending.pop(path, None)
+                    self._done.get(directory, {}).pop(name, None)
+                else:
+                    self._touch(path)
+
+
+def _move_done(path, root, done_dir):
+    """
+    Internal: move a finished original into done_dir, keeping its path
+    relative to the watched root and never overwriting an earlier file.
+    :return: new path
+    """
+    rel = os.path.relpath(path, root) if root else os.path.basename(path)
+    target = os.path.join(done_dir, rel)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    base, ext = os.path.splitext(target)
+    n = 1
+    while os.path.exists(target):
+        target = f"{base}_{n}{ext}"
+        n += 1
+    shutil.move(path, target)
+    return target
+
+
+def watch(dirs, output_dir, done_dir=None, settle=SETTLE_SECONDS, interval=POLL_INTERVAL,
+          recursive=True, use_inotify=None, watcher=None, **batch_kwargs):
+    """
+    Watermark files as they land, until the watcher is stopped (or the
+    generator is closed, e.g. on KeyboardInterrupt).
+
+    :param dirs: directory or list of directories to watch
+    :param output_dir: output directory (also holds the resume manifest); outputs
+                       keep their subdirectory below the watched directory they
+                       came from (see batch_processor.output_paths)
+    :param done_dir: move originals here once processed; None leaves them in
+                     place, marked as done by the manifest
+    :param watcher: an existing Watcher to consume (the other watch options are ignored)
+    :param batch_kwargs: watermark settings and workers / executor / max_pending,
+                         as for iter_batch_process
+    :return: generator of BatchResult
+    """
+    from batch_processor import iter_batch_process
+
+    if watcher is None:
+        watcher = Watcher(dirs, settle, interval, recursive,
+                          exclude=(output_dir, done_dir), use_inotify=use_inotify)
+    batch_kwargs["resume"] = True
+    try:
+        for result in iter_batch_process(watcher, output_dir, roots=watcher.roots, **batch_kwargs):
+            if done_dir and result.status in ("ok", "unchanged"):
+                try:
+                    _move_done(result.input, watcher.root_of(result.input), done_dir)
+                except OSError as e:
+                    print(f"[watcher] Cannot move {result.input} to {done_dir}: {e}")
+            yield result
+    finally:
+        watcher.close()
@@ -1,7 +1,511 @@
 # watermark.py
 
-from PIL import Image, ImageDraw, ImageFont
+from collections import OrderedDict
+from functools import lru_cache
+import io
 import os
+import shutil
+import threading
+from PIL import Image, ImageDraw, ImageFont, ImageMath
+from encoders import (
+    HIGH_BIT_MODES, can_passthrough, encode, output_format, require_encoder, writable
+)
+from fonts import get_font, load_font
+from logo_cache import logo_cache
+from metrics import no_stage
+
+# Rendered stamps kept per process; a batch reuses them across images
+STAMP_CACHE_SIZE = 64
+# Full-frame tiled overlays kept (bytes of RGBA pixels); pools share this
+# out between their worker processes (set_tiled_cache_bytes)
+TILED_CACHE_BYTES = 256 * 1024 * 1024
+
+# position='tiled' defaults: gap between copies (px), rotation (degrees, CCW)
+# and whether every other row is shifted by half a copy
+TILE_SPACING = 80
+TILE_ANGLE = 30
+TILE_STAGGER = True
+
+# Renditions: shrink by whole factors with reduce() first while the remaining
+# LANCZOS pass still has at least this factor to go (see Image.resize)
+RENDITION_REDUCING_GAP = 3.0
+
+try:
+    _lambda_eval = ImageMath.lambda_eval
+except AttributeError:  # Pillow < 10.3
+    _lambda_eval = None
+
+
+def _stamp_origin(position, w, h, sw, sh, margin):
+    """
+    Internal: top-left corner of a sw x sh box placed on a w x h image.
+    position may also be an explicit (x, y) top-left corner.
+    """
+    if isinstance(position, (tuple, list)):
+        return int(position[0]), int(position[1])
+    if position == 'center':
+        return (w - sw) // 2, (h - sh) // 2
+    if position == 'top_left':
+        return margin, margin
+    # bottom_right default
+    return w - sw - margin, h - sh - margin
+
+
+def _blend_wide(region, level, alpha):
+    """Internal: region * (1 - a) + level * a for 'I'/'F' images, a in 0-255."""
+    # 'I' division truncates, so add half the divisor to round
+    half = 127 if region.mode == 'I' else 0
+    if _lambda_eval is not None:
+        return _lambda_eval(
+            lambda v: (v['s'] * v['a'] + v['r'] * (255 - v['a']) + half) / 255,
+            s=level, r=region, a=alpha
+        )
+    return ImageMath.eval("(s * a + r * (255 - a) + half) / 255",
+                          s=level, r=region, a=alpha, half=half)
+
+
+def _composite_stamp(base, stamp, xy):
+    """
+    Internal: alpha-composite an RGBA stamp onto base in place, keeping
+    base's mode. Only the destination rectangle (clipped to the base
+    bounds) is converted and blended, so the extra memory scales with the
+    stamp rather than the image.
+    """
+    x, y = xy
+    sw, sh = stamp.size
+    left, top = max(x, 0), max(y, 0)
+    right, bottom = min(x + sw, base.width), min(y + sh, base.height)
+    if left >= right or top >= bottom:
+        return base
+    box = (left, top, right, bottom)
+    source = (left - x, top - y, right - x, bottom - y)
+    mode = base.mode
+
+    if mode == 'RGBA':
+        base.alpha_composite(stamp, dest=(left, top), source=source)
+        return base
+
+    if source != (0, 0, sw, sh):
+        stamp = stamp.crop(source)
+
+    if mode in HIGH_BIT_MODES:
+        # 16-bit / float: masked paste would blend byte-wise, so do the math
+        work = 'F' if mode == 'F' else 'I'
+        level = stamp.convert('L').convert(work)
+        if HIGH_BIT_MODES[mode] != 1:
+            level = level.point(lambda v: v * HIGH_BIT_MODES[mode])
+        alpha = stamp.getchannel('A').convert(work)
+        region = _blend_wide(base.crop(box).convert(work), level, alpha)
+        base.paste(region.convert(mode), box)
+    elif mode == 'CMYK':
+        # blend in CMYK so the black channel of untouched pixels survives
+        base.paste(stamp.convert('RGB').convert('CMYK'), box, stamp.getchannel('A'))
+    elif mode == '1':
+        ink = stamp.convert('L').point(lambda v: 255 if v >= 128 else 0, '1')
+        base.paste(ink, box, stamp.getchannel('A').point(lambda a: 255 if a >= 128 else 0))
+    elif mode == 'P':
+        region = base.crop(box).convert('RGBA')
+        region.alpha_composite(stamp)
+        # map back onto the image's own palette; pixels the stamp
+        # does not touch keep their original index
+        region = region.convert('RGB').quantize(palette=base, dither=Image.Dither.NONE)
+        base.paste(region, box, stamp.getchannel('A').point(lambda a: 255 if a else 0))
+    else:
+        region = base.crop(box).convert('RGBA')
+        region.alpha_composite(stamp)
+        if mode in ('RGB', 'L', 'LA'):
+            base.paste(region.convert(mode), box)
+        else:
+            # lossy round trip: only write back pixels the stamp covers
+            base.paste(region.convert(mode), box, stamp.getchannel('A').point(lambda a: 255 if a else 0))
+    return base
+
+
+def _pattern_tile(stamp, spacing, angle, stagger):
+    """
+    Internal: one period of the repeating pattern, rotated once.
+    Copies are laid out on a (w + spacing) x (h + spacing) grid; with
+    stagger, the tile is two rows tall and the second row is shifted by
+    half a copy (wrapping around the right edge).
+    """
+    rotated = stamp.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True) if angle % 360 else stamp
+    cw = rotated.width + max(spacing, 0)
+    ch = rotated.height + max(spacing, 0)
+    tile = Image.new('RGBA', (max(cw, 1), max(ch * (2 if stagger else 1), 1)), (0, 0, 0, 0))
+    tile.paste(rotated, (0, 0))
+    if stagger:
+        tile.paste(rotated, (cw // 2, ch))
+        tile.paste(rotated, (cw // 2 - cw, ch))
+    return tile
+
+
+def _expand_tile(tile, size):
+    """Internal: repeat a tile over size by doubling copies instead of redrawing."""
+    w, h = size
+    tw, th = tile.size
+    row = Image.new('RGBA', (w, th))
+    row.paste(tile, (0, 0))
+    filled = tw
+    while filled < w:
+        row.paste(row.crop((0, 0, filled, th)), (filled, 0))
+        filled *= 2
+    overlay = Image.new('RGBA', (w, h))
+    overlay.paste(row, (0, 0))
+    filled = th
+    while filled < h:
+        overlay.paste(overlay.crop((0, 0, w, filled)), (0, filled))
+        filled *= 2
+    return overlay
+
+
+class _TiledOverlays:
+    """
+    Internal: LRU of full-frame tiled overlays keyed by stamp and output
+    size, so a batch of identically sized images builds the overlay once.
+    Stamps come from _text_stamp / logo_cache, which hand out the same
+    object for the same settings; the entry keeps a reference to it and is
+    only reused for that exact object.
+    """
+
+    def __init__(self, max_bytes=TILED_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, stamp, size, spacing, angle, stagger):
+        key = (id(stamp), size, spacing, angle, stagger)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is stamp:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        overlay = _expand_tile(_pattern_tile(stamp, spacing, angle, stagger), size)
+        nbytes = size[0] * size[1] * 4
+        if nbytes > self.max_bytes:
+            return overlay
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (stamp, overlay, nbytes)
+            self._bytes += nbytes
+            self._evict()
+        return overlay
+
+    def resize(self, max_bytes):
+        with self._lock:
+            previous, self.max_bytes = self.max_bytes, max_bytes
+            self._evict()
+        return previous
+
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            _, (_, _, freed) = self._entries.popitem(last=False)
+            self._bytes -= freed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_tiled_overlays = _TiledOverlays()
+
+
+def set_tiled_cache_bytes(max_bytes):
+    """
+    Limit the tiled overlay cache of this process, evicting what no longer
+    fits. A pool worker is given its share of TILED_CACHE_BYTES, so the
+    cache does not grow with the number of cores.
+
+    :param max_bytes: cache limit in bytes (0 disables the cache)
+    :return: the previous limit
+    """
+    return _tiled_overlays.resize(max_bytes)
+
+
+def _place_tiled(base, stamp, spacing, angle, stagger, stage):
+    """Internal: composite the repeating pattern of stamp over the whole RGBA base."""
+    with stage("render"):
+        overlay = _tiled_overlays.get(stamp, base.size, spacing, angle, stagger)
+    with stage("composite"):
+        return _composite_stamp(base, overlay, (0, 0))
+
+
+@lru_cache(maxsize=STAMP_CACHE_SIZE)
+def _text_stamp(text, font_path, font_size, color, opacity, fallback=True, variation=None):
+    """
+    Internal: render text once into a tightly cropped RGBA stamp.
+    variation selects a variable font's instance (see fonts.get_font).
+    :return: (stamp, (dx, dy), (text_w, text_h)) where (dx, dy) is the ink
+             offset from the text origin used for placement
+    """
+    if fallback:
+        font = load_font(font_path, font_size, variation)
+    elif font_path:
+        font = get_font(font_path, font_size, variation)
+    else:
+        font = ImageFont.load_default()
+
+    # measure text size using textbbox (fix for Pillow without textsize)
+    bbox = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font)
+    text_w = bbox[2] - bbox[0]
+    text_h = bbox[3] - bbox[1]
+
+    stamp = Image.new('RGBA', (max(text_w, 0), max(text_h, 0)), (0, 0, 0, 0))
+    if text_w > 0 and text_h > 0:
+        draw = ImageDraw.Draw(stamp)
+        draw.text((-bbox[0], -bbox[1]), text, fill=color + (opacity,), font=font)
+    return stamp, (bbox[0], bbox[1]), (text_w, text_h)
+
+
+def _variation(value):
+    """Internal: hashable font variation (settings from JSON hold lists)."""
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _text_placement(size, text, position, font_path, font_size, color, opacity, margin, fallback,
+                    variation=None):
+    """Internal: (stamp, xy) for a text watermark on an image of size; xy is None for 'tiled'."""
+    stamp, (dx, dy), (text_w, text_h) = _text_stamp(
+        text, font_path, font_size, tuple(color), opacity, fallback, _variation(variation)
+    )
+    if position == 'tiled':
+        return stamp, None
+    x, y = _stamp_origin(position, size[0], size[1], text_w, text_h, margin)
+    return stamp, (x + dx, y + dy)
+
+
+def _apply_stamp(base, stamp, xy, spacing, angle, stagger, stage):
+    """Internal: composite stamp at xy, or repeated over the frame when xy is None."""
+    if xy is None:
+        return _place_tiled(base, stamp, spacing, angle, stagger, stage)
+    with stage("composite"):
+        return _composite_stamp(base, stamp, xy)
+
+
+def text_watermark_layout(
+    image_size: tuple,
+    text: str,
+    position: str = 'bottom_right',
+    font_path: str = None,
+    font_size: int = 36,
+    color: tuple = (255, 255, 255),
+    opacity: int = 128,
+    margin: int = 10,
+    font_variation=None
+) -> tuple:
+    """
+    Where apply_text_watermark_to_image puts the text for the same arguments.
+
+    :param image_size: (width, height) of the target image
+    :return: ((x, y) explicit position equivalent to `position`,
+              (left, upper, right, lower) box of changed pixels clipped to
+              the image, or None if nothing is visible)
+    """
+    w, h = image_size
+    stamp, (dx, dy), (text_w, text_h) = _text_stamp(
+        text, font_path, font_size, tuple(color), opacity, True, _variation(font_variation)
+    )
+    if position == 'tiled':
+        visible = stamp.width and stamp.height and w and h
+        return (0, 0), ((0, 0, w, h) if visible else None)
+    x, y = _stamp_origin(position, w, h, text_w, text_h, margin)
+    box = (max(x + dx, 0), max(y + dy, 0),
+           min(x + dx + stamp.width, w), min(y + dy + stamp.height, h))
+    if box[0] >= box[2] or box[1] >= box[3]:
+        box = None
+    return (x, y), box
+
+
+class _BufferReader(io.RawIOBase):
+    """Internal: read-only, seekable file over a buffer (memoryview, bytearray, mmap) that does not copy it."""
+
+    def __init__(self, buf):
+        self._view = memoryview(buf).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def _source(data):
+    """
+    Internal: file object for an input given as a path, bytes, a buffer or a file object.
+    :return: (path or file object, bytes-like input or None)
+    """
+    if isinstance(data, (str, os.PathLike)) or hasattr(data, "read"):
+        return data, None
+    if isinstance(data, bytes):
+        # BytesIO shares an immutable bytes buffer instead of copying it
+        return io.BytesIO(data), data
+    return _BufferReader(data), data
+
+
+def load_image(data) -> Image.Image:
+    """
+    Decode an image held in memory.
+
+    :param data: bytes, bytearray, memoryview or a binary file object (or a path)
+    :return: loaded PIL Image (no longer reads from data)
+    """
+    fp, _ = _source(data)
+    img = Image.open(fp)
+    img.load()
+    return img
+
+
+def _decode(img, source, metrics):
+    """Internal: fully decode an opened input, timing it if asked."""
+    if metrics is None:
+        # decoded lazily on first pixel access
+        return img
+    with metrics.stage("decode"):
+        img.load()
+    if isinstance(source, str):
+        metrics.add_bytes("decode", os.path.getsize(source))
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        metrics.add_bytes("decode", memoryview(source).nbytes)
+    return img
+
+
+def _covers(stamp, xy, size):
+    """Internal: whether compositing stamp at xy (None = tiled) changes any pixel."""
+    ink = stamp.getchannel('A').getbbox() if stamp.width and stamp.height else None
+    if ink is None or not (size[0] and size[1]):
+        return False
+    if xy is None:
+        return True
+    x, y = xy
+    return (x + ink[0] < size[0] and y + ink[1] < size[1]
+            and x + ink[2] > 0 and y + ink[3] > 0)
+
+
+def _passthrough(img, stamp, xy, image_path, output_path, encoder, metrics):
+    """
+    Internal: when the watermark would change no pixels (zero opacity, empty
+    text, off-image) and the output format matches the input, copy the
+    source bytes instead of decoding and re-encoding.
+    :return: True if the output was written
+    """
+    if not (isinstance(image_path, str) and isinstance(output_path, str)):
+        return False
+    if _covers(stamp, xy, img.size):
+        return False
+    if not can_passthrough(img.format, output_format(output_path, encoder), encoder):
+        return False
+    stage = metrics.stage if metrics else no_stage
+    with stage("write"):
+        shutil.copyfile(image_path, output_path)
+    if metrics:
+        metrics.add_bytes("write", os.path.getsize(output_path))
+    return True
+
+
+def _save(img, output_path, metrics, encoder=None, fmt=None):
+    """
+    Internal: convert only if the output format cannot store the image's
+    mode, then encode with the encoder profile and write, timing each step
+    separately if asked.
+    :param fmt: output format (default: from the profile or the path's extension)
+    """
+    stage = metrics.stage if metrics else no_stage
+    fmt = fmt or output_format(output_path, encoder)
+    with stage("convert"):
+        img = writable(img, fmt)
+    if metrics is None:
+        encode(img, output_path, fmt, encoder)
+        return
+    if not isinstance(output_path, str):
+        # file object: encoding and writing are one step; the caller counts bytes
+        with metrics.stage("encode"):
+            encode(img, output_path, fmt, encoder)
+        return
+    with metrics.stage("encode"):
+        buf = io.BytesIO()
+        encode(img, buf, fmt, encoder)
+        data = buf.getbuffer()
+    metrics.add_bytes("encode", data.nbytes)
+    with metrics.stage("write"):
+        with open(output_path, 'wb') as f:
+            f.write(data)
+    metrics.add_bytes("write", data.nbytes)
+
+
+def _logo_placement(size, logo_path, position, opacity, scale, margin):
+    """Internal: (stamp, xy) for a logo watermark on an image of size; xy is None for 'tiled'."""
+    w, h = size
+    # scaled, faded logo is shared by every image with the same target width
+    logo = logo_cache.get(logo_path, max(int(w * scale), 1), opacity)
+    if position == 'tiled':
+        return logo, None
+    return logo, _stamp_origin(position, w, h, logo.width, logo.height, margin)
+
+
+def _watermark(source, output, placement, spacing, angle, stagger, encoder, metrics):
+    """
+    Internal: shared core of add_*_watermark and *_watermark_bytes. Reads the
+    header, places the stamp, copies the input through when no pixel would
+    change, otherwise decodes, composites the stamp's rectangle and encodes.
+
+    :param source: input path, bytes-like object or binary file object
+    :param output: output path or file object, or None to return the encoded bytes
+    :param placement: fn(image size) -> (stamp, xy); xy None means tiled
+    :return: encoded bytes when output is None
+    """
+    stage = metrics.stage if metrics else no_stage
+    fp, raw = _source(source)
+
+    # open the input (header only); it keeps its own mode throughout
+    with Image.open(fp) as base:
+        with stage("render"):
+            stamp, xy = placement(base.size)
+
+        fmt = None
+        if output is None:
+            # in memory: the profile's format, else the input's
+            fmt = output_format(None, encoder) or base.format
+            if (raw is not None and not _covers(stamp, xy, base.size)
+                    and can_passthrough(base.format, fmt, encoder)):
+                return raw if isinstance(raw, bytes) else bytes(raw)
+            # an input format Pillow only reads: fail before decoding it
+            require_encoder(fmt)
+        elif _passthrough(base, stamp, xy, source, output, encoder, metrics):
+            return None
+        _decode(base, source, metrics)
+
+        # composite the cached stamp onto its destination rectangle only
+        merged = _apply_stamp(base, stamp, xy, spacing, angle, stagger, stage)
+        if output is not None:
+            _save(merged, output, metrics, encoder)
+            return None
+        buf = io.BytesIO()
+        _save(merged, buf, metrics, encoder, fmt)
+        if metrics:
+            metrics.add_bytes("encode", buf.tell())
+        return buf.getvalue()
 
 
 def add_text_watermark(
@@ -13,78 +517,78 @@ def add_text_watermark(
     font_size: int = 36,
     color: tuple = (255, 255, 255),
     opacity: int = 128,
-    margin: int = 10
+    margin: int = 10,
+    spacing: int = TILE_SPACING,
+    angle: float = TILE_ANGLE,
+    stagger: bool = TILE_STAGGER,
+    encoder=None,
+    metrics=None,
+    font_variation=None
 ) -> None:
     """
     Add a text watermark to an image.
 
-    :param image_path:    path to input image
+    :param image_path:    path to input image (or a binary file object)
     :param text:          watermark text
     :param output_path:   where to save watermarked image
-    :param position:      'bottom_right', 'center', 'top_left'
+    :param position:      'bottom_right', 'center', 'top_left' or 'tiled'
     :param font_path:     path to .ttf font file or None for default
     :param font_size:     font size in points
     :param color:         text color as RGB tuple
     :param opacity:       0-255 watermark opacity
     :param margin:        space from the edges in pixels
+    :param spacing:       'tiled' only: gap between repeated copies in pixels
+    :param angle:         'tiled' only: rotation in degrees, counter-clockwise
+    :param stagger:       'tiled' only: shift every other row by half a copy
+    :param encoder:       encoders profile name or dict; its format overrides the extension
+    :param metrics:       optional metrics.StageRecorder for per-stage timings
+    :param font_variation: variable font instance: a named instance (e.g. 'Bold') or
+                           axis values, as returned by fonts.find_font
     """
-    # open original image
-    base = Image.open(image_path).convert('RGBA')
-    w, h = base.size
+    def placement(size):
+        return _text_placement(
+            size, text, position, font_path, font_size, color, opacity, margin, fallback=False,
+            variation=font_variation
+        )
 
-    # create transparent layer for text
-    txt_layer = Image.new('RGBA', (w, h), (255, 255, 255, 0))
-    draw = ImageDraw.Draw(txt_layer)
+    _watermark(image_path, output_path, placement, spacing, angle, stagger, encoder, metrics)
 
-    # load font
-    if font_path:
-        font = ImageFont.truetype(font_path, font_size)
-    else:
-        font = ImageFont.load_default()
-
-    # measure text size using textbbox (fix for Pillow without textsize)
-    bbox = draw.textbbox((0, 0), text, font=font)
-    text_w = bbox[2] - bbox[0]
-    text_h = bbox[3] - bbox[1]
 
-    # calculate coordinates
-    if position == 'bottom_right':
-        x = w - text_w - margin
-        y = h - text_h - margin
-    elif position == 'center':
-        x = (w - text_w) // 2
-        y = (h - text_h) // 2
-    elif position == 'top_left':
-        x = margin
-        y = margin
-    else:
-        x = w - text_w - margin
-        y = h - text_h - margin
-
-    # draw text with opacity
-    draw.text((x, y), text, fill=color + (opacity,), font=font)
-
-    # merge layers and save
-    merged = Image.alpha_composite(base, txt_layer)
-    if merged.mode != 'RGB':
-        merged = merged.convert('RGB')
-    merged.save(output_path)
+def text_watermark_bytes(
+    data,
+    text: str,
+    position: str = 'bottom_right',
+    font_path: str = None,
+    font_size: int = 36,
+    color: tuple = (255, 255, 255),
+    opacity: int = 128,
+    margin: int = 10,
+    spacing: int = TILE_SPACING,
+    angle: float = TILE_ANGLE,
+    stagger: bool = TILE_STAGGER,
+    encoder=None,
+    metrics=None,
+    font_variation=None
+) -> bytes:
+    """
+    In-memory add_text_watermark: encoded image in, encoded image out, no
+    temporary files.
 
+    :param data: bytes, bytearray, memoryview or a binary file object
+    :param encoder: encoders profile name or dict; without a format override
+                    the output keeps the input's format
+    :return: encoded bytes (the input itself when the watermark changes no
+             pixels and the format is kept)
 
+    Other parameters as for add_text_watermark.
+    """
+    def placement(size):
+        return _text_placement(
+            size, text, position, font_path, font_size, color, opacity, margin, fallback=False,
+            variation=font_variation
+        )
 
-def _load_font(font_path, size):
-    # Try custom font, else try common system fonts, else fallback default
-    if font_path and os.path.isfile(font_path):
-        try:
-            return ImageFont.truetype(font_path, size)
-        except OSError:
-            pass
-    for sysf in ("arial.ttf", "Calibri.ttf"):
-        try:
-            return ImageFont.truetype(sysf, size)
-        except Exception:
-            continue
-    return ImageFont.load_default()
+    return _watermark(data, None, placement, spacing, angle, stagger, encoder, metrics)
 
 
 def apply_text_watermark_to_image(
@@ -95,37 +599,29 @@ def apply_text_watermark_to_image(
     font_size: int = 36,
     color: tuple = (255, 255, 255),
     opacity: int = 128,
-    margin: int = 10
+    margin: int = 10,
+    spacing: int = TILE_SPACING,
+    angle: float = TILE_ANGLE,
+    stagger: bool = TILE_STAGGER,
+    copy: bool = True,
+    metrics=None,
+    font_variation=None
 ) -> Image.Image:
     """
     Apply a text watermark directly on a PIL Image and return new Image.
+    position may also be an explicit (x, y) top-left corner, or 'tiled'
+    (see add_text_watermark for spacing/angle/stagger).
+    With copy=False base_img itself may be modified (e.g. from load_image).
     """
-    base = base_img.convert('RGBA')
-    w, h = base.size
-
-    # create transparent layer
-    txt_layer = Image.new('RGBA', (w, h), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(txt_layer)
-    font = _load_font(font_path, font_size)
-
-    # measure text
-    bbox = draw.textbbox((0, 0), text, font=font)
-    tw, th = bbox[2] - bbox[0], bbox[3] - bbox[1]
-
-    # compute coords
-    if position == 'center':
-        x, y = (w - tw)//2, (h - th)//2
-    elif position == 'top_left':
-        x, y = margin, margin
-    else:  # bottom_right default
-        x, y = w - tw - margin, h - th - margin
-
-    # draw text
-    draw.text((x, y), text, fill=color + (opacity,), font=font)
-
-    # merge and return
-    merged = Image.alpha_composite(base, txt_layer)
-    return merged.convert(base_img.mode)
+    stage = metrics.stage if metrics else no_stage
+    with stage("render"):
+        stamp, xy = _text_placement(
+            base_img.size, text, position, font_path, font_size, color, opacity, margin,
+            fallback=True, variation=font_variation
+        )
+    with stage("convert"):
+        base = base_img.copy() if copy else base_img
+    return _apply_stamp(base, stamp, xy, spacing, angle, stagger, stage)
 
 
 def add_logo_watermark(
@@ -135,59 +631,198 @@ def add_logo_watermark(
     position: str = 'bottom_right',
     opacity: int = 128,
     scale: float = 0.1,
-    margin: int = 10
+    margin: int = 10,
+    spacing: int = TILE_SPACING,
+    angle: float = TILE_ANGLE,
+    stagger: bool = TILE_STAGGER,
+    encoder=None,
+    metrics=None
 ) -> None:
     """
     Add a logo watermark to an image.
 
-    :param image_path:  path to input image
+    :param image_path:  path to input image (or a binary file object)
     :param logo_path:   path to watermark logo (PNG with alpha)
     :param output_path: where to save watermarked image
-    :param position:    'bottom_right', 'center', 'top_left'
+    :param position:    'bottom_right', 'center', 'top_left' or 'tiled'
     :param opacity:     0-255 watermark opacity
     :param scale:       logo width relative to image width (0 < scale ≤ 1)
     :param margin:      space from edges in pixels
+    :param spacing:     'tiled' only: gap between repeated copies in pixels
+    :param angle:       'tiled' only: rotation in degrees, counter-clockwise
+    :param stagger:     'tiled' only: shift every other row by half a copy
+    :param encoder:     encoders profile name or dict; its format overrides the extension
+    :param metrics:     optional metrics.StageRecorder for per-stage timings
     """
-    # open base image
-    base = Image.open(image_path).convert('RGBA')
-    w, h = base.size
-
-    # open and scale logo
-    logo = Image.open(logo_path).convert('RGBA')
-    max_w = int(w * scale)
-    ratio = logo.height / logo.width
-    llogo = logo.resize(
-    (max_w, int(max_w * ratio)),
-    resample=Image.Resampling.LANCZOS
-)
+    def placement(size):
+        return _logo_placement(size, logo_path, position, opacity, scale, margin)
 
-    # apply opacity
-    if opacity < 255:
-        alpha = logo.split()[3].point(lambda p: p * (opacity / 255))
-        logo.putalpha(alpha)
-
-    lw, lh = logo.size
-
-    # calculate coordinates
-    if position == 'bottom_right':
-        x = w - lw - margin
-        y = h - lh - margin
-    elif position == 'center':
-        x = (w - lw) // 2
-        y = (h - lh) // 2
-    elif position == 'top_left':
-        x = margin
-        y = margin
-    else:
-        x = w - lw - margin
-        y = h - lh - margin
-
-    # merge logo onto transparent layer
-    layer = Image.new('RGBA', (w, h), (255, 255, 255, 0))
-    layer.paste(logo, (x, y), logo)
-
-    # composite and save
-    merged = Image.alpha_composite(base, layer)
-    if merged.mode != 'RGB':
-        merged = merged.convert('RGB')
-    merged.save(output_path)
+    _watermark(image_path, output_path, placement, spacing, angle, stagger, encoder, metrics)
+
+
+def logo_watermark_bytes(
+    data,
+    logo_path: str,
+    position: str = 'bottom_right',
+    opacity: int = 128,
+    scale: float = 0.1,
+    margin: int = 10,
+    spacing: int = TILE_SPACING,
+    angle: float = TILE_ANGLE,
+    stagger: bool = TILE_STAGGER,
+    encoder=None,
+    metrics=None
+) -> bytes:
+    """
+    In-memory add_logo_watermark: encoded image in, encoded image out, no
+    temporary files.
+
+    :param data: bytes, bytearray, memoryview or a binary file object
+    :param encoder: encoders profile name or dict; without a format override
+                    the output keeps the input's format
+    :return: encoded bytes (the input itself when the watermark changes no
+             pixels and the format is kept)
+
+    Other parameters as for add_logo_watermark.
+    """
+    def placement(size):
+        return _logo_placement(size, logo_path, position, opacity, scale, margin)
+
+    return _watermark(data, None, placement, spacing, angle, stagger, encoder, metrics)
+
+
+def apply_logo_watermark_to_image(
+    base_img: Image.Image,
+    logo_path: str,
+    position: str = 'bottom_right',
+    opacity: int = 128,
+    scale: float = 0.1,
+    margin: int = 10,
+    spacing: int = TILE_SPACING,
+    angle: float = TILE_ANGLE,
+    stagger: bool = TILE_STAGGER,
+    copy: bool = True,
+    metrics=None
+) -> Image.Image:
+    """
+    Apply a logo watermark directly on a PIL Image and return new Image.
+    position may also be an explicit (x, y) top-left corner, or 'tiled'
+    (see add_logo_watermark for scale/spacing/angle/stagger).
+    With copy=False base_img itself may be modified (e.g. from load_image).
+    """
+    stage = metrics.stage if metrics else no_stage
+    with stage("render"):
+        stamp, xy = _logo_placement(base_img.size, logo_path, position, opacity, scale, margin)
+    with stage("convert"):
+        base = base_img.copy() if copy else base_img
+    return _apply_stamp(base, stamp, xy, spacing, angle, stagger, stage)
+
+
+def rendition_sizes(size, renditions):
+    """
+    Output sizes of renditions of an image, largest first. Renditions are
+    never upscaled.
+
+    :param size: (width, height) of the source image
+    :param renditions: dict label -> longest edge in pixels, or None for full size
+    :return: list of (label, (width, height))
+    """
+    if not renditions:
+        raise ValueError("No renditions given")
+    w, h = size
+    sizes = []
+    for label, edge in renditions.items():
+        if not label or os.sep in label or (os.altsep and os.altsep in label):
+            raise ValueError(f"Invalid rendition label: {label!r}")
+        if edge is None or edge >= max(w, h):
+            sizes.append((label, (w, h)))
+        elif edge < 1:
+            raise ValueError(f"Rendition {label!r}: edge must be positive, got {edge!r}")
+        elif w >= h:
+            sizes.append((label, (edge, max(1, round(h * edge / w)))))
+        else:
+            sizes.append((label, (max(1, round(w * edge / h)), edge)))
+    # stable: equal sizes keep their given order
+    sizes.sort(key=lambda item: item[1][0] * item[1][1], reverse=True)
+    return sizes
+
+
+def add_watermark_renditions(
+    image_path: str,
+    output_paths: dict,
+    renditions: dict,
+    text: str = None,
+    logo_path: str = None,
+    position: str = 'bottom_right',
+    font_path: str = None,
+    font_size: int = 36,
+    color: tuple = (255, 255, 255),
+    opacity: int = 128,
+    scale: float = 0.1,
+    margin: int = 10,
+    spacing: int = TILE_SPACING,
+    angle: float = TILE_ANGLE,
+    stagger: bool = TILE_STAGGER,
+    encoder=None,
+    metrics=None,
+    font_variation=None
+) -> None:
+    """
+    Write several watermarked sizes of one image from a single decode.
+    Each rendition is downscaled from the previous (larger) clean one, then
+    watermarked at its own size: font_size, margin, spacing and an explicit
+    (x, y) position are given for the full-size image and scaled with the
+    rendition; a logo's scale is already relative to the image width.
+
+    :param image_path:   path to input image (or a binary file object)
+    :param output_paths: dict label -> output path, one per rendition
+    :param renditions:   dict label -> longest edge in pixels, or None for full size
+    :param text:         watermark text (text watermark)
+    :param logo_path:    path to watermark logo (logo watermark, when text is None)
+
+    Other parameters as for add_text_watermark / add_logo_watermark.
+    """
+    stage = metrics.stage if metrics else no_stage
+
+    with Image.open(image_path) as base:
+        full_w = base.width
+        sizes = rendition_sizes(base.size, renditions)
+        if sizes[0][1] != base.size and base.format == 'JPEG':
+            # no full-size rendition: let libjpeg decode at 1/2, 1/4 or 1/8 scale
+            base.draft(base.mode, sizes[0][1])
+        _decode(base, image_path, metrics)
+
+        # downscale chain on clean pixels; each step reduces from the previous one
+        chain = []
+        img = base
+        with stage("resize"):
+            for label, size in sizes:
+                if img.size != size:
+                    img = img.resize(size, Image.Resampling.LANCZOS,
+                                     reducing_gap=RENDITION_REDUCING_GAP)
+                elif chain:
+                    # same size as the previous rendition: it gets its own pixels
+                    img = img.copy()
+                chain.append((label, img))
+
+        chain.reverse()
+        while chain:
+            # largest first; each rendition is released once written
+            label, img = chain.pop()
+            f = img.width / full_w
+            pos = position
+            if isinstance(position, (tuple, list)):
+                pos = (round(position[0] * f), round(position[1] * f))
+            with stage("render"):
+                if text is not None:
+                    stamp, xy = _text_placement(
+                        img.size, text, pos, font_path, max(1, round(font_size * f)), color,
+                        opacity, round(margin * f), fallback=False, variation=font_variation
+                    )
+                else:
+                    stamp, xy = _logo_placement(
+                        img.size, logo_path, pos, opacity, scale, round(margin * f)
+                    )
+            # the chain is complete, so each clean rendition can be drawn on in place
+            merged = _apply_stamp(img, stamp, xy, max(1, round(spacing * f)), angle, stagger, stage)
+            _save(merged, output_paths[label], metrics, encoder)
@@ -0,0 +1,517 @@
+# watermark_app.py
+"""
+Headless command-line entry point.
+
+    python -m watermark_app batch photos/ -o out/ --text "© Studio" --encoder web
+    python -m watermark_app batch a.jpg b.png -o out/ --preset client --workers 0 --resume
+    python -m watermark_app presets list
+    python -m watermark_app presets save client --logo assets/logos/studio.png --position tiled
+    python -m watermark_app profiles
+    python -m watermark_app fonts
+    python -m watermark_app watch drop/ -o out/ --preset client --done-dir done/
+    python -m watermark_app serve --port 8765 --workers 4
+    python -m watermark_app shard create /shared/job photos/ -o /shared/out --preset client
+    python -m watermark_app shard work /shared/job
+
+Only argparse and the modules a command needs are imported (never tkinter
+or the GUI modules), so the CLI starts quickly on display-less render nodes.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Preset / CLI keys that map onto batch_process keyword arguments
+BATCH_SETTINGS = (
+    "watermark_type", "watermark_content", "logo_path", "position", "opacity",
+    "font_path", "font_size", "color", "scale", "spacing", "angle", "stagger", "encoder",
+    "renditions", "font_variation",
+)
+POSITIONS = ("bottom_right", "center", "top_left", "tiled")
+
+
+def _color(value):
+    """Internal: argparse type for 'R,G,B' or '#rrggbb'."""
+    try:
+        if value.startswith("#") and len(value) == 7:
+            return tuple(int(value[i:i + 2], 16) for i in (1, 3, 5))
+        rgb = tuple(int(v) for v in value.split(","))
+    except ValueError:
+        rgb = ()
+    if len(rgb) != 3 or not all(0 <= v <= 255 for v in rgb):
+        raise argparse.ArgumentTypeError(f"expected R,G,B or #rrggbb, got {value!r}")
+    return rgb
+
+
+def _font(value):
+    """
+    Internal: argparse type for a font file, or a bundled family as
+    'Family[:weight]' (e.g. 'Oswald:600'). :return: (path, variation)
+    """
+    if os.path.isfile(value):
+        return value, None
+    from fonts import find_font
+    family, _, weight = value.rpartition(":")
+    if not (family and weight.isdigit()):
+        family, weight = value, "400"
+    path, variation = find_font(family, int(weight))
+    if path is None:
+        raise argparse.ArgumentTypeError(
+            f"no font file or bundled family {value!r} (see 'fonts')"
+        )
+    return path, variation
+
+
+def _renditions(value):
+    """Internal: argparse type for 'default' or 'label=EDGE,...' ('label' alone = full size)."""
+    if value == "default":
+        from config import DEFAULT_RENDITIONS
+        return dict(DEFAULT_RENDITIONS)
+    renditions = {}
+    for item in value.split(","):
+        label, _, edge = item.strip().partition("=")
+        try:
+            renditions[label] = int(edge) if edge else None
+        except ValueError:
+            label = ""
+        if not label or (edge and renditions[label] < 1):
+            raise argparse.ArgumentTypeError(
+                f"expected 'default' or label=EDGE[,label=EDGE...], got {value!r}"
+            )
+    return renditions
+
+
+def _memory_size(value):
+    """Internal: argparse type for a byte size like '512M' / '4G', or 'auto' (75% of available)."""
+    if value == "auto":
+        from batch_processor import available_memory
+        available = available_memory()
+        if available is None:
+            raise argparse.ArgumentTypeError("available memory is unknown on this system")
+        return available * 3 // 4
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    number, unit = value, 1
+    if value[-1:].upper() in units:
+        number, unit = value[:-1], units[value[-1].upper()]
+    try:
+        size = int(float(number) * unit)
+    except ValueError:
+        size = 0
+    if size < 1:
+        raise argparse.ArgumentTypeError(f"expected a size like 512M, 4G or 'auto', got {value!r}")
+    return size
+
+
+def _settings_parser():
+    """Internal: watermark/encoder options shared by 'batch' and 'presets save'."""
+    parser = argparse.ArgumentParser(add_help=False)
+    wm = parser.add_argument_group("watermark")
+    kind = wm.add_mutually_exclusive_group()
+    kind.add_argument("--text", help="text watermark")
+    kind.add_argument("--logo", help="logo image for a logo watermark")
+    wm.add_argument("--position", choices=POSITIONS)
+    wm.add_argument("--opacity", type=int, help="0-255")
+    wm.add_argument("--font", type=_font,
+                    help="path to a .ttf/.otf font, or a bundled family as Family[:weight]")
+    wm.add_argument("--font-size", type=int)
+    wm.add_argument("--color", type=_color, help="R,G,B or #rrggbb")
+    wm.add_argument("--scale", type=float, help="logo width relative to image width")
+    wm.add_argument("--spacing", type=int, help="gap between copies (tiled)")
+    wm.add_argument("--angle", type=float, help="rotation in degrees (tiled)")
+    wm.add_argument("--stagger", action=argparse.BooleanOptionalAction, default=None,
+                    help="offset every other row (tiled)")
+    out = parser.add_argument_group("output sizes")
+    out.add_argument("--renditions", type=_renditions,
+                     help="write several sizes from one decode: 'default' (thumb=320,"
+                          "medium=1280,full) or label=EDGE,... (longest edge; bare label = full)")
+    enc = parser.add_argument_group("output encoding")
+    enc.add_argument("--encoder", help="encoder profile name (see 'profiles')")
+    enc.add_argument("--format", help="output format override, e.g. JPEG, WEBP, AVIF")
+    enc.add_argument("--quality", type=int, help="JPEG/WebP/AVIF quality")
+    return parser
+
+
+def _settings(args, base=None):
+    """
+    Internal: batch_process keyword arguments from a preset (base) overlaid
+    with the options given on the command line.
+    """
+    settings = {k: v for k, v in (base or {}).items() if k in BATCH_SETTINGS}
+    if isinstance(settings.get("color"), list):
+        settings["color"] = tuple(settings["color"])
+    if args.text is not None:
+        settings.update(watermark_type="text", watermark_content=args.text)
+    if args.logo is not None:
+        settings.update(watermark_type="logo", logo_path=args.logo)
+    settings.update({
+        k: v for k, v in (
+            ("position", args.position), ("opacity", args.opacity),
+            ("font_size", args.font_size), ("color", args.color), ("scale", args.scale),
+            ("spacing", args.spacing), ("angle", args.angle), ("stagger", args.stagger),
+            ("renditions", args.renditions),
+        ) if v is not None
+    })
+    if args.font is not None:
+        settings["font_path"], variation = args.font
+        settings.pop("font_variation", None)
+        if variation is not None:
+            settings["font_variation"] = variation
+
+    if args.encoder is not None:
+        settings["encoder"] = args.encoder
+    overrides = {k: v for k, v in (("format", args.format), ("quality", args.quality)) if v is not None}
+    if overrides:
+        encoder = settings.get("encoder")
+        if isinstance(encoder, dict):
+            settings["encoder"] = {**encoder, **overrides}
+        else:
+            settings["encoder"] = {"profile": encoder, **overrides}
+    return settings
+
+
+def _inputs(paths, recursive):
+    """Internal: lazily expand files and directories into image paths."""
+    from batch_processor import scan_images
+
+    for path in paths:
+        if os.path.isdir(path):
+            yield from scan_images(path, recursive=recursive)
+        else:
+            yield path
+
+
+def _roots(paths):
+    """Internal: the directories among the inputs; their outputs keep the subfolders."""
+    return [path for path in paths if os.path.isdir(path)]
+
+
+def _load_preset(name):
+    """Internal: preset dict, or None after printing an error."""
+    from presets import load_preset
+
+    preset = load_preset(name)
+    if preset is None:
+        print(f"Unknown preset: {name!r}", file=sys.stderr)
+    return preset
+
+
+def _batch_settings(args):
+    """Internal: settings for batch/watch from --preset and options, or None after an error."""
+    base = None
+    if args.preset:
+        base = _load_preset(args.preset)
+        if base is None:
+            return None
+    settings = _settings(args, base)
+    if not settings.get("watermark_content") and not settings.get("logo_path"):
+        print("Nothing to apply: give --text, --logo or a --preset that sets one", file=sys.stderr)
+        return None
+    return settings
+
+
+def cmd_batch(args):
+    from batch_processor import iter_batch_process
+
+    settings = _batch_settings(args)
+    if settings is None:
+        return 2
+
+    metrics = None
+    if args.metrics:
+        from metrics import BatchMetrics
+        metrics = BatchMetrics()
+
+    counts = {"ok": 0, "unchanged": 0, "skipped": 0, "error": 0}
+    started = time.perf_counter()
+    results = iter_batch_process(
+        _inputs(args.inputs, args.recursive), args.output, **settings,
+        workers=args.workers, executor=args.executor,
+        instrument=metrics is not None, resume=args.resume,
+        memory_budget=args.memory_budget, largest_first=args.memory_budget is not None,
+        roots=_roots(args.inputs)
+    )
+    for result in results:
+        counts[result.status] += 1
+        if metrics is not None:
+            metrics.observe(result.timings, result.bytes, result.status,
+                            (result.memory_estimate, result.memory_peak))
+        if result.status == "error":
+            print(f"error: {result.input}: {result.error}", file=sys.stderr)
+        elif args.verbose:
+            outputs = ", ".join(result.renditions.values()) if result.renditions else result.output
+            memory = ""
+            if result.memory_estimate is not None:
+                peak = "-" if result.memory_peak is None else f"{result.memory_peak / 2**20:.0f}"
+                memory = f" [est {result.memory_estimate / 2**20:.0f} MB, peak {peak} MB]"
+            print(f"{result.status:<9} {result.input} -> {outputs or '-'}{memory}")
+
+    elapsed = time.perf_counter() - started
+    if not args.quiet:
+        total = sum(counts.values())
+        print(f"{total} images in {elapsed:.1f}s: {counts['ok']} written, "
+              f"{counts['unchanged']} unchanged, {counts['skipped']} skipped, "
+              f"{counts['error']} failed")
+    if metrics is not None:
+        with open(args.metrics, "w") as f:
+            f.write(metrics.to_prometheus() if args.metrics.endswith(".prom") else metrics.to_json(indent=2))
+    return 1 if counts["error"] else 0
+
+
+def cmd_watch(args):
+    import signal
+    from watcher import Watcher, watch
+
+    settings = _batch_settings(args)
+    if settings is None:
+        return 2
+    watcher = Watcher(
+        args.dirs, args.settle, args.interval, args.recursive,
+        exclude=(args.output, args.done_dir), use_inotify=False if args.poll else None
+    )
+    # stop cleanly on SIGTERM (service managers) as well as Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: watcher.stop())
+    if not args.quiet:
+        print(f"Watching {', '.join(watcher.roots)} ({watcher.mode}); Ctrl-C to stop", flush=True)
+
+    counts = {"ok": 0, "unchanged": 0, "skipped": 0, "error": 0}
+    try:
+        for result in watch(args.dirs, args.output, args.done_dir, watcher=watcher, **settings,
+                            workers=args.workers, executor=args.executor,
+                            memory_budget=args.memory_budget):
+            counts[result.status] += 1
+            if result.status == "error":
+                print(f"error: {result.input}: {result.error}", file=sys.stderr, flush=True)
+            elif not args.quiet and (args.verbose or result.status == "ok"):
+                print(f"{result.status:<9} {result.input} -> {result.output or '-'}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    if not args.quiet:
+        print(f"Stopped: {counts['ok']} written, {counts['unchanged']} unchanged, "
+              f"{counts['error']} failed")
+    return 0
+
+
+def cmd_presets(args):
+    import json
+    import presets
+
+    if args.action == "list":
+        for name in presets.list_presets():
+            print(name)
+    elif args.action == "show":
+        preset = _load_preset(args.name)
+        if preset is None:
+            return 2
+        print(json.dumps(preset, indent=2, ensure_ascii=False))
+    elif args.action == "save":
+        base = presets.load_preset(args.name) if args.update else None
+        presets.save_preset(args.name, _settings(args, base))
+    elif args.action == "delete":
+        presets.delete_preset(args.name)
+    return 0
+
+
+def cmd_profiles(args):
+    import json
+    from encoders import ENCODER_PROFILES
+
+    for name, profile in ENCODER_PROFILES.items():
+        print(f"{name:<10} {json.dumps(profile)}")
+    return 0
+
+
+def cmd_fonts(args):
+    from fonts import list_families
+
+    for family in list_families():
+        print(family)
+    return 0
+
+
+def cmd_serve(args):
+    from service import ASSET_DIRS, serve
+
+    serve(args.host, args.port, args.workers, args.max_pending, args.executor,
+          asset_dirs=args.asset_dir or ASSET_DIRS)
+    return 0
+
+
+def cmd_shard(args):
+    import json
+    import sharding
+
+    if args.action == "create":
+        settings = _batch_settings(args)
+        if settings is None:
+            return 2
+        try:
+            items = sharding.create_job(
+                args.job, _inputs(args.inputs, args.recursive), args.output, args.chunk_size,
+                args.lease, args.max_attempts, _roots(args.inputs), **settings
+            )
+        except ValueError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 2
+        print(f"{items} work items in {args.job}")
+        return 0
+    if args.action == "status":
+        print(json.dumps(sharding.status(args.job), indent=2))
+        return 0
+    if args.action == "summary":
+        summary = sharding.summarize(args.job)
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+        return 1 if summary["errors"] or summary["abandoned"] or summary["collisions"] else 0
+
+    batch_kwargs = {"workers": args.workers, "executor": args.executor}
+    try:
+        if args.action == "run":
+            summary = sharding.run_local(args.job, args.nodes, **batch_kwargs)
+        else:
+            import signal
+            import threading
+
+            # stop claiming on SIGTERM and finish the items in flight
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            counts = sharding.work(args.job, args.node_id, stop, not args.no_wait, **batch_kwargs)
+    except KeyboardInterrupt:
+        # the interrupted item went back to todo/ (or will once its lease expires)
+        print("Interrupted", file=sys.stderr)
+        return 130
+    if args.action == "work":
+        if not args.quiet:
+            print(f"{args.node_id or sharding.default_node_id()}: {counts['ok']} written, "
+                  f"{counts['skipped']} skipped, {counts['error']} failed")
+        if stop.is_set() or args.no_wait:
+            return 1 if counts["error"] else 0
+        summary = sharding.summarize(args.job)
+    if not args.quiet:
+        images = summary["images"]
+        print(f"{summary['done']}/{summary['items']} items done: {images['ok']} written, "
+              f"{images['skipped']} skipped, {images['error']} failed, "
+              f"{len(summary['abandoned'])} abandoned")
+        for collision in summary["collisions"]:
+            print(f"collision: {collision['output']} written for "
+                  f"{', '.join(collision['inputs'])}", file=sys.stderr)
+    return 1 if summary["errors"] or summary["abandoned"] or summary["collisions"] else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="watermark_app", description="Watermark images without the GUI."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    common = _settings_parser()
+
+    batch = sub.add_parser("batch", parents=[common], help="watermark files and directories")
+    batch.add_argument("inputs", nargs="+", help="image files and/or directories")
+    batch.add_argument("-o", "--output", required=True, help="output directory")
+    batch.add_argument("--preset", help="start from a saved preset; options override it")
+    batch.add_argument("--recursive", action=argparse.BooleanOptionalAction, default=True,
+                       help="descend into subdirectories of directory inputs")
+    batch.add_argument("--workers", type=int, help="parallel workers (0 = all cores)")
+    batch.add_argument("--executor", choices=("process", "thread"), default="process")
+    batch.add_argument("--resume", action="store_true",
+                       help="skip inputs whose output is up to date")
+    batch.add_argument("--memory-budget", type=_memory_size,
+                       help="memory parallel jobs may use together, e.g. 2G or auto "
+                            "(starts the largest images first)")
+    batch.add_argument("--metrics", help="write per-stage metrics (.json, or .prom for Prometheus)")
+    batch.add_argument("-v", "--verbose", action="store_true", help="print every result")
+    batch.add_argument("-q", "--quiet", action="store_true", help="print errors only")
+    batch.set_defaults(func=cmd_batch)
+
+    watch = sub.add_parser("watch", parents=[common], help="watermark files as they land in directories")
+    watch.add_argument("dirs", nargs="+", help="directories to watch")
+    watch.add_argument("-o", "--output", required=True, help="output directory")
+    watch.add_argument("--preset", help="start from a saved preset; options override it")
+    watch.add_argument("--done-dir", help="move originals here once processed "
+                                          "(default: leave them, marked done in the manifest)")
+    watch.add_argument("--settle", type=float, default=2.0,
+                       help="seconds a file must stop changing before it is processed")
+    watch.add_argument("--recursive", action=argparse.BooleanOptionalAction, default=True,
+                       help="also watch subdirectories")
+    watch.add_argument("--poll", action="store_true", help="poll directories instead of inotify")
+    watch.add_argument("--interval", type=float, default=1.0, help="polling period in seconds")
+    watch.add_argument("--workers", type=int, help="parallel workers (0 = all cores)")
+    watch.add_argument("--executor", choices=("process", "thread"), default="process")
+    watch.add_argument("--memory-budget", type=_memory_size,
+                       help="memory parallel jobs may use together, e.g. 2G or auto")
+    watch.add_argument("-v", "--verbose", action="store_true", help="also print unchanged files")
+    watch.add_argument("-q", "--quiet", action="store_true", help="print errors only")
+    watch.set_defaults(func=cmd_watch)
+
+    presets = sub.add_parser("presets", help="list, show, save or delete presets")
+    actions = presets.add_subparsers(dest="action", required=True)
+    actions.add_parser("list")
+    actions.add_parser("show").add_argument("name")
+    save = actions.add_parser("save", parents=[common])
+    save.add_argument("name")
+    save.add_argument("--update", action="store_true", help="merge into the existing preset")
+    actions.add_parser("delete").add_argument("name")
+    presets.set_defaults(func=cmd_presets)
+
+    profiles = sub.add_parser("profiles", help="list encoder profiles")
+    profiles.set_defaults(func=cmd_profiles)
+
+    fonts = sub.add_parser("fonts", help="list the bundled font families (for --font)")
+    fonts.set_defaults(func=cmd_fonts)
+
+    serve = sub.add_parser("serve", help="run the local watermarking HTTP service")
+    serve.add_argument("--host", default="127.0.0.1", help="interface to bind (default loopback)")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--workers", type=int, help="render workers (default: all cores)")
+    serve.add_argument("--max-pending", type=int,
+                       help="renders admitted at once before answering 503 (default 2 * workers)")
+    serve.add_argument("--executor", choices=("process", "thread"), default="process")
+    serve.add_argument("--asset-dir", action="append",
+                       help="directory logo=/font= may name files in (repeatable; "
+                            "default: the bundled assets)")
+    serve.set_defaults(func=cmd_serve)
+
+    shard = sub.add_parser("shard", help="share a batch between nodes through a job directory")
+    actions = shard.add_subparsers(dest="action", required=True)
+    create = actions.add_parser("create", parents=[common], help="split inputs into a job directory")
+    create.add_argument("job", help="job directory to create (on the shared filesystem)")
+    create.add_argument("inputs", nargs="+", help="image files and/or directories")
+    create.add_argument("-o", "--output", required=True, help="output directory shared by all nodes")
+    create.add_argument("--preset", help="start from a saved preset; options override it")
+    create.add_argument("--recursive", action=argparse.BooleanOptionalAction, default=True,
+                        help="descend into subdirectories of directory inputs")
+    create.add_argument("--chunk-size", type=int, default=16, help="images per work item")
+    create.add_argument("--lease", type=float, default=300,
+                        help="seconds before a silent node's item is handed to another")
+    create.add_argument("--max-attempts", type=int, default=3,
+                        help="claims per item before it is abandoned")
+    for name, help_text in (("work", "claim and render items until the job is done"),
+                            ("run", "work the job with N local node processes")):
+        node = actions.add_parser(name, help=help_text)
+        node.add_argument("job", help="job directory")
+        node.add_argument("--workers", type=int, help="parallel workers per node (0 = all cores)")
+        node.add_argument("--executor", choices=("process", "thread"), default="process")
+        node.add_argument("-q", "--quiet", action="store_true", help="print errors only")
+        if name == "work":
+            node.add_argument("--node-id", help="name of this node (default hostname-pid)")
+            node.add_argument("--no-wait", action="store_true",
+                              help="exit once no item is left to claim, without waiting "
+                                   "for other nodes' items to finish or expire")
+        else:
+            node.add_argument("--nodes", type=int, help="node processes (default: all cores)")
+    actions.add_parser("status", help="item counts and live claims").add_argument("job")
+    actions.add_parser("summary", help="merge the nodes' results").add_argument("job")
+    shard.set_defaults(func=cmd_shard)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())